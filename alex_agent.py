@@ -2,14 +2,17 @@ from typing import Any
 from dotenv import load_dotenv
 import logging
 from dataclasses import dataclass, field
-from typing import Annotated, Optional
+from typing import Annotated, List, Optional
 from pydantic import Field
 import time
 import yaml
 import asyncio
 import argparse
+import itertools
 import sys
-from datetime import datetime, timezone
+import os
+import uuid
+from datetime import date, datetime, timezone
 
 from livekit import agents, api
 from livekit.agents import AgentSession, Agent, RoomInputOptions, function_tool, RunContext, metrics, JobContext, JobProcess
@@ -23,8 +26,18 @@ from livekit.plugins.turn_detector.multilingual import MultilingualModel
 from livekit.agents.voice import MetricsCollectedEvent
 
 # Import our optimized database manager
-from db_manager import AsyncDatabaseManager, OptimizedMetricsCollector, InMemoryMetrics
-from calendar_service import calendar_service, Appointment as CalendarAppointment
+from db_manager import (
+    AsyncDatabaseManager, OptimizedMetricsCollector, InMemoryMetrics, PossibleDuplicatePatient, close_connection_pools
+)
+from db_migrations import run_migrations
+from treatment_catalog import load_catalog_sync
+from calendar_service import (
+    get_calendar_service, join_spoken, load_resources, spoken_date, spoken_time, VISIT_SEPARATOR,
+    Appointment as CalendarAppointment
+)
+from date_time_parser import PERIOD_NAMES, parse_date_time
+from patient_identity import fold_name
+from calendar_store import CalendarStore
 
 logger = logging.getLogger("dental_assistant")
 logger.setLevel(logging.INFO)
@@ -59,6 +72,17 @@ class UserData:
     # Intent tracking
     user_intent: Optional[str] = None  # 'information', 'booking', 'general'
     requested_treatment: Optional[str] = None
+    
+    # Identifies this call's tentative holds on offered calendar slots
+    hold_key: str = field(default_factory=lambda: str(uuid.uuid4()))
+    
+    # Caller ID pre-fetch: patients on file for the calling number, with recent appointments
+    caller_phone: Optional[str] = None
+    caller_candidates: List[dict] = field(default_factory=list)
+    caller_prefetch: Optional[asyncio.Task] = None
+    
+    # A registration held back because a similarly named patient shares the phone and birthday
+    pending_registration: Optional[dict] = None
 
     def summarize(self) -> str:
         data = {
@@ -134,12 +158,18 @@ async def update_phone(
 
 @function_tool()
 async def update_booking_date_time(
-    date_time: Annotated[str, Field(description="The booking date and time")],
+    date_time: Annotated[str, Field(description="The booking date and time in the patient's own words, e.g. 'next Tuesday afternoon' or 'demain à 14h30'")],
     context: RunContext_T
 ) -> str:
     """Called when the user provides their booking date and time.
     Confirm the spelling with the user before calling the function."""
     userdata = context.userdata
+    # Resolved locally so relative dates are pinned to today, not to when the booking is confirmed
+    now = datetime.now()
+    parsed = parse_date_time(date_time, now)
+    if parsed is None:
+        return "Which day and time would you like? For example, next Tuesday at 10 AM."
+    date_time = str(parsed)
     userdata.booking_date_time = date_time
     userdata.save_to_db()  # Non-blocking save
     
@@ -156,7 +186,12 @@ async def update_booking_date_time(
             metadata={"function": "update_booking_date_time"}
         )
     
-    return f"The booking date and time is updated to {date_time}"
+    when = spoken_date(parsed.date, now.date())
+    if parsed.time:
+        when = f"{when} at {spoken_time(parsed.time)}"
+    elif parsed.period:
+        when = f"{when} in the {date_time.split(' ', 1)[1]}"
+    return f"The booking date and time is updated to {when}"
 
 @function_tool()
 async def update_booking_reason(
@@ -231,9 +266,53 @@ async def update_email(
     
     return f"Email updated to {email}"
 
+def verify_patient(userdata: UserData, patient: dict):
+    """Record a returning patient whose identity has been confirmed"""
+    userdata.patient_id = patient['patient_id']
+    userdata.customer_name = patient['name']
+    userdata.customer_phone = patient['phone']
+    userdata.date_of_birth = patient['date_of_birth']
+    userdata.email = patient.get('email')
+    userdata.is_returning_patient = True
+    userdata.patient_verified = True
+    
+    userdata.save_to_db()
+    userdata.in_memory_metrics.update("patient_found", 1)
+
+@function_tool()
+async def confirm_caller_date_of_birth(
+    date_of_birth: Annotated[str, Field(description="Patient's date of birth in YYYY-MM-DD format")],
+    context: RunContext_T,
+) -> str:
+    """Verify a returning patient calling from the phone number on their record,
+    using only their date of birth."""
+    userdata = context.userdata
+    if userdata.caller_prefetch is not None:
+        await userdata.caller_prefetch
+    if not userdata.caller_candidates:
+        return "I couldn't match this phone line to a record. Please give me the phone number on your file."
+    
+    patient = next((p for p in userdata.caller_candidates if p['date_of_birth'] == date_of_birth), None)
+    if patient is None:
+        userdata.in_memory_metrics.update("caller_dob_mismatch", 1)
+        return ("That date of birth doesn't match our records for this phone number. "
+                "Could you give me the phone number you registered with?")
+    
+    verify_patient(userdata, patient)
+    userdata.db_manager.queue_patient_visit(patient['patient_id'])
+    today = date.today().isoformat()
+    upcoming = [a for a in patient['appointments']
+                if a['appointment_date'] >= today and a['status'] in ('scheduled', 'confirmed')]
+    if upcoming:
+        nxt = upcoming[-1]  # history is newest first
+        return (f"Welcome back, {patient['name']}! I see you're booked for "
+                f"{spoken_date(nxt['appointment_date'], date.today())} at {spoken_time(nxt['appointment_time'][:5])}. "
+                f"How can I help you today?")
+    return f"Welcome back, {patient['name']}! How can I help you today?"
+
 @function_tool()
 async def search_patient_by_phone_and_dob(
-    phone: Annotated[str, Field(description="Patient's phone number in format 1-XXX-XXX-XXXX")],
+    phone: Annotated[str, Field(description="Patient's phone number as given, e.g. 514 555 1234 or 1-514-555-1234")],
     date_of_birth: Annotated[str, Field(description="Patient's date of birth in YYYY-MM-DD format")],
     context: RunContext_T,
 ) -> str:
@@ -247,18 +326,7 @@ async def search_patient_by_phone_and_dob(
         patient = await userdata.db_manager.search_patient_by_phone_and_dob(phone, date_of_birth)
         
         if patient:
-            # Update userdata with patient information
-            userdata.patient_id = patient['patient_id']
-            userdata.customer_name = patient['name']
-            userdata.customer_phone = patient['phone']
-            userdata.date_of_birth = patient['date_of_birth']
-            userdata.email = patient.get('email')
-            userdata.is_returning_patient = True
-            userdata.patient_verified = True
-            
-            userdata.save_to_db()
-            userdata.in_memory_metrics.update("patient_found", 1)
-            
+            verify_patient(userdata, patient)
             return f"Welcome back, {patient['name']}! I found your record in our system. How can I help you today?"
         else:
             userdata.in_memory_metrics.update("patient_not_found", 1)
@@ -268,6 +336,38 @@ async def search_patient_by_phone_and_dob(
         logger.error(f"Error searching for patient: {e}")
         return "I'm having trouble accessing patient records right now. Let me help you as a new patient."
 
+async def register_patient(userdata: UserData, name: str, phone: str, date_of_birth: str,
+                           email: Optional[str] = None, new_patient_confirmed: bool = False) -> str:
+    """Create the patient record, or ask the caller about a similarly named patient already on file"""
+    try:
+        patient_id = await userdata.db_manager.create_patient_record(
+            name=name,
+            phone=phone,
+            date_of_birth=date_of_birth,
+            email=email,
+            new_patient_confirmed=new_patient_confirmed
+        )
+    except PossibleDuplicatePatient as e:
+        userdata.pending_registration = {'name': name, 'phone': phone, 'date_of_birth': date_of_birth,
+                                         'email': email, 'match': e.patient}
+        userdata.in_memory_metrics.update("possible_duplicate_registration", 1)
+        return (f"We already have a patient named {e.patient['name']} with this phone number and date of birth. "
+                f"Is that you, or are you a different person, for example a twin or family member?")
+    
+    # Update userdata
+    userdata.patient_id = patient_id
+    userdata.customer_name = name
+    userdata.customer_phone = phone
+    userdata.date_of_birth = date_of_birth
+    userdata.email = email
+    userdata.is_returning_patient = False
+    userdata.patient_verified = True
+    
+    userdata.save_to_db()
+    userdata.in_memory_metrics.update("new_patient_registered", 1)
+    
+    return f"Great! I've registered you as a new patient, {name}. Your patient record has been created. How can I help you today?"
+
 @function_tool()
 async def create_patient_record(
     name: Annotated[str, Field(description="Patient's full name")],
@@ -283,31 +383,46 @@ async def create_patient_record(
         return "Patient registration is not available at this time."
     
     try:
-        patient_id = await userdata.db_manager.create_patient_record(
-            name=name,
-            phone=phone,
-            date_of_birth=date_of_birth,
-            email=email
-        )
-        
-        # Update userdata
-        userdata.patient_id = patient_id
-        userdata.customer_name = name
-        userdata.customer_phone = phone
-        userdata.date_of_birth = date_of_birth
-        userdata.email = email
-        userdata.is_returning_patient = False
-        userdata.patient_verified = True
+        # Callers who forget they are registered get their existing record, not a duplicate;
+        # only the same spelling of their name is taken as them without asking
+        existing = await userdata.db_manager.find_duplicate_patient(name, phone, date_of_birth)
+        if existing and fold_name(existing['name']) == fold_name(name):
+            verify_patient(userdata, existing)
+            userdata.in_memory_metrics.update("duplicate_registration_avoided", 1)
+            return (f"It looks like you're already registered with us, {existing['name']}, "
+                    f"so I've pulled up your existing record. How can I help you today?")
         
-        userdata.save_to_db()
-        userdata.in_memory_metrics.update("new_patient_registered", 1)
-        
-        return f"Great! I've registered you as a new patient, {name}. Your patient record has been created. How can I help you today?"
+        return await register_patient(userdata, name, phone, date_of_birth, email)
         
     except Exception as e:
         logger.error(f"Error creating patient record: {e}")
         return "I'm having trouble creating your patient record right now. Let me still help you with your inquiry."
 
+@function_tool()
+async def confirm_existing_patient(
+    is_existing_patient: Annotated[bool, Field(description="True if the caller says the record on file is theirs, "
+                                                           "False if they are a different person")],
+    context: RunContext_T,
+) -> str:
+    """Called with the caller's answer after registration found a similarly named patient on file."""
+    userdata = context.userdata
+    pending = userdata.pending_registration
+    if not pending:
+        return "There is no registration waiting for confirmation."
+    userdata.pending_registration = None
+    
+    try:
+        if is_existing_patient:
+            verify_patient(userdata, pending['match'])
+            userdata.in_memory_metrics.update("duplicate_registration_avoided", 1)
+            return (f"Thank you, {pending['match']['name']}. I've pulled up your existing record. "
+                    f"How can I help you today?")
+        return await register_patient(userdata, pending['name'], pending['phone'], pending['date_of_birth'],
+                                      pending['email'], new_patient_confirmed=True)
+    except Exception as e:
+        logger.error(f"Error creating patient record: {e}")
+        return "I'm having trouble creating your patient record right now. Let me still help you with your inquiry."
+
 @function_tool()
 async def get_treatment_info(
     context: RunContext_T,
@@ -384,6 +499,22 @@ async def search_treatments_by_keyword(
         logger.error(f"Error searching treatments: {e}")
         return "I'm having trouble searching for treatments right now. Please let me know what specific treatment you're interested in."
 
+def format_duration(duration: int) -> str:
+    """Voice-friendly duration, e.g. "1 hour and 30 minutes" """
+    if duration >= 60:
+        hours = duration // 60
+        minutes = duration % 60
+        if minutes == 0:
+            return f"{hours} hour{'s' if hours > 1 else ''}"
+        return f"{hours} hour{'s' if hours > 1 else ''} and {minutes} minutes"
+    return f"{duration} minutes"
+
+def format_price_range(min_price: int, max_price: int) -> str:
+    """Voice-friendly price range, e.g. "between 120 and 150 dollars" """
+    if min_price == max_price:
+        return f"{min_price} dollars"
+    return f"between {min_price} and {max_price} dollars"
+
 @function_tool()
 async def get_treatment_price_and_duration(
     treatment_name: Annotated[str, Field(description="Name of the treatment to get price and duration for")],
@@ -406,27 +537,9 @@ async def get_treatment_price_and_duration(
         userdata.requested_treatment = treatment['name']
         userdata.save_to_db()
         
-        # Format price range in a voice-friendly way
-        min_price = treatment['price_range_min']
-        max_price = treatment['price_range_max']
-        duration = treatment['duration_minutes']
-        
-        # Convert duration to user-friendly format
-        if duration >= 60:
-            hours = duration // 60
-            minutes = duration % 60
-            if minutes == 0:
-                duration_text = f"{hours} hour{'s' if hours > 1 else ''}"
-            else:
-                duration_text = f"{hours} hour{'s' if hours > 1 else ''} and {minutes} minutes"
-        else:
-            duration_text = f"{duration} minutes"
-        
         # Create natural speech response
-        if min_price == max_price:
-            price_text = f"{min_price} dollars"
-        else:
-            price_text = f"between {min_price} and {max_price} dollars"
+        price_text = format_price_range(treatment['price_range_min'], treatment['price_range_max'])
+        duration_text = format_duration(treatment['duration_minutes'])
         
         result = (f"For {treatment['name']}, the cost is {price_text} "
                  f"and the appointment typically takes {duration_text}.")
@@ -454,6 +567,115 @@ async def get_treatment_price_and_duration(
         logger.error(f"Error getting treatment price and duration: {e}")
         return "I'm having trouble accessing treatment pricing right now. Please call our office at your convenience for specific pricing details."
 
+@function_tool()
+async def get_visit_price_and_duration(
+    treatment_names: Annotated[List[str], Field(description="All treatments the patient wants in the same visit, e.g. ['cleaning', 'x-rays', 'checkup']")],
+    context: RunContext_T,
+) -> str:
+    """Get the combined price and total duration of a visit with several treatments.
+    Use this instead of calling get_treatment_price_and_duration once per treatment."""
+    userdata = context.userdata
+    
+    if not userdata.db_manager:
+        return "Treatment pricing information is not available at this time."
+    
+    try:
+        matches = await userdata.db_manager.match_treatments(treatment_names)
+        
+        # Two phrasings of the same treatment are only counted once
+        treatments = list({t['treatment_id']: t for t in matches.values() if t}.values())
+        unmatched = [name for name, treatment in matches.items() if not treatment]
+        
+        if not treatments:
+            return f"I couldn't find pricing information for {join_spoken(unmatched)}. Could you tell me which treatments you're interested in?"
+        
+        names = [t['name'] for t in treatments]
+        userdata.requested_treatment = ", ".join(names)
+        userdata.save_to_db()
+        
+        price_text = format_price_range(sum(t['price_range_min'] for t in treatments),
+                                        sum(t['price_range_max'] for t in treatments))
+        duration_text = format_duration(sum(t['duration_minutes'] for t in treatments))
+        
+        if len(treatments) == 1:
+            result = f"For {names[0]}, the cost is {price_text} and the appointment typically takes {duration_text}."
+        else:
+            result = (f"For a visit with {join_spoken(names)}, the total cost is {price_text} "
+                      f"and the appointment typically takes {duration_text} altogether.")
+        if unmatched:
+            result += f" I couldn't find {join_spoken(unmatched)} in our treatment list."
+        
+        userdata.in_memory_metrics.update("visit_price_duration_requested", 1)
+        
+        if userdata.enable_recording and userdata.db_manager and userdata.session_id:
+            userdata.db_manager.queue_transcript(
+                userdata.session_id,
+                context.session.current_agent.__class__.__name__,
+                "function_call",
+                f"Visit price/duration query for: {', '.join(treatment_names)}",
+                metadata={"function": "get_visit_price_and_duration", "treatments": names, "unmatched": unmatched}
+            )
+        
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error getting visit price and duration: {e}")
+        return "I'm having trouble accessing treatment pricing right now. Please call our office at your convenience for specific pricing details."
+
+@function_tool()
+async def get_available_times(
+    context: RunContext_T,
+    preferred_date: Annotated[Optional[str], Field(description="Earliest date the patient can come, in their own words (e.g. 'next Tuesday'); omit for as soon as possible")] = None,
+    treatment: Annotated[Optional[str], Field(description="What the visit is for, e.g. 'cleaning and x-rays'; omit to use the booking reason")] = None,
+) -> str:
+    """Get the next open appointment times, ready to read to the patient.
+    Call this before suggesting any time, and only offer times it returns."""
+    userdata = context.userdata
+    now = datetime.now()
+    today = now.date()
+    
+    requested = parse_date_time(preferred_date, now) if preferred_date else None
+    if preferred_date and requested is None:
+        return "Which day would suit you? For example, tomorrow or next Tuesday."
+    start_date = max(date.fromisoformat(requested.date), today) if requested else today
+    
+    try:
+        # The visit lasts as long as all of its treatments
+        reason = treatment or userdata.booking_reason
+        visit = await userdata.db_manager.get_visit_treatments(reason) if reason and userdata.db_manager else []
+        duration = sum(t['duration_minutes'] for t in visit) or 30
+        
+        # Only later today; rounding up to the half hour keeps the cached summary reusable
+        not_before = None
+        if start_date == today:
+            minutes = -(-(now.hour * 60 + now.minute) // 30) * 30
+            not_before = f"{minutes // 60:02d}:{minutes % 60:02d}"
+        # Catch the week up with other workers' bookings; the summary itself is read from memory
+        await get_calendar_service().refresh_days(start_date.isoformat(), days_ahead=7)
+        openings = get_calendar_service().describe_openings(
+            start_date.isoformat(), duration, VISIT_SEPARATOR.join(t['name'] for t in visit) or None,
+            days_ahead=7, not_before=not_before, today=today)
+        
+        userdata.in_memory_metrics.update("availability_requested", 1)
+        
+        if userdata.enable_recording and userdata.db_manager and userdata.session_id:
+            userdata.db_manager.queue_transcript(
+                userdata.session_id,
+                context.session.current_agent.__class__.__name__,
+                "function_call",
+                f"Availability from {start_date.isoformat()} for {duration} minutes",
+                metadata={"function": "get_available_times", "treatment": reason}
+            )
+        
+        if not openings:
+            return (f"There are no openings for a {format_duration(duration)} visit in the week from "
+                    f"{start_date.strftime('%A, %B %d')}. Ask whether a later week would work.")
+        return f"The next openings for a {format_duration(duration)} visit are {openings}."
+        
+    except Exception as e:
+        logger.error(f"Error getting available times: {e}")
+        return "I'm having trouble checking the schedule right now. Which day and time would you prefer?"
+
 @function_tool()
 async def to_greeter(context: RunContext_T) -> Agent:
     """Called when user asks any unrelated questions or requests
@@ -504,6 +726,15 @@ class BaseAgent(Agent):
                    f"Current user data is {userdata.summarize()}",
         )
         
+        # The calling number is on file: a date of birth is all that is left to verify
+        if agent_name == "PatientLookupAgent" and userdata.caller_candidates and not userdata.patient_verified:
+            chat_ctx.add_message(
+                role="system",
+                content="The caller's phone number matches a patient record. Ask only for their date of birth "
+                       "and verify it with confirm_caller_date_of_birth; if it does not match, ask for their "
+                       "phone number and search as usual."
+            )
+        
         # For Greeter agent, initiate conversation immediately
         if agent_name == "Greeter":
             chat_ctx.add_message(
@@ -622,7 +853,8 @@ class PatientLookupAgent(BaseAgent):
             ),
             llm=openai.LLM(parallel_tool_calls=False),
             tts=openai.TTS(voice="ash"),
-            tools=[update_phone, update_date_of_birth, search_patient_by_phone_and_dob, get_current_datetime],
+            tools=[update_phone, update_date_of_birth, search_patient_by_phone_and_dob, confirm_caller_date_of_birth,
+                   get_current_datetime],
         )
 
     @function_tool()
@@ -652,12 +884,15 @@ class RegistrationAgent(BaseAgent):
                 "Your job is to register new patients by collecting their information: "
                 "name, phone number (1-XXX-XXX-XXXX format), date of birth (YYYY-MM-DD format), and optionally email. "
                 "After collecting the information, create their patient record. "
+                "If a similarly named patient is already on file, ask whether that record is theirs "
+                "and pass their answer to confirm_existing_patient. "
                 "Then ask what they need help with: booking an appointment or information about treatments. "
                 "Be friendly, professional, and thorough in collecting information."
             ),
             llm=openai.LLM(parallel_tool_calls=False),
             tts=openai.TTS(voice="ash"),
-            tools=[update_name, update_phone, update_date_of_birth, update_email, create_patient_record, get_current_datetime],
+            tools=[update_name, update_phone, update_date_of_birth, update_email, create_patient_record,
+                   confirm_existing_patient, get_current_datetime],
         )
 
     @function_tool()
@@ -682,6 +917,7 @@ class InfoAgent(BaseAgent):
                 "Your job is to provide information about dental treatments, pricing, and procedures. "
                 "You have access to our complete treatment database with pricing ranges and duration information. "
                 "When customers ask specifically about treatment prices or how long treatments take, use the get_treatment_price_and_duration function for the most accurate and voice-friendly response. "
+                "When customers ask about several treatments in one visit, use get_visit_price_and_duration once with all of them to quote the combined price and total time. "
                 "For general treatment information or searches, use the other available tools. "
                 "Answer questions about treatments, costs, duration, and what to expect. "
                 "If a patient decides they want to book an appointment after getting information, transfer them to booking. "
@@ -689,7 +925,8 @@ class InfoAgent(BaseAgent):
             ),
             llm=openai.LLM(parallel_tool_calls=False),
             tts=openai.TTS(voice="ash"),
-            tools=[get_treatment_info, search_treatments_by_keyword, get_treatment_price_and_duration, get_current_datetime, get_clinic_info],
+            tools=[get_treatment_info, search_treatments_by_keyword, get_treatment_price_and_duration, get_visit_price_and_duration,
+                   get_current_datetime, get_clinic_info],
         )
 
     @function_tool()
@@ -708,7 +945,9 @@ class EnhancedBookingAgent(BaseAgent):
                 "Your job is to schedule appointments by collecting: date, time, and treatment type. "
                 "Our clinic hours are Monday to Friday 8:00 AM - 12:00 PM and 1:00 PM - 6:00 PM. "
                 "Always verify appointment times are within business hours. "
-                "If the patient asks about treatment pricing or duration during booking, use get_treatment_price_and_duration for accurate information. "
+                "If the patient asks about treatment pricing or duration during booking, use get_treatment_price_and_duration for accurate information, "
+                "or get_visit_price_and_duration when the visit combines several treatments. "
+                "Before proposing appointment times, call get_available_times and offer only the times it returns. "
                 "If the patient doesn't have complete information (name, phone), collect it. "
                 "Create the appointment in our system and confirm all details. "
                 "Be professional and thorough."
@@ -716,7 +955,8 @@ class EnhancedBookingAgent(BaseAgent):
             llm=openai.LLM(parallel_tool_calls=False),
             tts=openai.TTS(voice="ash"),
             tools=[update_name, update_phone, update_booking_date_time, update_booking_reason, 
-                   get_current_datetime, get_clinic_info, get_treatment_info, get_treatment_price_and_duration],
+                   get_current_datetime, get_clinic_info, get_treatment_info, get_treatment_price_and_duration,
+                   get_visit_price_and_duration, get_available_times],
         )
 
     @function_tool()
@@ -734,30 +974,76 @@ class EnhancedBookingAgent(BaseAgent):
         if not userdata.booking_reason:
             return "Please let me know what type of treatment or service you need."
         
-        # Create appointment in database if we have a patient ID
-        if userdata.db_manager and userdata.patient_id:
-            try:
-                # Parse date and time (this is simplified - in production you'd want better parsing)
-                appointment_id = await userdata.db_manager.create_appointment(
-                    patient_id=userdata.patient_id,
-                    appointment_date=userdata.booking_date_time.split()[0],  # Simplified parsing
-                    appointment_time="09:00",  # Simplified - would parse actual time
-                    treatment_type=userdata.booking_reason,
-                    notes=f"Appointment scheduled via voice assistant"
-                )
-                
-                userdata.in_memory_metrics.update("appointment_created", 1)
-                
-                return (f"Perfect! I've confirmed your appointment for {userdata.booking_date_time} "
-                       f"for {userdata.booking_reason}. Your appointment ID is {appointment_id[:8]}. "
-                       f"We'll see you at SmileRight Dental Clinic. Is there anything else I can help you with?")
-                       
-            except Exception as e:
-                logger.error(f"Error creating appointment: {e}")
-                return (f"I've noted your appointment request for {userdata.booking_date_time} "
-                       f"for {userdata.booking_reason}. Our staff will call you to confirm the details. "
-                       f"Is there anything else I can help you with?")
-        else:
+        if not (userdata.db_manager and userdata.patient_id):
+            return (f"I've noted your appointment request for {userdata.booking_date_time} "
+                   f"for {userdata.booking_reason}. Our staff will call you to confirm the details. "
+                   f"Is there anything else I can help you with?")
+        
+        requested = parse_date_time(userdata.booking_date_time)
+        if not requested:
+            return "Could you tell me the exact date and time you'd like, for example March 3rd at 10 AM?"
+        date_str, time_str = requested.date, requested.time
+        now = datetime.now()
+        today, not_before = now.date().isoformat(), now.strftime("%H:%M")
+        if (date_str, time_str or "24:00") <= (today, not_before):  # e.g. "today at 9" said at 10:15
+            return "That time has already passed. What other day or time would work for you?"
+        
+        try:
+            # A visit may combine treatments ("cleaning and x-rays"); it lasts as long as all of them
+            visit = await userdata.db_manager.get_visit_treatments(userdata.booking_reason)
+            duration = sum(t['duration_minutes'] for t in visit) or 30
+            # Catalog names are what provider eligibility is keyed on
+            treatment_type = VISIT_SEPARATOR.join(t['name'] for t in visit) or userdata.booking_reason
+            if time_str is None:
+                # Only a part of the day was given ("Tuesday afternoon"): take its first opening
+                period_start, period_end = requested.period or ("00:00", "24:00")
+                await get_calendar_service().refresh_days(date_str)
+                # Later today only: "this afternoon" said at 3 PM cannot mean 1 PM
+                time_str = next((slot.time for slot in get_calendar_service().iter_free_windows(
+                                     date_str, duration, treatment_type, not_before if date_str == today else None)
+                                 if period_start <= slot.time < period_end), None)
+                if time_str is None:
+                    when = spoken_date(date_str, now.date())
+                    if requested.period:
+                        when += f" in the {PERIOD_NAMES[requested.period]}"
+                    return f"I don't have an opening {when}. Would another day or time work for you?"
+            appointment = CalendarAppointment(
+                appointment_id=str(uuid.uuid4()),
+                patient_id=userdata.patient_id,
+                date=date_str,
+                time=time_str,
+                duration_minutes=duration,
+                treatment_type=treatment_type,
+                notes="Appointment scheduled via voice assistant"
+            )
+            # The calendar writes the booking to the appointments table, turning
+            # a slot we held for this caller into the booking
+            if not await get_calendar_service().book_appointment(appointment, holder=userdata.hold_key):
+                # Hold the alternatives while the caller chooses
+                alternatives = await get_calendar_service().offer_alternative_times(
+                    date_str, appointment.duration_minutes, holder=userdata.hold_key, limit=3,
+                    treatment_type=appointment.treatment_type, packed=True,
+                    not_before=not_before if date_str == today else None)
+                if not alternatives:
+                    return ("That time isn't available and I couldn't find an opening in the following week. "
+                           "Would you like to try a different week?")
+                # Read out the way describe_openings does: "tomorrow at 9 AM and 1 PM; Thursday, ... at 8 AM"
+                by_day = itertools.groupby(sorted(alternatives, key=lambda slot: (slot.date, slot.time)),
+                                           key=lambda slot: slot.date)
+                options = "; ".join(f"{spoken_date(day, now.date())} at "
+                                    f"{join_spoken([spoken_time(slot.time) for slot in slots])}"
+                                    for day, slots in by_day)
+                return f"That time isn't available. The closest openings are {options}. Would one of these work for you?"
+            
+            userdata.in_memory_metrics.update("appointment_created", 1)
+            
+            return (f"Perfect! I've confirmed your appointment for {spoken_date(date_str, date.today())} "
+                   f"at {spoken_time(time_str)} "
+                   f"for {userdata.booking_reason}. Your appointment ID is {appointment.appointment_id[:8]}. "
+                   f"We'll see you at SmileRight Dental Clinic. Is there anything else I can help you with?")
+                   
+        except Exception as e:
+            logger.error(f"Error creating appointment: {e}")
             return (f"I've noted your appointment request for {userdata.booking_date_time} "
                    f"for {userdata.booking_reason}. Our staff will call you to confirm the details. "
                    f"Is there anything else I can help you with?")
@@ -780,7 +1066,8 @@ class Greeter(BaseAgent):
             ),
             llm=openai.LLM(parallel_tool_calls=False),
             tts=openai.TTS(voice="ash"),
-            tools=[get_current_datetime, get_clinic_info, get_treatment_info, search_treatments_by_keyword, get_treatment_price_and_duration],
+            tools=[get_current_datetime, get_clinic_info, get_treatment_info, search_treatments_by_keyword, get_treatment_price_and_duration,
+                   get_visit_price_and_duration],
         )
 
     @function_tool()
@@ -843,10 +1130,29 @@ class OptimizedAgentSession(AgentSession[UserData]):
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    # Apply schema migrations once per worker process, before any call starts
+    run_migrations(DB_PATH)
+    # Treatment lookups are served from memory on the voice path
+    load_catalog_sync(DB_PATH)
+    # Create the calendar here rather than on the first call; every worker
+    # books against the shared appointments table
+    calendar_service = get_calendar_service()
+    calendar_service.attach_store(CalendarStore(DB_PATH))
+    # Optional provider and chair roster; without one the clinic books one patient at a time
+    resources_file = os.getenv("CLINIC_RESOURCES_FILE")
+    if resources_file:
+        for resource in load_resources(resources_file):
+            calendar_service.add_resource(resource)
 
 # Global variable to store recording preference
 ENABLE_RECORDING = True
 
+DB_PATH = "dental_assistant.db"
+
+# Calls running in this worker process; the pooled connections are shared by
+# all of them, so only the last call to end closes them
+_active_calls = 0
+
 def parse_args():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description="Alex Dental Assistant Agent")
@@ -862,8 +1168,26 @@ def parse_args():
     )
     return parser.parse_args()
 
+# LiveKit sets this attribute on SIP participants to the calling number
+SIP_CALLER_NUMBER_ATTRIBUTE = "sip.phoneNumber"
+
+async def prefetch_caller(ctx: JobContext, userdata: UserData):
+    """Load patient records and appointment history for the caller's number, if it is known"""
+    try:
+        participant = await ctx.wait_for_participant()
+        phone = (participant.attributes or {}).get(SIP_CALLER_NUMBER_ATTRIBUTE)
+        if not phone:
+            return
+        userdata.caller_phone = phone
+        userdata.caller_candidates = await userdata.db_manager.get_caller_candidates(phone)
+        userdata.in_memory_metrics.update("caller_prefetch_matches", len(userdata.caller_candidates))
+    except Exception as e:
+        logger.error(f"Error pre-fetching caller records: {e}")
+
 async def entrypoint(ctx: agents.JobContext):
+    global _active_calls
     await ctx.connect()
+    _active_calls += 1
     
     # Get recording preference from global variable
     enable_recording = ENABLE_RECORDING
@@ -874,13 +1198,16 @@ async def entrypoint(ctx: agents.JobContext):
     metrics_collector = None
     
     if enable_recording:
-        # Initialize optimized database with faster settings
+        # Lightweight per-session handle; schema setup and the batch writer
+        # are shared by every call in this worker process
         db_manager = AsyncDatabaseManager(
+            DB_PATH,
             batch_size=50,  # Smaller batches for faster processing
-            flush_interval=2.0  # More frequent flushes
+            flush_interval=2.0,  # More frequent flushes
+            durable_log_dir=os.getenv("DURABLE_LOG_DIR")  # Optional crash-safe queue log
         )
         
-        # Start background processing
+        # Attach this session to the shared background writer
         await db_manager.start_background_processing()
         
         # Create session in database
@@ -952,9 +1279,16 @@ async def entrypoint(ctx: agents.JobContext):
                     )
 
     async def log_usage():
+        global _active_calls
         summary = usage_collector.get_summary()
         logger.info(f"Usage: {summary}")
         
+        # Give back any slots still held for this caller
+        try:
+            await get_calendar_service().release_holds(userdata.hold_key)
+        except Exception as e:
+            logger.error(f"Error releasing calendar holds: {e}")
+        
         # End session in database
         if userdata.enable_recording and userdata.db_manager and userdata.session_id:
             duration = int(time.time() - userdata.session_start_time) if userdata.session_start_time else None
@@ -969,10 +1303,20 @@ async def entrypoint(ctx: agents.JobContext):
                 metadata={"event": "session_end", "usage_summary": str(summary)}
             )
             
-            # Stop background processing and flush remaining data
+            # Flush this session's remaining data and detach from the shared writer
             await userdata.db_manager.stop_background_processing()
+        
+        # The last call in the process closes the pooled connections, so their
+        # worker threads do not hold the process open
+        _active_calls -= 1
+        if _active_calls == 0:
+            await close_connection_pools()
 
     ctx.add_shutdown_callback(log_usage)
+    
+    # Look the caller up while the greeter speaks, so a returning patient only confirms a date of birth
+    if db_manager:
+        userdata.caller_prefetch = asyncio.create_task(prefetch_caller(ctx, userdata))
 
     await session.start(
         agent=userdata.agents["greeter"],
@@ -10,7 +10,7 @@ import asyncio
 from datetime import datetime, timedelta
 import json
 import sqlite3
-from db_manager import AsyncDatabaseManager
+from db_manager import AsyncDatabaseManager, close_connection_pools
 from typing import List, Dict, Any, Optional
 
 class AsyncDataAnalyzer:
@@ -226,7 +226,14 @@ def run_async(coro):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
     
-    return loop.run_until_complete(coro)
+    async def run_and_close():
+        try:
+            return await coro
+        finally:
+            # Pooled connections run on worker threads that would otherwise keep the CLI alive
+            await close_connection_pools()
+    
+    return loop.run_until_complete(run_and_close())
 
 async def print_session_report(session_id: str, db_path: str = "dental_assistant.db"):
     """Print a formatted session report"""
@@ -356,6 +363,11 @@ def main():
     cleanup_parser.add_argument('--days', type=int, default=90, help='Keep data newer than N days')
     cleanup_parser.add_argument('--confirm', action='store_true', help='Confirm deletion')
     
+    # Dedup command
+    dedup_parser = subparsers.add_parser('dedup', help='Find and merge duplicate patient records')
+    dedup_parser.add_argument('--batch-size', type=int, default=500, help='Duplicate groups merged per transaction')
+    dedup_parser.add_argument('--confirm', action='store_true', help='Confirm the merge')
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -377,6 +389,8 @@ def main():
             run_async(metrics_cmd(args))
         elif args.command == 'cleanup':
             run_async(cleanup_cmd(args))
+        elif args.command == 'dedup':
+            run_async(dedup_cmd(args))
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -560,5 +574,27 @@ async def cleanup_cmd(args):
     
     print(f"Deleted {len(sessions_to_delete)} old sessions")
 
+async def dedup_cmd(args):
+    """Find and merge duplicate patient records"""
+    db_manager = AsyncDatabaseManager(args.db)
+    groups = await db_manager.merge_duplicate_patients(apply=args.confirm, batch_size=args.batch_size)
+    
+    if not groups:
+        print("No duplicate patients found")
+        return
+    
+    duplicates = sum(len(group['merge']) for group in groups)
+    print(f"\nFound {duplicates} duplicate records of {len(groups)} patients:")
+    print(f"{'Keep':<38} {'Name':<25} {'Duplicates':<40}")
+    print("-" * 105)
+    for group in groups:
+        print(f"{group['keep']:<38} {group['name']:<25} {', '.join(group['merge']):<40}")
+    
+    if not args.confirm:
+        print("\nUse --confirm to actually merge the records")
+        return
+    
+    print(f"\nMerged {duplicates} duplicate records")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,690 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the dental assistant hot paths
+
+Run all sections, or name the ones to run:
+
+    python benchmark_performance.py
+    python benchmark_performance.py treatments calendar resources dates patients imports
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from calendar_service import SLOT_MINUTES, WEEKDAY_NAMES, Appointment, BlockRule, CalendarService, Resource
+from date_time_parser import parse_date_time
+from db_manager import AsyncDatabaseManager, close_connection_pools, get_connection_pool
+from db_migrations import run_migrations
+from patient_identity import get_patient_cache, name_key, normalize_phone
+from treatment_catalog import TreatmentCatalog, load_catalog_sync
+from treatment_matcher import TreatmentMatcher, tokenize
+
+# Spoken phrasings as speech-to-text delivers them, with the treatment id a
+# receptionist would pick (None when the clinic offers nothing matching)
+SPOKEN_TREATMENT_CORPUS: List[Tuple[str, Optional[str]]] = [
+    ("root canal", "root_canal"),
+    ("root canals", "root_canal"),
+    ("how much is a root canal", "root_canal"),
+    ("root canel", "root_canal"),
+    ("I think I need a root canal treatment", "root_canal"),
+    ("traitement de canal", "root_canal"),
+    ("whitening", "teeth_whitening"),
+    ("whitening my teeth", "teeth_whitening"),
+    ("teeth whitening", "teeth_whitening"),
+    ("I want whiter teeth", "teeth_whitening"),
+    ("get my teeth whitened", "teeth_whitening"),
+    ("tooth bleaching", "teeth_whitening"),
+    ("blanchiment des dents", "teeth_whitening"),
+    ("teeth whitning", "teeth_whitening"),
+    ("deep clean", "deep_cleaning"),
+    ("deep cleaning", "deep_cleaning"),
+    ("a deep teeth cleaning", "deep_cleaning"),
+    ("scaling and root planing", "deep_cleaning"),
+    ("gum cleaning", "deep_cleaning"),
+    ("détartrage", "deep_cleaning"),
+    ("cleaning", "basic_cleaning"),
+    ("a cleaning", "basic_cleaning"),
+    ("teeth cleaning", "basic_cleaning"),
+    ("regular cleaning", "basic_cleaning"),
+    ("basic clean", "basic_cleaning"),
+    ("cleanings", "basic_cleaning"),
+    ("nettoyage", "basic_cleaning"),
+    ("checkup", "general_checkup"),
+    ("check up", "general_checkup"),
+    ("check-up", "general_checkup"),
+    ("a dental exam", "general_checkup"),
+    ("general check up", "general_checkup"),
+    ("examination", "general_checkup"),
+    ("x-rays", "bitewing_xray"),
+    ("x rays", "bitewing_xray"),
+    ("bitewing x rays", "bitewing_xray"),
+    ("bite wing xrays", "bitewing_xray"),
+    ("panoramic x ray", "panoramic_xray"),
+    ("full mouth x-ray", "panoramic_xray"),
+    ("a panoramic", "panoramic_xray"),
+    ("filling", "composite_filling"),
+    ("a filling", "composite_filling"),
+    ("fillings", "composite_filling"),
+    ("white filling", "composite_filling"),
+    ("tooth colored filling", "composite_filling"),
+    ("composite filing", "composite_filling"),
+    ("silver filling", "amalgam_filling"),
+    ("amalgam fillings", "amalgam_filling"),
+    ("crown", "crown"),
+    ("a crown", "crown"),
+    ("crowns", "crown"),
+    ("dental crown", "crown"),
+    ("a cap on my tooth", "crown"),
+    ("couronne", "crown"),
+    ("tooth extraction", "extraction"),
+    ("extraction", "extraction"),
+    ("pull a tooth", "extraction"),
+    ("I need a tooth pulled", "extraction"),
+    ("wisdom tooth removal", "extraction"),
+    ("extract a tooth", "extraction"),
+    ("braces", None),
+    ("haircut", None),
+    ("veneers", None),
+    ("parking", None),
+]
+
+# Booking dates and times as callers say them, resolved against
+# BOOKING_CORPUS_NOW (a Tuesday morning); None when no date or time is given
+BOOKING_CORPUS_NOW = datetime(2025, 2, 4, 10, 0)
+BOOKING_DATE_TIME_CORPUS: List[Tuple[str, Optional[str]]] = [
+    ("2025-02-10 09:00", "2025-02-10 09:00"),
+    ("2025-02-10 2:30 PM", "2025-02-10 14:30"),
+    ("tomorrow at 10", "2025-02-05 10:00"),
+    ("tomorrow at 2", "2025-02-05 14:00"),
+    ("tomorrow morning at 9", "2025-02-05 09:00"),
+    ("tomorrow afternoon", "2025-02-05 afternoon"),
+    ("today at 4 pm", "2025-02-04 16:00"),
+    ("this afternoon", "2025-02-04 afternoon"),
+    ("at 3", "2025-02-04 15:00"),
+    ("at 9", "2025-02-05 09:00"),
+    ("day after tomorrow at noon", "2025-02-06 12:00"),
+    ("next Tuesday afternoon", "2025-02-11 afternoon"),
+    ("next Tuesday at 10 am", "2025-02-11 10:00"),
+    ("Tuesday next week at 11", "2025-02-11 11:00"),
+    ("this Friday at 10.30", "2025-02-07 10:30"),
+    ("Friday morning", "2025-02-07 morning"),
+    ("on Monday at a quarter past nine", "2025-02-10 09:15"),
+    ("Wednesday at 3 p.m.", "2025-02-05 15:00"),
+    ("Wednesday at three thirty", "2025-02-05 15:30"),
+    ("Thursday at half past two", "2025-02-06 14:30"),
+    ("quarter to eleven on Friday", "2025-02-07 10:45"),
+    ("Monday at 8 o'clock", "2025-02-10 08:00"),
+    ("Monday evening", "2025-02-10 evening"),
+    ("next week", "2025-02-10"),
+    ("in 3 days at 2:15 pm", "2025-02-07 14:15"),
+    ("in two weeks at 10", "2025-02-18 10:00"),
+    ("March 3rd at ten thirty", "2025-03-03 10:30"),
+    ("March 3 at 10am", "2025-03-03 10:00"),
+    ("the 3rd of March at 1:30", "2025-03-03 13:30"),
+    ("Feb 14 at 4", "2025-02-14 16:00"),
+    ("January 10th at 9:45", "2026-01-10 09:45"),
+    ("the 20th at noon", "2025-02-20 12:00"),
+    ("February 28 2025 at 11:15 am", "2025-02-28 11:15"),
+    ("could I come in Thursday around 1", "2025-02-06 13:00"),
+    ("I'd like Friday at 12 pm", "2025-02-07 12:00"),
+    ("maybe 16:00 on Thursday", "2025-02-06 16:00"),
+    ("Tuesday at 9", "2025-02-11 09:00"),
+    ("demain à 14h30", "2025-02-05 14:30"),
+    ("demain matin", "2025-02-05 morning"),
+    ("demain à dix heures", "2025-02-05 10:00"),
+    ("aujourd'hui à 15 heures", "2025-02-04 15:00"),
+    ("cet après-midi", "2025-02-04 afternoon"),
+    ("après-demain à midi", "2025-02-06 12:00"),
+    ("mardi prochain à 9h", "2025-02-11 09:00"),
+    ("mardi de la semaine prochaine en après-midi", "2025-02-11 afternoon"),
+    ("vendredi matin", "2025-02-07 morning"),
+    ("jeudi à 9h et demie", "2025-02-06 09:30"),
+    ("jeudi à dix heures et quart", "2025-02-06 10:15"),
+    ("lundi à 11 heures moins le quart", "2025-02-10 10:45"),
+    ("mercredi 16h", "2025-02-05 16:00"),
+    ("lundi à 10h30", "2025-02-10 10:30"),
+    ("le 15 mars à 10 heures", "2025-03-15 10:00"),
+    ("le 3 mars à 13h", "2025-03-03 13:00"),
+    ("le 20 à midi", "2025-02-20 12:00"),
+    ("dans trois jours à 14h", "2025-02-07 14:00"),
+    ("la semaine prochaine", "2025-02-10"),
+    ("vers 15h demain", "2025-02-05 15:00"),
+    ("jeudi soir", "2025-02-06 evening"),
+    ("à sept heures et demie demain", "2025-02-05 07:30"),
+    ("1er avril à 8h15", "2025-04-01 08:15"),
+    ("tomorrow at twelve thirty", "2025-02-05 12:30"),
+    ("March second at 9", "2025-03-02 09:00"),
+    ("the second of March at 11", "2025-03-02 11:00"),
+    ("a week from Friday at 10", "2025-02-14 10:00"),
+    ("le premier mars à 9h", "2025-03-01 09:00"),
+    ("whenever works", None),
+    ("as soon as possible", None),
+    ("I'm not sure yet", None),
+]
+
+# The formats the agent accepted before it parsed spoken dates
+LEGACY_DATE_TIME_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%d %I:%M %p", "%Y-%m-%d %I %p")
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def time_calls(fn: Callable[[str], object], phrases: List[str], rounds: int) -> List[float]:
+    """Per-call latency in microseconds"""
+    samples = []
+    for _ in range(rounds):
+        for phrase in phrases:
+            start = time.perf_counter()
+            fn(phrase)
+            samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def evaluate_treatment_matching(catalog: TreatmentCatalog,
+                                corpus: List[Tuple[str, Optional[str]]] = SPOKEN_TREATMENT_CORPUS) -> Dict[str, Dict[str, float]]:
+    """Hit rate of the legacy substring lookup and the fuzzy matcher over the corpus"""
+    def legacy(phrase):
+        treatment = catalog.best_substring_match(phrase)
+        return treatment.treatment_id if treatment else None
+
+    def fuzzy(phrase):
+        candidate = catalog.matcher.best(phrase)
+        return candidate.treatment.treatment_id if candidate else None
+
+    results = {}
+    for label, fn in (("legacy substring", legacy), ("fuzzy matcher", fuzzy)):
+        hits = sum(1 for phrase, expected in corpus if fn(phrase) == expected)
+        results[label] = {"hits": hits, "total": len(corpus), "hit_rate": hits / len(corpus)}
+    return results
+
+
+def benchmark_treatments(rounds: int = 200):
+    print("\n🦷 Treatment name matching")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "benchmark.db")
+        run_migrations(db_path)
+        catalog = load_catalog_sync(db_path)
+
+    for label, result in evaluate_treatment_matching(catalog).items():
+        print(f"  {label:<18} hit rate {result['hit_rate']:.1%} ({result['hits']}/{result['total']})")
+
+    phrases = [phrase for phrase, _ in SPOKEN_TREATMENT_CORPUS]
+    for phrase, expected in SPOKEN_TREATMENT_CORPUS:
+        candidate = catalog.matcher.best(phrase)
+        if (candidate.treatment.treatment_id if candidate else None) != expected:
+            print(f"    miss: {phrase!r} (expected {expected})")
+
+    start = time.perf_counter()
+    matcher = TreatmentMatcher(catalog.treatments)
+    print(f"  index build        {(time.perf_counter() - start) * 1e3:.2f} ms")
+
+    def cold(phrase):
+        # Bypass both the per-query and per-token caches
+        matcher._token_cache.clear()
+        return matcher._rank(tokenize(phrase))
+
+    timings = {
+        "legacy substring": time_calls(catalog.best_substring_match, phrases, rounds),
+        "fuzzy (cold)": time_calls(cold, phrases, max(1, rounds // 10)),
+        "fuzzy (uncached)": time_calls(lambda p: matcher._rank(tokenize(p)), phrases, rounds),
+        "fuzzy (cached)": time_calls(matcher.best, phrases, rounds),
+    }
+    for label, samples in timings.items():
+        print(f"  {label:<18} p50 {statistics.median(samples):7.1f} µs   p99 {percentile(samples, 99):7.1f} µs")
+
+
+def legacy_parse_date_time(text: str) -> Optional[str]:
+    for fmt in LEGACY_DATE_TIME_FORMATS:
+        try:
+            return datetime.strptime(text.strip().replace(".", ""), fmt).strftime("%Y-%m-%d %H:%M")
+        except ValueError:
+            continue
+    return None
+
+
+def spoken_date_time(text: str, now: datetime = BOOKING_CORPUS_NOW) -> Optional[str]:
+    parsed = parse_date_time(text, now)
+    return str(parsed) if parsed else None
+
+
+def evaluate_date_time_parsing(corpus: List[Tuple[str, Optional[str]]] = BOOKING_DATE_TIME_CORPUS
+                               ) -> Dict[str, Dict[str, float]]:
+    """Share of the corpus each parser resolves to the expected date and time"""
+    results = {}
+    for label, fn in (("legacy strptime", legacy_parse_date_time), ("spoken parser", spoken_date_time)):
+        hits = sum(1 for phrase, expected in corpus if fn(phrase) == expected)
+        results[label] = {"hits": hits, "total": len(corpus), "accuracy": hits / len(corpus)}
+    return results
+
+
+def benchmark_dates(rounds: int = 200):
+    print("\n📅 Booking date/time parsing")
+    for label, result in evaluate_date_time_parsing().items():
+        print(f"  {label:<18} accuracy {result['accuracy']:.1%} ({result['hits']}/{result['total']})")
+    for phrase, expected in BOOKING_DATE_TIME_CORPUS:
+        parsed = spoken_date_time(phrase)
+        if parsed != expected:
+            print(f"    miss: {phrase!r} -> {parsed} (expected {expected})")
+
+    phrases = [phrase for phrase, _ in BOOKING_DATE_TIME_CORPUS]
+    timings = {
+        "legacy strptime": time_calls(legacy_parse_date_time, phrases, rounds),
+        "spoken parser": time_calls(spoken_date_time, phrases, rounds),
+    }
+    for label, samples in timings.items():
+        print(f"  {label:<18} p50 {statistics.median(samples):7.1f} µs   p99 {percentile(samples, 99):7.1f} µs")
+
+
+def build_year_calendar(start: date, days: int = 365, seed: int = 7) -> CalendarService:
+    """A calendar with lunch blocks and a realistic mix of bookings on every open day"""
+    rng = random.Random(seed)
+    service = CalendarService()
+    durations = [30, 30, 45, 60, 90]
+    booked = 0
+    for offset in range(days):
+        date_str = (start + timedelta(days=offset)).strftime('%Y-%m-%d')
+        if not service.clinic_hours[service._get_weekday_name(date_str)]:
+            continue
+        service.block_time(date_str, '12:00', 60, 'Lunch break')
+        for _ in range(14):
+            duration = rng.choice(durations)
+            slots = service.get_available_slots(date_str, duration)
+            if not slots:
+                break
+            slot = rng.choice(slots)
+            booked += 1
+            asyncio.run(service.book_appointment(Appointment(
+                f"bench-{booked}", f"patient-{rng.randrange(2000)}", date_str, slot.time, duration, "Basic Cleaning")))
+    return service
+
+
+def linear_scan_available(service: CalendarService, date_str: str, time_str: str, duration_minutes: int) -> bool:
+    """The pre-index availability check: scan every appointment and block ever made"""
+    slot_start = service._time_to_minutes(time_str)
+    slot_end = slot_start + duration_minutes
+    for appointment in service.appointments.values():
+        if appointment.date == date_str and appointment.status in ['scheduled', 'confirmed']:
+            apt_start = service._time_to_minutes(appointment.time)
+            if not (slot_end <= apt_start or slot_start >= apt_start + appointment.duration_minutes):
+                return False
+    for blocked in service.blocked_times:
+        if blocked.date == date_str:
+            blocked_start = service._time_to_minutes(blocked.time)
+            if not (slot_end <= blocked_start or slot_start >= blocked_start + blocked.duration_minutes):
+                return False
+    return True
+
+
+def linear_scan_slots(service: CalendarService, date_str: str, duration_minutes: int = 30) -> List[str]:
+    """The pre-bitmap slot enumeration: format and re-check every 30-minute step"""
+    slots = []
+    for start_time, end_time in service.clinic_hours[service._get_weekday_name(date_str)]:
+        current = service._time_to_minutes(start_time)
+        while current + duration_minutes <= service._time_to_minutes(end_time):
+            time_str = service._minutes_to_time(current)
+            if linear_scan_available(service, date_str, time_str, duration_minutes):
+                slots.append(time_str)
+            current += 30
+    return slots
+
+
+def linear_scan_suggestions(service: CalendarService, preferred_date: str, duration_minutes: int = 30,
+                            days_ahead: int = 7) -> List[Tuple[str, str]]:
+    """The pre-generator suggestion search: enumerate every slot of every day, then truncate"""
+    slots = linear_scan_slots(service, preferred_date, duration_minutes)
+    if slots:
+        return [(preferred_date, t) for t in slots[:3]]
+    suggestions = []
+    base_date = date.fromisoformat(preferred_date)
+    for i in range(1, days_ahead + 1):
+        date_str = (base_date + timedelta(days=i)).isoformat()
+        suggestions.extend((date_str, t) for t in linear_scan_slots(service, date_str, duration_minutes)[:2])
+        if len(suggestions) >= 5:
+            break
+    return suggestions[:5]
+
+
+def benchmark_calendar(rounds: int = 20):
+    print("\n📅 Calendar availability over a year of bookings")
+    start = time.perf_counter()
+    service = build_year_calendar(date.today())
+    print(f"  built {len(service.appointments)} appointments and {len(service.blocked_times)} blocks "
+          f"in {time.perf_counter() - start:.2f} s")
+
+    rng = random.Random(11)
+    open_dates = sorted(service._day_index)
+    probes = [(rng.choice(open_dates), f"{rng.randrange(8, 18):02d}:{rng.choice(['00', '30'])}", rng.choice([30, 60]))
+              for _ in range(500)]
+    mismatches = sum(1 for d, t, dur in probes
+                     if service._is_slot_available(d, t, dur) != linear_scan_available(service, d, t, dur))
+    print(f"  index agrees with linear scan on {len(probes) - mismatches}/{len(probes)} probes")
+
+    def timed(fn, rounds):
+        samples = []
+        for _ in range(rounds):
+            for probe in probes:
+                begin = time.perf_counter()
+                fn(*probe)
+                samples.append((time.perf_counter() - begin) * 1e6)
+        return samples
+
+    timings = {
+        "slot check (scan)": timed(lambda d, t, dur: linear_scan_available(service, d, t, dur), 1),
+        "slot check (bitmap)": timed(service._is_slot_available, rounds),
+        "day slots (scan)": timed(lambda d, t, dur: linear_scan_slots(service, d, dur), 1),
+        "day slots (bitmap)": timed(lambda d, t, dur: service.get_available_slots(d, dur), rounds),
+        "first 3 (bitmap)": timed(lambda d, t, dur: service.find_free_windows(d, dur, 3), rounds),
+    }
+    # Suggestions from a fully booked day, the case that walks ahead
+    full_day = open_dates[0]
+    for slot in service.get_available_slots(full_day, 5):
+        asyncio.run(service.book_appointment(Appointment(f"fill-{slot.time}", "filler", full_day, slot.time, 5, "Checkup")))
+    suggest_probes = [(full_day, 30, 7)] + [(d, 60, 7) for d in rng.sample(open_dates, 50)]
+    timings["suggest (scan)"] = [_time_us(linear_scan_suggestions, service, d, dur, ahead)
+                                 for d, dur, ahead in suggest_probes]
+    service._window_cache.clear()
+    timings["suggest (cold cache)"] = [_time_us(service.suggest_alternative_times, d, dur, ahead)
+                                       for d, dur, ahead in suggest_probes]
+    timings["suggest (warm cache)"] = [_time_us(service.suggest_alternative_times, d, dur, ahead)
+                                       for _ in range(rounds) for d, dur, ahead in suggest_probes]
+    for label, samples in timings.items():
+        print(f"  {label:<20} p50 {statistics.median(samples):9.1f} µs   p99 {percentile(samples, 99):9.1f} µs")
+
+
+def _time_us(fn, *args) -> float:
+    begin = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - begin) * 1e6
+
+
+def build_clinic_roster(catalog: TreatmentCatalog) -> List[Resource]:
+    """Five chairs, three dentists (one mornings only) and three hygienists (one part-time)"""
+    hygiene = frozenset(t.name for t in catalog.treatments if t.category in ('preventive', 'periodontal', 'diagnostic'))
+    weekdays = WEEKDAY_NAMES[:5]
+    return [
+        Resource("dr_1", "dentist"),
+        Resource("dr_2", "dentist"),
+        Resource("dr_3", "dentist", hours={day: [("08:00", "12:00")] for day in weekdays}),
+        Resource("hyg_1", "hygienist", treatments=hygiene),
+        Resource("hyg_2", "hygienist", treatments=hygiene),
+        Resource("hyg_3", "hygienist", treatments=hygiene,
+                 hours={day: [("08:00", "12:00"), ("13:00", "18:00")] for day in weekdays[1:4]}),
+    ] + [Resource(f"chair_{n}", "chair") for n in range(1, 6)]
+
+
+def weekly_demand(catalog: TreatmentCatalog, requests: int, seed: int = 3) -> List[Tuple[str, int]]:
+    """(treatment, minutes) requests in a typical mix: mostly hygiene, some long procedures"""
+    rng = random.Random(seed)
+    weights = {'basic_cleaning': 30, 'general_checkup': 20, 'bitewing_xray': 5, 'panoramic_xray': 3,
+               'composite_filling': 15, 'amalgam_filling': 2, 'root_canal': 5, 'crown': 8,
+               'teeth_whitening': 3, 'extraction': 5, 'deep_cleaning': 4}
+    treatments = [catalog.by_id[tid] for tid in weights]
+    picks = rng.choices(treatments, weights=list(weights.values()), k=requests)
+    return [(t.name, t.duration_minutes) for t in picks]
+
+
+def linear_scan_earliest(service: CalendarService, start_date: str, duration_minutes: int,
+                         treatment_type: str, days_ahead: int) -> Optional[Tuple[str, str]]:
+    """The solver without indexes: try every start, provider and chair against every booking and rule"""
+    base = date.fromisoformat(start_date)
+    providers = [r for r in service.resources.values() if not r.is_chair and r.can_perform(treatment_type)]
+    chairs = [r for r in service.resources.values() if r.is_chair and r.can_perform(treatment_type)]
+    for offset in range(days_ahead + 1):
+        day = base + timedelta(days=offset)
+        date_str = day.isoformat()
+        weekday = WEEKDAY_NAMES[day.weekday()]
+        busy = [(rule.resource_id, *rule.interval()) for rule in service.block_rules.values() if rule.applies_to(day)]
+        for apt in service.appointments.values():
+            if apt.date == date_str and apt.status in ['scheduled', 'confirmed']:
+                start = service._time_to_minutes(apt.time)
+                busy += [(apt.provider_id, start, start + apt.duration_minutes),
+                         (apt.chair_id, start, start + apt.duration_minutes)]
+
+        def free(resource: Resource, start: int, end: int) -> bool:
+            if resource.hours is not None and not any(
+                    service._time_to_minutes(s) <= start and end <= service._time_to_minutes(e)
+                    for s, e in resource.hours.get(weekday, ())):
+                return False
+            return not any(rid in (None, resource.resource_id) and start < e and s < end for rid, s, e in busy)
+
+        for open_time, close_time in service.clinic_hours[weekday]:
+            for start in range(service._time_to_minutes(open_time),
+                               service._time_to_minutes(close_time) - duration_minutes + 1, 30):
+                end = start + duration_minutes
+                if any(free(p, start, end) for p in providers) and any(free(c, start, end) for c in chairs):
+                    return date_str, service._minutes_to_time(start)
+    return None
+
+
+def benchmark_resources(requests: int = 400):
+    print("\n🪑 Multi-chair scheduling over a week of demand")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "benchmark.db")
+        run_migrations(db_path)
+        catalog = load_catalog_sync(db_path)
+    monday = date.today() + timedelta(days=7 - date.today().weekday())
+    demand = weekly_demand(catalog, requests)
+
+    single, clinic, packed = CalendarService(), CalendarService(), CalendarService()
+    for service in (single, clinic, packed):
+        service.add_block_rule(BlockRule.weekly('Lunch break', '12:00', 60))
+    for resource in build_clinic_roster(catalog):
+        clinic.add_resource(resource)
+        packed.add_resource(resource)
+
+    def fill(service: CalendarService, pack: bool = False) -> Tuple[int, List[float]]:
+        booked, samples = 0, []
+        for n, (treatment, minutes) in enumerate(demand):
+            begin = time.perf_counter()
+            if pack:
+                slot = next(service.iter_free_windows_ahead(monday.isoformat(), minutes, 4, treatment_type=treatment,
+                                                            packed=True), None)
+            else:
+                slot = service.find_earliest_slot(monday.isoformat(), minutes, treatment, days_ahead=4)
+            samples.append((time.perf_counter() - begin) * 1e6)
+            if slot and asyncio.run(service.book_appointment(Appointment(
+                    f"week-{n}", f"patient-{n}", slot.date, slot.time, minutes, treatment))):
+                booked += 1
+        return booked, samples
+
+    single_booked, _ = fill(single)
+    clinic_booked, solver_samples = fill(clinic)
+    packed_booked, packed_samples = fill(packed, pack=True)
+    print(f"  {requests} requests over Mon-Fri: {single_booked} booked as one resource, "
+          f"{clinic_booked} with 5 chairs, {packed_booked} with 5 chairs packed tightest-fit first")
+    booked_minutes = {rid: 0 for rid in clinic.resources}
+    for apt in clinic.appointments.values():
+        booked_minutes[apt.provider_id] += apt.duration_minutes
+        booked_minutes[apt.chair_id] += apt.duration_minutes
+    def working_minutes(resource: Resource) -> int:
+        return sum(bin(clinic._weekday_masks(day)[0] & clinic._weekday_masks(day, resource.hours)[0]).count("1")
+                   for day in WEEKDAY_NAMES[:5]) * SLOT_MINUTES
+    print("  utilization " + ", ".join(f"{rid} {minutes / working_minutes(clinic.resources[rid]):.0%}"
+                                       for rid, minutes in booked_minutes.items()))
+
+    rng = random.Random(5)
+    probes = [(rng.choice(demand), rng.randrange(5)) for _ in range(200)]
+    probes = [((monday + timedelta(days=d)).isoformat(), minutes, treatment) for (treatment, minutes), d in probes]
+    mismatches = 0
+    for d, minutes, treatment in probes:
+        slot = clinic.find_earliest_slot(d, minutes, treatment, days_ahead=4)
+        if (slot and (slot.date, slot.time)) != linear_scan_earliest(clinic, d, minutes, treatment, 4):
+            mismatches += 1
+    print(f"  solver agrees with exhaustive search on {len(probes) - mismatches}/{len(probes)} probes")
+
+    clinic._window_cache.clear()
+    timings = {
+        "earliest (filling)": solver_samples,
+        "packed (filling)": packed_samples,
+        "earliest (scan)": [_time_us(linear_scan_earliest, clinic, d, m, t, 4) for d, m, t in probes],
+        "earliest (cold)": [_time_us(clinic.find_earliest_slot, d, m, t, 4) for d, m, t in probes],
+        "earliest (warm)": [_time_us(clinic.find_earliest_slot, d, m, t, 4) for _ in range(10) for d, m, t in probes],
+    }
+    for label, samples in timings.items():
+        print(f"  {label:<20} p50 {statistics.median(samples):9.1f} µs   p99 {percentile(samples, 99):9.1f} µs")
+
+
+PATIENT_FIRST_NAMES = ("Marie", "Jean", "Sophie", "Luc", "Nathalie", "Pierre", "Julie", "Marc", "Isabelle", "Louis")
+PATIENT_LAST_NAMES = ("Tremblay", "Gagnon", "Roy", "Côté", "Bouchard", "Gauthier", "Morin", "Lavoie", "Fortin", "Ouellet")
+
+
+def seed_patients(db_path: str, count: int, duplicate_rate: float = 0.0,
+                  seed: int = 11) -> List[Tuple[str, str, str]]:
+    """Insert count patients, plus re-registrations of duplicate_rate of them under
+    another spelling of their phone; returns the originals' (name, phone, date of birth)"""
+    import sqlite3
+    rng = random.Random(seed)
+    rows, patients = [], []
+    for i in range(count):
+        name = f"{rng.choice(PATIENT_FIRST_NAMES)} {rng.choice(PATIENT_LAST_NAMES)}"
+        phone = f"1-{rng.randint(200, 999)}-{555 + i // 10000}-{i % 10000:04d}"
+        dob = (date(1940, 1, 1) + timedelta(days=rng.randrange(25000))).isoformat()
+        rows.append((f"p{i}", name, phone, normalize_phone(phone), name_key(name), dob))
+        patients.append((name, phone, dob))
+    for i, (name, phone, dob) in enumerate(rng.sample(patients, int(count * duplicate_rate))):
+        respelled = phone.replace("1-", "", 1).replace("-", " ")
+        rows.append((f"dup{i}", name, respelled, normalize_phone(respelled), name_key(name), dob))
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT INTO patients (patient_id, name, phone, phone_normalized, name_key, date_of_birth, "
+                         "registration_date) VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)", rows)
+    return patients
+
+
+async def legacy_patient_lookup(db_path: str, phone: str, date_of_birth: str):
+    """The lookup before phone normalization: exact match, then an UPDATE and commit"""
+    async with get_connection_pool(db_path).writer() as conn:
+        cursor = await conn.execute("SELECT * FROM patients WHERE phone = ? AND date_of_birth = ? "
+                                    "AND status = 'active'", (phone, date_of_birth))
+        patient = await cursor.fetchone()
+        if patient:
+            await conn.execute("UPDATE patients SET last_visit = ? WHERE patient_id = ?",
+                               (datetime.now(), patient['patient_id']))
+            await conn.commit()
+        return patient
+
+
+def benchmark_patients(patients: int = 20000, probes: int = 200, duplicate_rate: float = 0.02):
+    print(f"\n🪪 Returning-patient lookup over {patients} patients")
+
+    async def run(db_path: str, registered: List[Tuple[str, str, str]]):
+        rng = random.Random(5)
+        people = rng.sample(registered, probes)
+        sample = [(phone, dob) for _, phone, dob in people]
+        # Callers rarely say the number the way it was typed in at registration
+        spoken = [(phone.replace("1-", "", 1).replace("-", " "), dob) for phone, dob in sample]
+        db_manager = AsyncDatabaseManager(db_path)
+        try:
+            async def timed(lookup, pairs):
+                samples, found = [], 0
+                for phone, dob in pairs:
+                    start = time.perf_counter()
+                    found += bool(await lookup(phone, dob))
+                    samples.append((time.perf_counter() - start) * 1e6)
+                return samples, found
+
+            timings = {
+                "legacy (as typed)": await timed(lambda p, d: legacy_patient_lookup(db_path, p, d), sample),
+                "legacy (as spoken)": await timed(lambda p, d: legacy_patient_lookup(db_path, p, d), spoken),
+                "indexed (cold)": await timed(db_manager.search_patient_by_phone_and_dob, spoken),
+                "indexed (cached)": await timed(db_manager.search_patient_by_phone_and_dob, spoken),
+                # At room join, by caller ID: candidates plus appointment history
+                "caller prefetch": await timed(lambda p, d: db_manager.get_caller_candidates(p), spoken),
+            }
+            # Registration-time duplicate check, as a re-registering caller would give their details
+            registrations = {phone: name.upper() for name, phone, _ in people}
+            timings["duplicate check"] = await timed(
+                lambda p, d: db_manager.find_duplicate_patient(registrations[p], p, d), sample)
+            await db_manager.writer.flush()
+
+            start = time.perf_counter()
+            groups = await db_manager.merge_duplicate_patients(apply=True)
+            dedup_ms = (time.perf_counter() - start) * 1e3
+        finally:
+            await close_connection_pools()
+        for label, (samples, found) in timings.items():
+            print(f"  {label:<20} found {found:>4}/{len(samples)}   p50 {statistics.median(samples):8.1f} µs   "
+                  f"p99 {percentile(samples, 99):8.1f} µs")
+        print(f"  cache                {get_patient_cache(db_path).get_stats()}")
+        print(f"  dedup job            merged {sum(len(g['merge']) for g in groups)} duplicates "
+              f"of {int(patients * duplicate_rate)} seeded in {dedup_ms:.0f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "benchmark.db")
+        run_migrations(db_path)
+        asyncio.run(run(db_path, seed_patients(db_path, patients, duplicate_rate)))
+
+
+# Project modules, leaves first
+PROJECT_MODULES = ("treatment_matcher", "treatment_catalog", "date_time_parser", "patient_identity", "db_migrations", "db_manager", "calendar_service",
+                   "calendar_store", "data_analysis_utils", "async_cli_tool", "alex_agent")
+
+
+def _run_fresh(code: str, *flags: str) -> subprocess.CompletedProcess:
+    """Run code in a new interpreter from the project directory, with bytecode caching on as deployed"""
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONDONTWRITEBYTECODE"}
+    return subprocess.run([sys.executable, *flags, "-c", code], capture_output=True, text=True, env=env,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import(module: str) -> Optional[Tuple[int, int]]:
+    """(self, cumulative) µs to import module in a fresh interpreter; None if it cannot be imported here"""
+    result = _run_fresh(f"import {module}", "-X", "importtime")
+    if result.returncode != 0:
+        return None
+    # Lines look like "import time:       123 |       4567 | module"
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[0].split(":")[1]), int(fields[1])
+    return None
+
+
+def benchmark_imports(rounds: int = 5):
+    print("\n📦 Import cost per project module (fresh interpreter each time)")
+    for module in PROJECT_MODULES:
+        samples = [measure_import(module) for _ in range(rounds)]
+        if None in samples:
+            print(f"  {module:<20} not importable here (missing dependency)")
+            continue
+        print(f"  {module:<20} self p50 {statistics.median(s for s, _ in samples) / 1e3:7.2f} ms   "
+              f"with dependencies p50 {statistics.median(c for _, c in samples) / 1e3:7.2f} ms")
+    first_use = [float(_run_fresh(
+        "import time, calendar_service; begin = time.perf_counter(); calendar_service.get_calendar_service(); "
+        "print((time.perf_counter() - begin) * 1e6)").stdout) for _ in range(rounds)]
+    print(f"  calendar first use   p50 {statistics.median(first_use):7.1f} µs (deferred from import to prewarm)")
+
+
+SECTIONS = {
+    "treatments": benchmark_treatments,
+    "calendar": benchmark_calendar,
+    "resources": benchmark_resources,
+    "dates": benchmark_dates,
+    "patients": benchmark_patients,
+    "imports": benchmark_imports,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dental assistant performance benchmarks")
+    parser.add_argument("sections", nargs="*", help=f"Sections to run: {', '.join(SECTIONS)} (default: all)")
+    args = parser.parse_args()
+    unknown = [name for name in args.sections if name not in SECTIONS]
+    if unknown:
+        parser.error(f"unknown section(s): {', '.join(unknown)}")
+    for name in args.sections or SECTIONS:
+        SECTIONS[name]()
+
+
+if __name__ == "__main__":
+    main()
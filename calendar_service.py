@@ -3,10 +3,13 @@ Calendar Service for SmileRight Dental Clinic
 Provides calendar integration for appointment scheduling
 """
 
-import asyncio
+import itertools
 import logging
-from datetime import datetime, timedelta, time
-from typing import List, Dict, Optional, Tuple
+import math
+import time as _time
+import uuid
+from datetime import date, datetime, timedelta, time
+from typing import Callable, FrozenSet, Iterator, List, Dict, Optional, Tuple
 from dataclasses import dataclass
 import json
 
@@ -18,6 +21,8 @@ class TimeSlot:
     time: str  # HH:MM format
     duration_minutes: int
     available: bool = True
+    provider_id: Optional[str] = None  # set when the clinic schedules by resource
+    chair_id: Optional[str] = None
 
 @dataclass
 class Appointment:
@@ -28,6 +33,279 @@ class Appointment:
     duration_minutes: int
     treatment_type: str
     status: str = "scheduled"
+    notes: Optional[str] = None
+    provider_id: Optional[str] = None
+    chair_id: Optional[str] = None
+
+@dataclass
+class SlotHold:
+    """A slot offered to a caller and kept off the market until expires_at (epoch seconds)"""
+    hold_id: str
+    holder: str
+    date: str
+    time: str
+    duration_minutes: int
+    expires_at: float
+    provider_id: Optional[str] = None
+    chair_id: Optional[str] = None
+
+# How long an offered slot stays held while the caller decides
+HOLD_TTL_SECONDS = 120.0
+
+class TimerWheel:
+    """
+    Hashed timing wheel: deadlines are filed in one of `slots` buckets of
+    `tick_seconds` each, so scheduling and expiry cost O(1) per timer and
+    advancing only visits the buckets for the ticks that have passed.
+    """
+    
+    def __init__(self, tick_seconds: float = 1.0, slots: int = 256):
+        self.tick_seconds = tick_seconds
+        self.buckets: List[Dict[str, float]] = [{} for _ in range(slots)]
+        self._bucket_of: Dict[str, int] = {}
+        self._last_tick: Optional[int] = None
+    
+    def schedule(self, key: str, deadline: float):
+        self.cancel(key)
+        # File under the first tick at or after the deadline, never one already passed
+        tick = math.ceil(deadline / self.tick_seconds)
+        if self._last_tick is not None:
+            tick = max(tick, self._last_tick + 1)
+        index = tick % len(self.buckets)
+        self.buckets[index][key] = deadline
+        self._bucket_of[key] = index
+    
+    def cancel(self, key: str):
+        index = self._bucket_of.pop(key, None)
+        if index is not None:
+            self.buckets[index].pop(key, None)
+    
+    def advance(self, now: float) -> List[str]:
+        """Keys whose deadline has passed, removed from the wheel"""
+        tick = int(now // self.tick_seconds)
+        if self._last_tick is None:
+            self._last_tick = tick - len(self.buckets)
+        ticks = range(max(self._last_tick + 1, tick - len(self.buckets) + 1), tick + 1)
+        self._last_tick = tick
+        expired = []
+        for t in ticks:
+            bucket = self.buckets[t % len(self.buckets)]
+            # Buckets are shared by deadlines a whole wheel turn apart
+            due = [key for key, deadline in bucket.items() if deadline <= now]
+            for key in due:
+                del bucket[key]
+                del self._bucket_of[key]
+            expired.extend(due)
+        return expired
+    
+    def __len__(self) -> int:
+        return len(self._bucket_of)
+
+@dataclass(frozen=True)
+class BlockRule:
+    """
+    Recurring blocked time, evaluated per day on demand instead of being
+    materialized ahead: weekly patterns (lunch), single or annual holidays,
+    and date ranges (vacations).
+    """
+    reason: str
+    time: Optional[str] = None  # HH:MM; None blocks the whole day
+    duration_minutes: int = 0
+    weekdays: Optional[FrozenSet[int]] = None  # 0 = Monday; None = every day
+    start_date: Optional[str] = None  # first day the rule applies, inclusive
+    end_date: Optional[str] = None  # last day the rule applies, inclusive
+    annual_dates: FrozenSet[str] = frozenset()  # MM-DD days blocked every year
+    resource_id: Optional[str] = None  # blocks one provider or chair; None = the whole clinic
+    
+    @classmethod
+    def weekly(cls, reason: str, time_str: str, duration_minutes: int, weekdays=range(5), **kwargs) -> "BlockRule":
+        return cls(reason, time_str, duration_minutes, frozenset(weekdays), **kwargs)
+    
+    @classmethod
+    def holiday(cls, date_str: str, reason: str = "Holiday") -> "BlockRule":
+        """A closed day: YYYY-MM-DD once, or MM-DD every year"""
+        if len(date_str) == 5:
+            return cls(reason, annual_dates=frozenset([date_str]))
+        return cls(reason, start_date=date_str, end_date=date_str)
+    
+    @classmethod
+    def vacation(cls, start_date: str, end_date: str, reason: str = "Vacation",
+                 resource_id: Optional[str] = None) -> "BlockRule":
+        return cls(reason, start_date=start_date, end_date=end_date, resource_id=resource_id)
+    
+    def applies_to(self, day: date) -> bool:
+        iso = day.isoformat()
+        if self.start_date and iso < self.start_date:
+            return False
+        if self.end_date and iso > self.end_date:
+            return False
+        if self.weekdays is not None and day.weekday() not in self.weekdays:
+            return False
+        return not self.annual_dates or iso[5:] in self.annual_dates
+    
+    def interval(self) -> Tuple[int, int]:
+        """Blocked minutes since midnight"""
+        if self.time is None:
+            return 0, 24 * 60
+        hours, minutes = map(int, self.time.split(':'))
+        start = hours * 60 + minutes
+        return start, start + self.duration_minutes
+
+# Joins the treatment names of a combined visit in Appointment.treatment_type
+VISIT_SEPARATOR = " + "
+
+# Free time shorter than this left between bookings rarely gets booked
+PACKING_MIN_GAP_MINUTES = 30
+
+# Kinds of resource; every appointment needs one provider and one chair
+PROVIDER_KINDS = ('dentist', 'hygienist')
+CHAIR = 'chair'
+
+@dataclass
+class Resource:
+    """
+    A provider or a chair. hours (same shape as CalendarService.clinic_hours)
+    narrows the clinic's hours for this resource; treatments restricts it to
+    the listed treatment names or ids, case-insensitively.
+    """
+    resource_id: str
+    kind: str  # 'dentist', 'hygienist' or 'chair'
+    name: str = ""
+    hours: Optional[Dict[str, List[Tuple[str, str]]]] = None  # None = whenever the clinic is open
+    treatments: Optional[FrozenSet[str]] = None  # None = any treatment
+    
+    def __post_init__(self):
+        if self.kind not in PROVIDER_KINDS and self.kind != CHAIR:
+            raise ValueError(f"Unknown resource kind: {self.kind}")
+        if self.treatments is not None:
+            self.treatments = frozenset(t.casefold() for t in self.treatments)
+    
+    @property
+    def is_chair(self) -> bool:
+        return self.kind == CHAIR
+    
+    def can_perform(self, treatment_type: Optional[str]) -> bool:
+        """Whether the resource may take the treatment, or every treatment of a combined visit"""
+        if self.treatments is None or treatment_type is None:
+            return True
+        return all(part.casefold() in self.treatments for part in treatment_type.split(VISIT_SEPARATOR))
+
+def load_resources(path: str) -> List[Resource]:
+    """Resources from a JSON list of objects with the Resource fields"""
+    with open(path) as f:
+        entries = json.load(f)
+    for entry in entries:
+        if entry.get('hours'):
+            entry['hours'] = {day: [tuple(span) for span in spans] for day, spans in entry['hours'].items()}
+    return [Resource(**entry) for entry in entries]
+
+WEEKDAY_NAMES = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# Occupancy bitmaps use one bit per 5-minute bucket of the day
+SLOT_MINUTES = 5
+
+def minutes_to_mask(start: int, end: int) -> int:
+    """Bitmap of the buckets touched by [start, end); partial buckets count as busy"""
+    first = start // SLOT_MINUTES
+    last = -(-end // SLOT_MINUTES)
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+def window_starts(free: int, buckets: int) -> int:
+    """Bits i where buckets i .. i+buckets-1 are all set in free"""
+    starts, span = free, 1
+    while span < buckets:
+        step = min(span, buckets - span)
+        starts &= starts >> step
+        span += step
+    return starts
+
+def flush_starts(free: int, buckets: int) -> int:
+    """Bits i where a window of buckets starting at i would touch an unavailable bucket on either side"""
+    return (~free << 1) | (~free >> buckets)
+
+def run_bounds(free: int, bucket: int) -> Tuple[int, int]:
+    """[first, last + 1) of the run of free buckets containing bucket"""
+    below = ~free & ((1 << bucket) - 1)
+    above = ~free >> bucket
+    return below.bit_length(), bucket + (above & -above).bit_length() - 1
+
+def fragmentation(free: int, bucket: int, buckets: int) -> Tuple[int, int, int]:
+    """How badly a window placed at bucket cuts up its run of free time, smaller is better:
+    (minutes stranded in gaps too short to book, gaps left on either side, length of the run)"""
+    first, end = run_bounds(free, bucket)
+    gaps = [(bucket - first) * SLOT_MINUTES, (end - bucket - buckets) * SLOT_MINUTES]
+    return (sum(gap for gap in gaps if gap < PACKING_MIN_GAP_MINUTES),
+            sum(1 for gap in gaps if gap),
+            (end - first) * SLOT_MINUTES)
+
+def join_spoken(items: List[str]) -> str:
+    """Join items the way they are said aloud: "a, b and c" """
+    if len(items) <= 1:
+        return "".join(items)
+    return ", ".join(items[:-1]) + " and " + items[-1]
+
+def spoken_time(time_str: str) -> str:
+    """ "14:30" -> "2:30 PM", "09:00" -> "9 AM" """
+    hours, minutes = map(int, time_str.split(':'))
+    suffix = "AM" if hours < 12 else "PM"
+    hours = hours % 12 or 12
+    return f"{hours} {suffix}" if minutes == 0 else f"{hours}:{minutes:02d} {suffix}"
+
+def spoken_date(date_str: str, today: date) -> str:
+    """ "today", "tomorrow" or "Monday, February 3rd" """
+    day = date.fromisoformat(date_str)
+    if day == today:
+        return "today"
+    if day == today + timedelta(days=1):
+        return "tomorrow"
+    suffix = "th" if 11 <= day.day <= 13 else {1: "st", 2: "nd", 3: "rd"}.get(day.day % 10, "th")
+    return f"{WEEKDAY_NAMES[day.weekday()].title()}, {day.strftime('%B')} {day.day}{suffix}"
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Indexes of the set bits, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+class DayIndex:
+    """
+    Occupancy of one clinic day as an int bitmap. Busy intervals are kept
+    per owner so a cancellation can rebuild the bitmap without the others.
+    """
+    
+    def __init__(self):
+        self.intervals: Dict[str, Tuple[int, int]] = {}
+        self.busy = 0
+        self.version = 0  # bumped on every change, keys cached free-window summaries
+    
+    def add(self, key: str, start: int, end: int):
+        self.intervals[key] = (start, end)
+        self.busy |= minutes_to_mask(start, end)
+        self.version += 1
+    
+    def remove(self, key: str) -> bool:
+        if self.intervals.pop(key, None) is None:
+            return False
+        busy = 0
+        for start, end in self.intervals.values():
+            busy |= minutes_to_mask(start, end)
+        self.busy = busy
+        self.version += 1
+        return True
+    
+    def is_free(self, start: int, end: int, ignore: Tuple[str, ...] = ()) -> bool:
+        """True when [start, end) is free, optionally disregarding the intervals keyed by ignore"""
+        busy = self.busy
+        if ignore and any(key in self.intervals for key in ignore):
+            busy = 0
+            for key, (s, e) in self.intervals.items():
+                if key not in ignore:
+                    busy |= minutes_to_mask(s, e)
+        return not busy & minutes_to_mask(start, end)
+    
+    def __len__(self) -> int:
+        return len(self.intervals)
 
 class CalendarService:
     """
@@ -36,7 +314,7 @@ class CalendarService:
     Google Calendar, Outlook, or a dedicated scheduling system
     """
     
-    def __init__(self):
+    def __init__(self, clock: Callable[[], float] = _time.time):
         self.clinic_hours = {
             'monday': [('08:00', '12:00'), ('13:00', '18:00')],
             'tuesday': [('08:00', '12:00'), ('13:00', '18:00')],
@@ -51,10 +329,178 @@ class CalendarService:
         self.appointments: Dict[str, Appointment] = {}
         self.blocked_times: List[TimeSlot] = []
         
+        # Per-date indexes maintained on book/cancel/block, so availability
+        # checks never scan the whole appointment history
+        self._day_index: Dict[str, DayIndex] = {}
+        self._appointments_by_date: Dict[str, Dict[str, Appointment]] = {}
+        self._block_ids = itertools.count()
+        # Recurring blocks, compiled into a day's index when it is first used
+        self.block_rules: Dict[int, BlockRule] = {}
+        self._rule_ids = itertools.count()
+        # weekday hours -> (open-hours bitmap, bitmap of 30-minute slot starts)
+        self._hours_masks: Dict[Tuple[Tuple[str, str], ...], Tuple[int, int]] = {}
+        # (date, duration, treatment) -> (day versions, open-hours mask, free slot starts)
+        self._window_cache: Dict[Tuple[str, int, Optional[str]], Tuple[Tuple[int, ...], int, int]] = {}
+        self.window_cache_size = 4096
+        # describe_openings arguments -> ((date, versions) of the days read, spoken text)
+        self._spoken_cache: Dict[tuple, Tuple[Tuple[Tuple[str, Tuple[int, ...]], ...], Optional[str]]] = {}
+        
+        # Optional durable store (calendar_store.CalendarStore); days are read
+        # through it and kept as a write-through cache. Queries answer from the
+        # cache: async callers bring the days they ask about up to date with
+        # refresh_days() first, so no query blocks the event loop on the store.
+        self.store = None
+        self._day_loaded_at: Dict[str, float] = {}
+        # Bumped as each write-through completes, so a day read that may predate it is not applied
+        self._store_writes = 0
+        
+        # Tentative holds on offered slots, expired by a timer wheel read
+        # against clock (epoch seconds; injectable so tests can move time)
+        self.clock = clock
+        self.holds: Dict[str, SlotHold] = {}
+        self._hold_wheel = TimerWheel()
+        
+        # Providers and chairs with their own per-day indexes; with none
+        # configured the whole clinic is a single resource
+        self.resources: Dict[str, Resource] = {}
+        self._ranked_resources: List[Resource] = []
+        self._resource_days: Dict[Tuple[str, str], DayIndex] = {}
+    
+    def add_resource(self, resource: Resource):
+        """Schedule by resource: a booking then needs a free qualified provider and a free chair"""
+        self.resources[resource.resource_id] = resource
+        self._ranked_resources = sorted(self.resources.values(),
+                                        key=lambda r: (r.treatments is None, len(r.treatments or ())))
+        self._window_cache.clear()
+        logger.info(f"Resource added: {resource.kind} {resource.resource_id}")
+    
+    def attach_store(self, store):
+        """Back the calendar with a durable store; cached appointments are re-read from it"""
+        for appointment in list(self.appointments.values()):
+            self._unindex_appointment(appointment)
+        self.appointments.clear()
+        self._day_loaded_at.clear()
+        self.store = store
+    
+    async def refresh_days(self, start_date: str, days_ahead: int = 0):
+        """Re-read start_date and the days_ahead days after it from the store where their cached copy has expired"""
+        if self.store is None:
+            return
+        base_date = date.fromisoformat(start_date)
+        for i in range(days_ahead + 1):
+            await self._refresh_day((base_date + timedelta(days=i)).isoformat())
+    
+    async def _refresh_day(self, date_str: str):
+        """Re-read a day from the store when its cached copy has expired"""
+        if self.store is None:
+            return
+        loaded_at = self._day_loaded_at.get(date_str)
+        now = _time.monotonic()
+        if loaded_at is not None and now - loaded_at < self.store.revalidate_seconds:
+            return
+        writes = self._store_writes
+        stored = {apt.appointment_id: apt for apt in await self.store.load_day(date_str)}
+        stored_holds = {hold.hold_id: hold for hold in await self.store.load_holds(date_str, self.clock())}
+        if writes != self._store_writes:
+            return  # the read may predate a booking this worker just made; re-read on next use
+        self._day_loaded_at[date_str] = now
+        cached = self._appointments_by_date.get(date_str, {})
+        cached_holds = {hold_id: hold for hold_id, hold in self.holds.items() if hold.date == date_str}
+        if (stored == {key: apt for key, apt in cached.items() if apt.status in ['scheduled', 'confirmed']}
+                and stored_holds == cached_holds):
+            return  # unchanged: keep the day's version so cached free windows stay valid
+        for appointment in list(cached.values()):
+            self._unindex_appointment(appointment)
+            self.appointments.pop(appointment.appointment_id, None)
+        for appointment in stored.values():
+            self.appointments[appointment.appointment_id] = appointment
+            self._index_appointment(appointment)
+        for hold in cached_holds.values():
+            self._unindex_hold(hold)
+        for hold in stored_holds.values():
+            self._index_hold(hold)
+    
+    def _index_hold(self, hold: SlotHold):
+        start = self._time_to_minutes(hold.time)
+        for day in self._occupied_days(hold.date, hold.provider_id, hold.chair_id):
+            day.add(f"hold:{hold.hold_id}", start, start + hold.duration_minutes)
+        self.holds[hold.hold_id] = hold
+        self._hold_wheel.schedule(hold.hold_id, hold.expires_at)
+    
+    def _unindex_hold(self, hold: SlotHold):
+        for day in self._touched_days(hold.date, hold.provider_id, hold.chair_id):
+            day.remove(f"hold:{hold.hold_id}")
+        self.holds.pop(hold.hold_id, None)
+        self._hold_wheel.cancel(hold.hold_id)
+    
+    def _expire_holds(self):
+        """Drop holds whose TTL has passed from the local view"""
+        if not self.holds:
+            return
+        for hold_id in self._hold_wheel.advance(self.clock()):
+            hold = self.holds.get(hold_id)
+            if hold:
+                self._unindex_hold(hold)
+                logger.info(f"Hold expired: {hold.date} {hold.time} ({hold.holder})")
+    
+    def _hold_keys(self, holder: Optional[str]) -> Tuple[str, ...]:
+        if holder is None:
+            return ()
+        return tuple(f"hold:{hold.hold_id}" for hold in self.holds.values() if hold.holder == holder)
+    
+    async def place_hold(self, date_str: str, time_str: str, duration_minutes: int, holder: str,
+                         ttl: float = HOLD_TTL_SECONDS, treatment_type: Optional[str] = None) -> Optional[SlotHold]:
+        """Hold a free slot for holder until the TTL passes; None if the slot is no longer free"""
+        await self._refresh_day(date_str)
+        if not self._is_slot_available(date_str, time_str, duration_minutes, holder, treatment_type):
+            return None
+        provider_id = chair_id = None
+        if self.resources:
+            start = self._time_to_minutes(time_str)
+            provider_id, chair_id = self._assign(date_str, start, start + duration_minutes, treatment_type, holder)
+        hold = SlotHold(str(uuid.uuid4()), holder, date_str, time_str, duration_minutes, self.clock() + ttl,
+                        provider_id, chair_id)
+        if self.store is not None:
+            placed = await self.store.place_hold(hold)
+            self._store_writes += 1
+            if not placed:
+                self._day_loaded_at.pop(date_str, None)
+                return None
+        self._index_hold(hold)
+        return hold
+    
+    async def release_holds(self, holder: str):
+        """Give back every slot held for holder"""
+        if self.store is not None:
+            await self.store.release_holds(holder)
+            self._store_writes += 1
+        for hold in [h for h in self.holds.values() if h.holder == holder]:
+            self._unindex_hold(hold)
+    
+    async def offer_alternative_times(self, preferred_date: str, duration_minutes: int = 30,
+                                      days_ahead: int = 7, holder: Optional[str] = None,
+                                      ttl: float = HOLD_TTL_SECONDS, limit: Optional[int] = None,
+                                      treatment_type: Optional[str] = None, packed: bool = False,
+                                      not_before: Optional[str] = None) -> List[TimeSlot]:
+        """suggest_alternative_times, holding up to `limit` suggestions for holder while they decide"""
+        await self.refresh_days(preferred_date, days_ahead)
+        if holder is None:
+            return self.suggest_alternative_times(preferred_date, duration_minutes, days_ahead,
+                                                  treatment_type, packed, not_before)[:limit]
+        await self.release_holds(holder)  # a new offer replaces the previous one
+        suggestions = self.suggest_alternative_times(preferred_date, duration_minutes, days_ahead,
+                                                     treatment_type, packed, not_before)
+        held = []
+        for slot in suggestions:
+            if limit is not None and len(held) >= limit:
+                break
+            if await self.place_hold(slot.date, slot.time, slot.duration_minutes, holder, ttl, treatment_type):
+                held.append(slot)
+        return held
+        
     def _get_weekday_name(self, date_str: str) -> str:
         """Get weekday name from date string"""
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-        return date_obj.strftime('%A').lower()
+        return WEEKDAY_NAMES[datetime.fromisoformat(date_str).weekday()]
     
     def _time_to_minutes(self, time_str: str) -> int:
         """Convert HH:MM to minutes since midnight"""
@@ -67,14 +513,19 @@ class CalendarService:
         mins = minutes % 60
         return f"{hours:02d}:{mins:02d}"
     
-    def is_clinic_open(self, date_str: str, time_str: str) -> bool:
-        """Check if clinic is open at given date and time"""
+    def is_clinic_open(self, date_str: str, time_str: str, duration_minutes: int = 0) -> bool:
+        """Check if clinic is open at given date and time, and with a duration, until the visit ends"""
         weekday = self._get_weekday_name(date_str)
         
         if weekday not in self.clinic_hours or not self.clinic_hours[weekday]:
             return False
         
         time_minutes = self._time_to_minutes(time_str)
+        if duration_minutes > 0:
+            # The whole visit must fall within opening hours, as for iter_free_windows
+            open_mask, _ = self._weekday_masks(weekday)
+            window = minutes_to_mask(time_minutes, time_minutes + duration_minutes)
+            return window & open_mask == window
         
         for start_time, end_time in self.clinic_hours[weekday]:
             start_minutes = self._time_to_minutes(start_time)
@@ -85,78 +536,390 @@ class CalendarService:
         
         return False
     
-    def get_available_slots(self, date_str: str, duration_minutes: int = 30) -> List[TimeSlot]:
-        """Get available time slots for a given date"""
+    def _weekday_masks(self, weekday: str, hours_by_day: Optional[Dict] = None) -> Tuple[int, int]:
+        """(open-hours bitmap, 30-minute slot starts) for the clinic's hours, or for hours_by_day's"""
+        hours_by_day = self.clinic_hours if hours_by_day is None else hours_by_day
+        hours = tuple(tuple(span) for span in hours_by_day.get(weekday) or ())
+        masks = self._hours_masks.get(hours)
+        if masks is None:
+            open_mask = grid = 0
+            for start_time, end_time in hours:
+                start_minutes = self._time_to_minutes(start_time)
+                end_minutes = self._time_to_minutes(end_time)
+                open_mask |= minutes_to_mask(start_minutes, end_minutes)
+                for minutes in range(start_minutes, end_minutes, 30):  # 30-minute intervals
+                    grid |= 1 << (minutes // SLOT_MINUTES)
+            masks = self._hours_masks[hours] = (open_mask, grid)
+        return masks
+    
+    def _free_window_starts(self, date_str: str, duration_minutes: int, treatment_type: Optional[str] = None) -> int:
+        """Bitmap of slot starts on the 30-minute grid where the whole window is open and free
+        (for a qualified provider and a chair, when scheduling by resource)"""
         weekday = self._get_weekday_name(date_str)
-        
-        if weekday not in self.clinic_hours or not self.clinic_hours[weekday]:
-            return []
-        
-        available_slots = []
-        
-        for start_time, end_time in self.clinic_hours[weekday]:
-            start_minutes = self._time_to_minutes(start_time)
-            end_minutes = self._time_to_minutes(end_time)
-            
-            # Generate 30-minute slots
-            current_time = start_minutes
-            while current_time + duration_minutes <= end_minutes:
-                time_str = self._minutes_to_time(current_time)
-                
-                # Check if slot is available (not booked)
-                if self._is_slot_available(date_str, time_str, duration_minutes):
-                    available_slots.append(TimeSlot(
-                        date=date_str,
-                        time=time_str,
-                        duration_minutes=duration_minutes,
-                        available=True
-                    ))
-                
-                current_time += 30  # 30-minute intervals
-        
-        return available_slots
+        open_mask, grid = self._weekday_masks(weekday)
+        if not open_mask:
+            return 0
+        version = self._day_versions(date_str)
+        day = self._existing_day(date_str)
+        if not self.resources:
+            treatment_type = None
+        key = (date_str, duration_minutes, treatment_type and treatment_type.casefold())
+        cached = self._window_cache.get(key)
+        if cached and cached[0] == version and cached[1] == open_mask:
+            return cached[2]
+        free = open_mask & ~day.busy if day else open_mask
+        buckets = -(-duration_minutes // SLOT_MINUTES)
+        if self.resources:
+            starts = self._resource_window_starts(date_str, weekday, free, buckets, treatment_type) & grid
+        else:
+            starts = window_starts(free, buckets) & grid
+        if key not in self._window_cache and len(self._window_cache) >= self.window_cache_size:
+            del self._window_cache[next(iter(self._window_cache))]  # evict the oldest entry
+        self._window_cache[key] = (version, open_mask, starts)
+        return starts
     
-    def _is_slot_available(self, date_str: str, time_str: str, duration_minutes: int) -> bool:
-        """Check if a specific time slot is available"""
+    def _day_versions(self, date_str: str) -> Tuple[int, ...]:
+        """Versions of the day's clinic and resource indexes, once caught up with expired holds;
+        anything derived from the day is still valid while these are unchanged"""
+        self._expire_holds()
+        day = self._existing_day(date_str)
+        version = (day.version if day else 0,)
+        if self.resources:
+            version += tuple(rd.version if rd else 0
+                             for rd in (self._existing_day(date_str, rid) for rid in self.resources))
+        return version
+    
+    def describe_openings(self, start_date: str, duration_minutes: int = 30, treatment_type: Optional[str] = None,
+                          days_ahead: int = 7, max_days: int = 3, per_day: int = 3,
+                          not_before: Optional[str] = None, today: Optional[date] = None) -> Optional[str]:
+        """
+        The next openings as they would be read out, e.g. "tomorrow at 9 AM,
+        11:30 AM and 1 PM; Thursday, February 6th at 8 AM"; None when
+        nothing is free. Each day offers its tightest fits (iter_packed_windows)
+        in time order; not_before (HH:MM) applies to start_date only. The text
+        is cached until one of the days it was built from changes.
+        """
+        today = today or date.today()
+        key = (start_date, duration_minutes, treatment_type, days_ahead, max_days, per_day, not_before, today)
+        cached = self._spoken_cache.get(key)
+        if cached and all(self._day_versions(date_str) == version for date_str, version in cached[0]):
+            return cached[1]
+        days_read, openings = [], []
+        base_date = date.fromisoformat(start_date)
+        for i in range(days_ahead + 1):
+            date_str = (base_date + timedelta(days=i)).isoformat()
+            slots = self.iter_packed_windows(date_str, duration_minutes, treatment_type, not_before if i == 0 else None)
+            times = sorted(slot.time for slot in itertools.islice(slots, per_day))
+            days_read.append((date_str, self._day_versions(date_str)))
+            if times:
+                openings.append(f"{spoken_date(date_str, today)} at {join_spoken([spoken_time(t) for t in times])}")
+                if len(openings) == max_days:
+                    break
+        text = "; ".join(openings) or None
+        if key not in self._spoken_cache and len(self._spoken_cache) >= self.window_cache_size:
+            del self._spoken_cache[next(iter(self._spoken_cache))]  # evict the oldest entry
+        self._spoken_cache[key] = (tuple(days_read), text)
+        return text
+    
+    def iter_free_windows(self, date_str: str, duration_minutes: int = 30, treatment_type: Optional[str] = None,
+                          not_before: Optional[str] = None) -> Iterator[TimeSlot]:
+        """Free slots of a day in time order, materialized only as they are consumed;
+        none start before not_before (HH:MM, e.g. now)"""
+        starts = self._free_window_starts(date_str, duration_minutes, treatment_type)
+        if not_before:
+            starts &= ~minutes_to_mask(0, self._time_to_minutes(not_before))
+        for bucket in iter_bits(starts):
+            start = bucket * SLOT_MINUTES
+            provider_id = chair_id = None
+            if self.resources:
+                provider_id, chair_id = self._assign(date_str, start, start + duration_minutes, treatment_type)
+            yield TimeSlot(
+                date=date_str,
+                time=self._minutes_to_time(start),
+                duration_minutes=duration_minutes,
+                available=True,
+                provider_id=provider_id,
+                chair_id=chair_id
+            )
+    
+    def iter_packed_windows(self, date_str: str, duration_minutes: int = 30, treatment_type: Optional[str] = None,
+                            not_before: Optional[str] = None) -> Iterator[TimeSlot]:
+        """
+        Free slots of a day, tightest fit first. Besides the 30-minute grid a
+        slot may start flush against a booking, a block or closing time, so a
+        5-minute x-ray slots in right after a filling and a 90-minute root
+        canal ends where the lunch break begins. Slots are ranked by
+        fragmentation() of the time they leave around them, then by time.
+        Time before not_before (HH:MM, e.g. now) counts as taken.
+        """
+        weekday = self._get_weekday_name(date_str)
+        open_mask, grid = self._weekday_masks(weekday)
+        if not open_mask:
+            return
+        self._expire_holds()
+        day = self._existing_day(date_str)
+        free = open_mask & ~day.busy if day else open_mask
+        if not_before:
+            free &= ~minutes_to_mask(0, self._time_to_minutes(not_before))
+        buckets = -(-duration_minutes // SLOT_MINUTES)
+        # Candidate resources per kind, with the buckets each has free
+        if self.resources:
+            providers, chairs = self._candidates(treatment_type)
+            groups = {kind: [(r.resource_id, self._resource_free(date_str, weekday, r, free)) for r in group]
+                      for kind, group in (('provider', providers), ('chair', chairs)) if group is not None}
+        else:
+            groups = {'clinic': [(None, free)]}
+        starts = -1
+        aligned = grid
+        for group in groups.values():
+            group_starts = 0
+            for _, resource_free in group:
+                group_starts |= window_starts(resource_free, buckets)
+                aligned |= flush_starts(resource_free, buckets)
+            starts &= group_starts
+        ranked = []
+        for bucket in iter_bits(starts & aligned):
+            score, chosen = (0, 0, 0), {}
+            for kind, group in groups.items():
+                # Each kind independently takes the resource the window fits best
+                fit, chosen[kind] = min((fragmentation(resource_free, bucket, buckets), resource_id)
+                                        for resource_id, resource_free in group
+                                        if window_starts(resource_free >> bucket, buckets) & 1)
+                score = tuple(a + b for a, b in zip(score, fit))
+            ranked.append((score, bucket, chosen))
+        ranked.sort(key=lambda entry: entry[:2])
+        for _, bucket, chosen in ranked:
+            yield TimeSlot(
+                date=date_str,
+                time=self._minutes_to_time(bucket * SLOT_MINUTES),
+                duration_minutes=duration_minutes,
+                available=True,
+                provider_id=chosen.get('provider'),
+                chair_id=chosen.get('chair')
+            )
+    
+    def iter_free_windows_ahead(self, start_date: str, duration_minutes: int = 30, days_ahead: int = 7,
+                                per_day: Optional[int] = None, treatment_type: Optional[str] = None,
+                                packed: bool = False) -> Iterator[TimeSlot]:
+        """Free slots from start_date through days_ahead later days, at most per_day per day.
+        Days are only examined as the caller asks for more, so stopping early skips the rest."""
+        windows = self.iter_packed_windows if packed else self.iter_free_windows
+        base_date = datetime.fromisoformat(start_date).date()
+        for i in range(days_ahead + 1):
+            date_str = (base_date + timedelta(days=i)).isoformat()
+            yield from itertools.islice(windows(date_str, duration_minutes, treatment_type), per_day)
+    
+    def find_free_windows(self, date_str: str, duration_minutes: int = 30, limit: int = 3,
+                          treatment_type: Optional[str] = None, packed: bool = False,
+                          not_before: Optional[str] = None) -> List[TimeSlot]:
+        """First `limit` free slots of a day, in time order or tightest fit first"""
+        windows = self.iter_packed_windows if packed else self.iter_free_windows
+        return list(itertools.islice(windows(date_str, duration_minutes, treatment_type, not_before), limit))
+    
+    def find_earliest_slot(self, start_date: str, duration_minutes: int = 30, treatment_type: Optional[str] = None,
+                           days_ahead: int = 30) -> Optional[TimeSlot]:
+        """Earliest slot from start_date on where a qualified provider and a chair are both free"""
+        return next(self.iter_free_windows_ahead(start_date, duration_minutes, days_ahead,
+                                                 treatment_type=treatment_type), None)
+    
+    def count_available_slots(self, date_str: str, duration_minutes: int = 30,
+                              treatment_type: Optional[str] = None) -> int:
+        return bin(self._free_window_starts(date_str, duration_minutes, treatment_type)).count("1")
+    
+    def get_available_slots(self, date_str: str, duration_minutes: int = 30,
+                            treatment_type: Optional[str] = None) -> List[TimeSlot]:
+        """Get available time slots for a given date"""
+        return list(self.iter_free_windows(date_str, duration_minutes, treatment_type))
+    
+    def _is_slot_available(self, date_str: str, time_str: str, duration_minutes: int,
+                           holder: Optional[str] = None, treatment_type: Optional[str] = None) -> bool:
+        """Check if a specific time slot is available (to holder, whose own holds do not count)"""
+        self._expire_holds()
+        day = self._existing_day(date_str)
         slot_start = self._time_to_minutes(time_str)
-        slot_end = slot_start + duration_minutes
-        
-        # Check against existing appointments
-        for appointment in self.appointments.values():
-            if appointment.date == date_str and appointment.status in ['scheduled', 'confirmed']:
-                apt_start = self._time_to_minutes(appointment.time)
-                apt_end = apt_start + appointment.duration_minutes
-                
-                # Check for overlap
-                if not (slot_end <= apt_start or slot_start >= apt_end):
-                    return False
-        
-        # Check against blocked times
-        for blocked in self.blocked_times:
-            if blocked.date == date_str:
-                blocked_start = self._time_to_minutes(blocked.time)
-                blocked_end = blocked_start + blocked.duration_minutes
-                
-                if not (slot_end <= blocked_start or slot_start >= blocked_end):
-                    return False
-        
+        if day is not None and not day.is_free(slot_start, slot_start + duration_minutes, self._hold_keys(holder)):
+            return False
+        return not self.resources or self._assign(date_str, slot_start, slot_start + duration_minutes,
+                                                  treatment_type, holder) is not None
+    
+    def _candidates(self, treatment_type: Optional[str]) -> Tuple[Optional[List[Resource]], Optional[List[Resource]]]:
+        """Qualified (providers, chairs), most specialized first so generalists stay free for
+        what only they can do; None for a kind the clinic does not schedule"""
+        providers = [r for r in self._ranked_resources if not r.is_chair]
+        chairs = [r for r in self._ranked_resources if r.is_chair]
+        return ([r for r in providers if r.can_perform(treatment_type)] if providers else None,
+                [r for r in chairs if r.can_perform(treatment_type)] if chairs else None)
+    
+    def _resource_window_starts(self, date_str: str, weekday: str, free: int, buckets: int,
+                                treatment_type: Optional[str]) -> int:
+        """Window starts where some qualified provider and some chair are both free: per kind,
+        OR each resource's starts within its own hours, then AND the kinds together"""
+        starts = -1
+        for group in self._candidates(treatment_type):
+            if group is None:
+                continue
+            group_starts = 0
+            for resource in group:
+                group_starts |= window_starts(self._resource_free(date_str, weekday, resource, free), buckets)
+            starts &= group_starts
+        return starts
+    
+    def _resource_free(self, date_str: str, weekday: str, resource: Resource, free: int) -> int:
+        """The clinic's free buckets narrowed to the resource's hours and bookings"""
+        if resource.hours is not None:
+            free &= self._weekday_masks(weekday, resource.hours)[0]
+        day = self._existing_day(date_str, resource.resource_id)
+        return free & ~day.busy if day is not None else free
+    
+    def _assign(self, date_str: str, start: int, end: int, treatment_type: Optional[str] = None,
+                holder: Optional[str] = None, provider_id: Optional[str] = None,
+                chair_id: Optional[str] = None) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """First qualified (provider, chair) both free for [start, end), limited to provider_id /
+        chair_id when given; None if no such pair is free"""
+        weekday = self._get_weekday_name(date_str)
+        window = minutes_to_mask(start, end)
+        ignore = self._hold_keys(holder)
+        chosen = []
+        for group, wanted in zip(self._candidates(treatment_type), (provider_id, chair_id)):
+            if group is None:
+                chosen.append(None)
+                continue
+            for resource in group:
+                if wanted is not None and resource.resource_id != wanted:
+                    continue
+                if resource.hours is not None and window & ~self._weekday_masks(weekday, resource.hours)[0]:
+                    continue
+                day = self._existing_day(date_str, resource.resource_id)
+                if day is None or day.is_free(start, end, ignore):
+                    chosen.append(resource.resource_id)
+                    break
+            else:
+                return None
+        return chosen[0], chosen[1]
+    
+    def _assign_appointment(self, appointment: Appointment,
+                            holder: Optional[str]) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        start = self._time_to_minutes(appointment.time)
+        end = start + appointment.duration_minutes
+        if holder is not None and appointment.provider_id is None and appointment.chair_id is None:
+            # Keep the provider and chair held for the caller when this is the slot they were offered
+            for hold in [h for h in self.holds.values() if h.holder == holder]:
+                if hold.date == appointment.date and hold.time == appointment.time:
+                    assignment = self._assign(appointment.date, start, end, appointment.treatment_type,
+                                              holder, hold.provider_id, hold.chair_id)
+                    if assignment:
+                        return assignment
+        return self._assign(appointment.date, start, end, appointment.treatment_type, holder,
+                            appointment.provider_id, appointment.chair_id)
+    
+    def _day(self, date_str: str, resource_id: Optional[str] = None) -> DayIndex:
+        """The clinic's index for a day, or one resource's, compiling the block rules that apply"""
+        days, key = (self._day_index, date_str) if resource_id is None else (self._resource_days, (date_str, resource_id))
+        day = days.get(key)
+        if day is None:
+            day = days[key] = DayIndex()
+            if self.block_rules:
+                check_date = date.fromisoformat(date_str)
+                for rule_id, rule in self.block_rules.items():
+                    if rule.resource_id == resource_id and rule.applies_to(check_date):
+                        day.add(f"rule:{rule_id}", *rule.interval())
+        return day
+    
+    def _existing_day(self, date_str: str, resource_id: Optional[str] = None) -> Optional[DayIndex]:
+        """The day's index, compiled from the block rules if any apply; None for an untouched day"""
+        day = (self._day_index.get(date_str) if resource_id is None
+               else self._resource_days.get((date_str, resource_id)))
+        if day is None and self.block_rules:
+            check_date = date.fromisoformat(date_str)
+            if any(rule.resource_id == resource_id and rule.applies_to(check_date)
+                   for rule in self.block_rules.values()):
+                day = self._day(date_str, resource_id)
+        return day
+    
+    def _occupied_days(self, date_str: str, provider_id: Optional[str], chair_id: Optional[str]) -> List[DayIndex]:
+        """Indexes a booking occupies: its provider's and chair's, or the whole clinic's when it has neither"""
+        owned = [rid for rid in (provider_id, chair_id) if rid in self.resources]
+        if not owned:
+            return [self._day(date_str)]
+        return [self._day(date_str, rid) for rid in owned]
+    
+    def _touched_days(self, date_str: str, provider_id: Optional[str], chair_id: Optional[str]) -> List[DayIndex]:
+        """Every index a booking may have been added to"""
+        days = [self._day_index.get(date_str), self._resource_days.get((date_str, provider_id)),
+                self._resource_days.get((date_str, chair_id))]
+        return [day for day in days if day is not None]
+    
+    def add_block_rule(self, rule: BlockRule) -> int:
+        """Register a recurring block; returns its id for remove_block_rule"""
+        rule_id = next(self._rule_ids)
+        self.block_rules[rule_id] = rule
+        if rule.resource_id is None:
+            days = self._day_index.items()
+        else:
+            days = [(d, day) for (d, rid), day in self._resource_days.items() if rid == rule.resource_id]
+        for date_str, day in days:
+            if rule.applies_to(date.fromisoformat(date_str)):
+                day.add(f"rule:{rule_id}", *rule.interval())
+        logger.info(f"Block rule added: {rule.reason}")
+        return rule_id
+    
+    def remove_block_rule(self, rule_id: int) -> bool:
+        if self.block_rules.pop(rule_id, None) is None:
+            return False
+        for day in itertools.chain(self._day_index.values(), self._resource_days.values()):
+            day.remove(f"rule:{rule_id}")
         return True
     
-    async def book_appointment(self, appointment: Appointment) -> bool:
-        """Book an appointment if the slot is available"""
+    def _index_appointment(self, appointment: Appointment):
+        start = self._time_to_minutes(appointment.time)
+        for day in self._occupied_days(appointment.date, appointment.provider_id, appointment.chair_id):
+            day.add(f"apt:{appointment.appointment_id}", start, start + appointment.duration_minutes)
+        self._appointments_by_date.setdefault(appointment.date, {})[appointment.appointment_id] = appointment
+    
+    def _unindex_appointment(self, appointment: Appointment):
+        for day in self._touched_days(appointment.date, appointment.provider_id, appointment.chair_id):
+            day.remove(f"apt:{appointment.appointment_id}")
+        self._appointments_by_date.get(appointment.date, {}).pop(appointment.appointment_id, None)
+    
+    async def book_appointment(self, appointment: Appointment, holder: Optional[str] = None) -> bool:
+        """Book an appointment if the slot is available; holder's own holds are converted into the booking"""
         try:
             # Validate clinic hours
-            if not self.is_clinic_open(appointment.date, appointment.time):
+            if not self.is_clinic_open(appointment.date, appointment.time, appointment.duration_minutes):
                 logger.warning(f"Attempted to book outside clinic hours: {appointment.date} {appointment.time}")
                 return False
             
             # Check availability
-            if not self._is_slot_available(appointment.date, appointment.time, appointment.duration_minutes):
+            await self._refresh_day(appointment.date)
+            if not self._is_slot_available(appointment.date, appointment.time, appointment.duration_minutes, holder):
                 logger.warning(f"Time slot not available: {appointment.date} {appointment.time}")
                 return False
+            if self.resources:
+                assignment = self._assign_appointment(appointment, holder)
+                if assignment is None:
+                    logger.warning(f"No qualified provider and chair free: {appointment.date} {appointment.time}")
+                    return False
+                appointment.provider_id, appointment.chair_id = assignment
             
-            # Book the appointment
+            # Book the appointment, reserving it in the store first; the store
+            # re-checks the slot atomically against every worker's bookings
+            if self.store is not None:
+                reserved = await self.store.reserve(appointment, holder)
+                self._store_writes += 1
+                if not reserved:
+                    self._day_loaded_at.pop(appointment.date, None)  # our copy of the day is stale
+                    logger.warning(f"Time slot taken by another booking: {appointment.date} {appointment.time}")
+                    return False
+            previous = self.appointments.get(appointment.appointment_id)
+            if previous:
+                self._unindex_appointment(previous)
             self.appointments[appointment.appointment_id] = appointment
+            if appointment.status in ['scheduled', 'confirmed']:
+                self._index_appointment(appointment)
+            if holder is not None:
+                # The store released them in the booking transaction
+                for hold in [h for h in self.holds.values() if h.holder == holder]:
+                    self._unindex_hold(hold)
             logger.info(f"Appointment booked: {appointment.appointment_id}")
             return True
             
@@ -167,44 +930,44 @@ class CalendarService:
     async def cancel_appointment(self, appointment_id: str) -> bool:
         """Cancel an appointment"""
         try:
+            if self.store is not None:
+                date_str = await self.store.update_status(appointment_id, "cancelled")
+                self._store_writes += 1
+                if date_str is None:
+                    return False
+                self._day_loaded_at.pop(date_str, None)  # re-read on next use
             if appointment_id in self.appointments:
                 self.appointments[appointment_id].status = "cancelled"
-                logger.info(f"Appointment cancelled: {appointment_id}")
-                return True
-            return False
+                self._unindex_appointment(self.appointments[appointment_id])
+            elif self.store is None:
+                return False
+            logger.info(f"Appointment cancelled: {appointment_id}")
+            return True
         except Exception as e:
             logger.error(f"Error cancelling appointment: {e}")
             return False
     
     def get_appointments_for_date(self, date_str: str) -> List[Appointment]:
         """Get all appointments for a specific date"""
-        return [apt for apt in self.appointments.values() 
-                if apt.date == date_str and apt.status in ['scheduled', 'confirmed']]
+        return [apt for apt in self._appointments_by_date.get(date_str, {}).values()
+                if apt.status in ['scheduled', 'confirmed']]
     
     def suggest_alternative_times(self, preferred_date: str, duration_minutes: int = 30, 
-                                days_ahead: int = 7) -> List[TimeSlot]:
-        """Suggest alternative appointment times if preferred slot is not available"""
-        suggestions = []
-        
+                                days_ahead: int = 7, treatment_type: Optional[str] = None,
+                                packed: bool = False, not_before: Optional[str] = None) -> List[TimeSlot]:
+        """Suggest alternative appointment times if preferred slot is not available
+        (with packed, each day's tightest fits rather than its earliest slots; not_before
+        applies to the preferred date only)"""
         # Try the preferred date first
-        slots = self.get_available_slots(preferred_date, duration_minutes)
+        slots = self.find_free_windows(preferred_date, duration_minutes, 3, treatment_type, packed, not_before)
         if slots:
-            return slots[:3]  # Return first 3 available slots
-        
-        # Try subsequent days
-        base_date = datetime.strptime(preferred_date, '%Y-%m-%d')
-        for i in range(1, days_ahead + 1):
-            check_date = base_date + timedelta(days=i)
-            date_str = check_date.strftime('%Y-%m-%d')
-            
-            slots = self.get_available_slots(date_str, duration_minutes)
-            if slots:
-                suggestions.extend(slots[:2])  # Add first 2 slots from each day
-                
-                if len(suggestions) >= 5:  # Limit to 5 suggestions
-                    break
+            return slots  # Return first 3 available slots
         
-        return suggestions[:5]
+        # Try subsequent days: first 2 slots from each day, stopping at 5 suggestions
+        next_day = (datetime.fromisoformat(preferred_date) + timedelta(days=1)).date().isoformat()
+        return list(itertools.islice(
+            self.iter_free_windows_ahead(next_day, duration_minutes, days_ahead - 1, per_day=2,
+                                         treatment_type=treatment_type, packed=packed), 5))
     
     def block_time(self, date_str: str, time_str: str, duration_minutes: int, reason: str = "Blocked"):
         """Block a time slot (for lunch, meetings, etc.)"""
@@ -215,51 +978,53 @@ class CalendarService:
             available=False
         )
         self.blocked_times.append(blocked_slot)
+        start = self._time_to_minutes(time_str)
+        self._day(date_str).add(f"block:{next(self._block_ids)}", start, start + duration_minutes)
         logger.info(f"Time blocked: {date_str} {time_str} for {duration_minutes} minutes - {reason}")
     
     def get_clinic_schedule_summary(self, date_str: str) -> Dict:
         """Get a summary of the clinic schedule for a date"""
         appointments = self.get_appointments_for_date(date_str)
-        available_slots = self.get_available_slots(date_str)
+        next_available = self.find_free_windows(date_str, limit=1)
         
         return {
             'date': date_str,
             'weekday': self._get_weekday_name(date_str).title(),
             'is_open': bool(self.clinic_hours.get(self._get_weekday_name(date_str))),
             'total_appointments': len(appointments),
-            'available_slots': len(available_slots),
+            'available_slots': self.count_available_slots(date_str),
             'appointments': [
                 {
                     'time': apt.time,
                     'duration': apt.duration_minutes,
                     'treatment': apt.treatment_type,
-                    'status': apt.status
+                    'status': apt.status,
+                    'provider': apt.provider_id,
+                    'chair': apt.chair_id
                 } for apt in sorted(appointments, key=lambda x: x.time)
             ],
-            'next_available': available_slots[0].time if available_slots else None
+            'next_available': next_available[0].time if next_available else None
         }
 
-# Global calendar service instance
-calendar_service = CalendarService()
+# Process-wide calendar, created on first use rather than at import so that
+# tools and tests that never touch the calendar don't pay for it
+_calendar_service: Optional[CalendarService] = None
 
-# Initialize some blocked times (lunch breaks, etc.)
-def initialize_calendar():
+def initialize_calendar(service: CalendarService) -> CalendarService:
     """Initialize calendar with standard blocked times"""
-    # Block lunch time every weekday
-    from datetime import date, timedelta
-    
-    today = date.today()
-    for i in range(30):  # Block for next 30 days
-        check_date = today + timedelta(days=i)
-        weekday = check_date.strftime('%A').lower()
-        
-        if weekday in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']:
-            calendar_service.block_time(
-                check_date.strftime('%Y-%m-%d'),
-                '12:00',
-                60,  # 1 hour lunch
-                'Lunch break'
-            )
+    # Lunch every weekday, indefinitely; compiled into each day when it is first used
+    service.add_block_rule(BlockRule.weekly('Lunch break', '12:00', 60))
+    return service
+
+def get_calendar_service() -> CalendarService:
+    """The process-wide calendar, created and initialized on first call (e.g. from a prewarm hook)"""
+    global _calendar_service
+    if _calendar_service is None:
+        _calendar_service = initialize_calendar(CalendarService())
+    return _calendar_service
 
-# Initialize when module is imported
-initialize_calendar()
+def __getattr__(name: str):
+    # `from calendar_service import calendar_service` keeps working, lazily
+    if name == 'calendar_service':
+        return get_calendar_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
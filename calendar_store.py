@@ -0,0 +1,171 @@
+"""
+SQLite-backed calendar store for SmileRight Dental Clinic
+
+The appointments table is the calendar of record shared by every worker
+process. CalendarService keeps its per-day indexes as a write-through
+cache in front of it: bookings are written here first and applied locally
+at once, and a cached day is re-read from the table once it is older than
+REVALIDATE_SECONDS so bookings made by other workers become visible.
+
+Slots offered to a caller are held in slot_holds with an expiry time, so
+a hold lapses on its own even if the worker that placed it goes away.
+
+When the clinic schedules by resource, bookings and holds carry a provider
+and a chair, and only those that share one of them compete for time.
+"""
+
+import logging
+import time
+from typing import Callable, List, Optional, Tuple
+
+from calendar_service import Appointment, SlotHold
+from db_manager import get_connection_pool
+
+logger = logging.getLogger("dental_assistant.calendar")
+
+# How long a cached day is trusted before it is re-read from the table
+REVALIDATE_SECONDS = 2.0
+
+
+def _minutes(time_str: str) -> int:
+    hours, minutes = time_str.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def _shares_resource(a: Tuple[Optional[str], Optional[str]], b: Tuple[Optional[str], Optional[str]]) -> bool:
+    """Whether two (provider, chair) bookings compete; one without resources occupies the whole clinic"""
+    if not any(a) or not any(b):
+        return True
+    return any(x is not None and x == y for x, y in zip(a, b))
+
+
+class CalendarStore:
+    """Reads days and writes bookings through the shared connection pool"""
+
+    def __init__(self, db_path: str, revalidate_seconds: float = REVALIDATE_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.db_path = db_path
+        self.revalidate_seconds = revalidate_seconds
+        self.clock = clock  # epoch seconds that hold expiry is judged against
+
+    async def load_day(self, date_str: str) -> List[Appointment]:
+        """Active appointments on date_str; a range read on idx_appointments_date_time"""
+        async with get_connection_pool(self.db_path).reader() as conn:
+            cursor = await conn.execute("""
+                SELECT appointment_id, patient_id, appointment_date, appointment_time,
+                       duration_minutes, treatment_type, status, notes, provider_id, chair_id
+                FROM appointments
+                WHERE appointment_date = ? AND status IN ('scheduled', 'confirmed')
+                ORDER BY appointment_time
+            """, (date_str,))
+            rows = await cursor.fetchall()
+        # Older rows may carry seconds ("09:00:00")
+        return [Appointment(row[0], row[1], row[2], row[3][:5], *tuple(row)[4:]) for row in rows]
+
+    async def load_holds(self, date_str: str, now: float) -> List[SlotHold]:
+        """Unexpired holds on date_str"""
+        async with get_connection_pool(self.db_path).reader() as conn:
+            cursor = await conn.execute("""
+                SELECT hold_id, holder, hold_date, hold_time, duration_minutes, expires_at, provider_id, chair_id
+                FROM slot_holds
+                WHERE hold_date = ? AND expires_at > ?
+            """, (date_str, now))
+            rows = await cursor.fetchall()
+        return [SlotHold(*row) for row in rows]
+
+    async def _conflict(self, conn, date_str: str, time_str: str, duration_minutes: int,
+                        holder: Optional[str], now: float,
+                        resources: Tuple[Optional[str], Optional[str]] = (None, None)) -> Optional[str]:
+        """Id of an active appointment or another holder's live hold overlapping the slot
+        on the same (provider, chair) resources"""
+        start = _minutes(time_str)
+        end = start + duration_minutes
+        cursor = await conn.execute("""
+            SELECT appointment_id, appointment_time, duration_minutes, provider_id, chair_id
+            FROM appointments
+            WHERE appointment_date = ? AND status IN ('scheduled', 'confirmed')
+            UNION ALL
+            SELECT hold_id, hold_time, duration_minutes, provider_id, chair_id
+            FROM slot_holds
+            WHERE hold_date = ? AND expires_at > ? AND holder IS NOT ?
+        """, (date_str, date_str, now, holder))
+        for other_id, other_time, other_duration, provider_id, chair_id in await cursor.fetchall():
+            other_start = _minutes(other_time)
+            if (start < other_start + other_duration and other_start < end
+                    and _shares_resource(resources, (provider_id, chair_id))):
+                return other_id
+        return None
+
+    async def reserve(self, appointment: Appointment, holder: Optional[str] = None) -> bool:
+        """
+        Insert the appointment unless it overlaps an active one, or a slot held
+        by someone other than holder, on the same day. The check and the insert
+        share one BEGIN IMMEDIATE transaction, which holds SQLite's write lock,
+        so concurrent callers in this or any other worker process cannot both
+        take the slot. holder's own holds are released in the same transaction.
+        """
+        async with get_connection_pool(self.db_path).writer() as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                conflict = await self._conflict(conn, appointment.date, appointment.time,
+                                                appointment.duration_minutes, holder, self.clock(),
+                                                (appointment.provider_id, appointment.chair_id))
+                if conflict:
+                    logger.info(f"Slot {appointment.date} {appointment.time} already taken by {conflict}")
+                    await conn.rollback()
+                    return False
+                if holder is not None:
+                    await conn.execute("DELETE FROM slot_holds WHERE holder = ?", (holder,))
+                await conn.execute("""
+                    INSERT INTO appointments
+                    (appointment_id, patient_id, appointment_date, appointment_time,
+                     duration_minutes, treatment_type, status, notes, provider_id, chair_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (appointment.appointment_id, appointment.patient_id, appointment.date, appointment.time,
+                      appointment.duration_minutes, appointment.treatment_type, appointment.status, appointment.notes,
+                      appointment.provider_id, appointment.chair_id))
+                await conn.commit()
+                return True
+            except Exception:
+                await conn.rollback()
+                raise
+
+    async def place_hold(self, hold: SlotHold) -> bool:
+        """Record the hold unless the slot was taken meanwhile; same locking as reserve"""
+        now = self.clock()
+        async with get_connection_pool(self.db_path).writer() as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                if await self._conflict(conn, hold.date, hold.time, hold.duration_minutes, hold.holder, now,
+                                        (hold.provider_id, hold.chair_id)):
+                    await conn.rollback()
+                    return False
+                await conn.execute("DELETE FROM slot_holds WHERE expires_at <= ?", (now,))
+                await conn.execute("""
+                    INSERT INTO slot_holds
+                    (hold_id, holder, hold_date, hold_time, duration_minutes, expires_at, provider_id, chair_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (hold.hold_id, hold.holder, hold.date, hold.time, hold.duration_minutes, hold.expires_at,
+                      hold.provider_id, hold.chair_id))
+                await conn.commit()
+                return True
+            except Exception:
+                await conn.rollback()
+                raise
+
+    async def release_holds(self, holder: str):
+        async with get_connection_pool(self.db_path).writer() as conn:
+            await conn.execute("DELETE FROM slot_holds WHERE holder = ?", (holder,))
+            await conn.commit()
+
+    async def update_status(self, appointment_id: str, status: str) -> Optional[str]:
+        """Set an appointment's status; returns its date, or None if it does not exist"""
+        async with get_connection_pool(self.db_path).writer() as conn:
+            cursor = await conn.execute("""
+                UPDATE appointments SET status = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE appointment_id = ?
+                RETURNING appointment_date
+            """, (status, appointment_id))
+            rows = await cursor.fetchall()
+            await conn.commit()
+        return rows[0][0] if rows else None
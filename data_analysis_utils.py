@@ -5,7 +5,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import matplotlib.pyplot as plt
 import seaborn as sns
-from db_manager import AsyncDatabaseManager
+from db_manager import AsyncDatabaseManager, close_connection_pools
 
 class AsyncDataAnalyzer:
     def __init__(self, db_path: str = "dental_assistant.db"):
@@ -539,14 +539,17 @@ async def show_performance_dashboard(days: int = 7):
 # Example usage
 async def main():
     """Example usage of the async data analyzer"""
-    # Show recent sessions
-    await list_recent_sessions(7)
-    
-    # Show performance dashboard
-    await show_performance_dashboard(7)
-    
-    # Example: Get a specific session report
-    # await print_session_report("your-session-id-here")
+    try:
+        # Show recent sessions
+        await list_recent_sessions(7)
+        
+        # Show performance dashboard
+        await show_performance_dashboard(7)
+        
+        # Example: Get a specific session report
+        # await print_session_report("your-session-id-here")
+    finally:
+        await close_connection_pools()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,283 @@
+"""
+Booking date/time parsing for SmileRight Dental Clinic
+
+Callers say "next Tuesday afternoon", "demain à 14h30" or "March 3rd at
+ten thirty"; the booking flow needs a calendar date and a 24-hour time.
+The parser normalizes the text (case, accents, spoken numbers, "a.m."),
+then picks out one date expression and one time or part of day with
+precompiled patterns, resolving relative dates against the current time.
+It is deterministic and runs locally, so no LLM turn is spent on it.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+MONTHS: Dict[str, int] = {
+    'january': 1, 'jan': 1, 'janvier': 1,
+    'february': 2, 'feb': 2, 'fevrier': 2,
+    'march': 3, 'mar': 3, 'mars': 3,
+    'april': 4, 'apr': 4, 'avril': 4,
+    'may': 5, 'mai': 5,
+    'june': 6, 'jun': 6, 'juin': 6,
+    'july': 7, 'jul': 7, 'juillet': 7,
+    'august': 8, 'aug': 8, 'aout': 8,
+    'september': 9, 'sep': 9, 'septembre': 9,  # "sept" is read as seven
+    'october': 10, 'oct': 10, 'octobre': 10,
+    'november': 11, 'nov': 11, 'novembre': 11,
+    'december': 12, 'dec': 12, 'decembre': 12,
+}
+
+WEEKDAYS: Dict[str, int] = {
+    'monday': 0, 'lundi': 0,
+    'tuesday': 1, 'mardi': 1,
+    'wednesday': 2, 'mercredi': 2,
+    'thursday': 3, 'jeudi': 3,
+    'friday': 4, 'vendredi': 4,
+    'saturday': 5, 'samedi': 5,
+    'sunday': 6, 'dimanche': 6,
+}
+
+# Spoken numbers as speech-to-text may spell them ("une" is left alone: it is also an article)
+NUMBER_WORDS: Dict[str, str] = {
+    'one': '1', 'two': '2', 'three': '3', 'four': '4', 'five': '5', 'six': '6', 'seven': '7',
+    'eight': '8', 'nine': '9', 'ten': '10', 'eleven': '11', 'twelve': '12', 'fifteen': '15',
+    'thirty': '30', 'forty five': '45', 'fourty five': '45',
+    'deux': '2', 'trois': '3', 'quatre': '4', 'cinq': '5', 'sept': '7', 'huit': '8', 'neuf': '9',
+    'dix': '10', 'onze': '11', 'douze': '12', 'quinze': '15', 'trente': '30', 'quarante cinq': '45',
+}
+
+# Ordinal day numbers, only read as such next to a month ("march second", "the second of march")
+ORDINAL_WORDS: Dict[str, int] = {
+    word: number for number, word in enumerate((
+        'first', 'second', 'third', 'fourth', 'fifth', 'sixth', 'seventh', 'eighth', 'ninth', 'tenth',
+        'eleventh', 'twelfth', 'thirteenth', 'fourteenth', 'fifteenth', 'sixteenth', 'seventeenth',
+        'eighteenth', 'nineteenth', 'twentieth'), start=1)
+}
+ORDINAL_WORDS.update({f"twenty {word}": 20 + ORDINAL_WORDS[word] for word in list(ORDINAL_WORDS)[:9]})
+ORDINAL_WORDS.update({'thirtieth': 30, 'thirty first': 31, 'premier': 1})
+
+# Parts of the day as (start, end) within clinic hours
+PERIODS: Dict[str, Tuple[str, str]] = {
+    'morning': ('08:00', '12:00'), 'matin': ('08:00', '12:00'), 'matinee': ('08:00', '12:00'),
+    'afternoon': ('13:00', '18:00'), 'apres midi': ('13:00', '18:00'),
+    'evening': ('16:00', '18:00'), 'soir': ('16:00', '18:00'), 'end of the day': ('16:00', '18:00'),
+    'fin de journee': ('16:00', '18:00'),
+}
+
+PERIOD_NAMES: Dict[Tuple[str, str], str] = {
+    ('08:00', '12:00'): 'morning', ('13:00', '18:00'): 'afternoon', ('16:00', '18:00'): 'evening',
+}
+
+# Without am/pm, hours up to this one are afternoon hours (the clinic closes at 6 PM)
+LATEST_PM_GUESS = 6
+
+def _alternation(words) -> str:
+    return '|'.join(sorted((re.escape(w) for w in words), key=len, reverse=True))
+
+_MONTH = _alternation(MONTHS)
+_WEEKDAY = _alternation(WEEKDAYS)
+_ORDINAL = r'(?:st|nd|rd|th|er|e)?'
+
+_ORDINAL_WORDS = _alternation(ORDINAL_WORDS)
+
+_NUMBER_WORD = re.compile(rf"\b({_alternation(NUMBER_WORDS)})\b")
+_MONTH_ORDINAL_WORD = re.compile(rf"\b({_MONTH})\s+(?:the\s+)?({_ORDINAL_WORDS})\b")
+_ORDINAL_WORD_MONTH = re.compile(rf"\b({_ORDINAL_WORDS})(?=\s+(?:of\s+|de\s+)?(?:{_MONTH})\b)")
+_DECIMAL_TIME = re.compile(r"(\d)\.(\d\d)\b")
+
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_DAY_MONTH = re.compile(rf"\b(\d{{1,2}}){_ORDINAL}\s+(?:of\s+|de\s+)?({_MONTH})\b(?:\s+(\d{{4}}))?")
+_MONTH_DAY = re.compile(rf"\b({_MONTH})\s+(?:the\s+)?(\d{{1,2}}){_ORDINAL}\b(?:\s+(\d{{4}}))?")
+_DAY_OF_MONTH = re.compile(rf"\b(?:the|le)\s+(\d{{1,2}}){_ORDINAL}\b(?!\s*(?:h\b|:|am\b|pm\b|heure))")
+_DAY_AFTER_TOMORROW = re.compile(r"\b(?:day after tomorrow|apres demain)\b")
+_TOMORROW = re.compile(r"\b(?:tomorrow|demain)\b")
+_TODAY = re.compile(r"\b(?:today|aujourd hui|tonight|this (?:morning|afternoon|evening)|ce (?:matin|soir)|cet apres midi)\b")
+_FROM_DATE = re.compile(r"\b(a|\d{1,2})\s+(day|days|week|weeks)\s+from\s+")
+_IN_DAYS = re.compile(r"\b(?:in|dans)\s+(\d{1,2})\s+(day|days|jour|jours|week|weeks|semaine|semaines)\b")
+_WEEKDAY_PHRASE = re.compile(
+    rf"\b(?:(next|this|coming|ce)\s+)?({_WEEKDAY})\b(?:\s+(prochain|qui vient|next week|de la semaine prochaine))?")
+_NEXT_WEEK = re.compile(r"\b(?:next week|la semaine prochaine|semaine prochaine)\b")
+
+_CLOCK = re.compile(r"\b(\d{1,2})\s*(?::|h)\s*(\d{2})\b(?:\s*(am|pm))?")
+_HOUR_MERIDIEM = re.compile(r"\b(\d{1,2})(?:\s+(\d{2}))?\s*(am|pm)\b")
+_HOUR_HEURES = re.compile(r"\b(\d{1,2})\s*(?:h|heures?)\b(?:\s*(?:et\s+)?(demie|quart|moins le quart|\d{2}))?")
+_HALF_PAST = re.compile(r"\b(half|quarter)\s+past\s+(\d{1,2})\b")
+_QUARTER_TO = re.compile(r"\bquarter\s+to\s+(\d{1,2})\b")
+_SPOKEN_MINUTES = re.compile(r"\b(?:(?:at|a|vers|around|about)\s+)?(\d{1,2})\s+(15|30|45)\b(?!\s*(?:day|jour|week|semaine|min))")
+_AT_HOUR = re.compile(r"\b(?:at|a|vers|around|about)\s+(\d{1,2})\b(?:\s+o clock)?(?!\s*(?:day|jour|week|semaine|\d))")
+_O_CLOCK = re.compile(r"\b(\d{1,2})\s+o clock\b")
+_NOON = re.compile(r"\b(?:noon|midday|(?<!apres )midi)\b")
+_PERIOD = re.compile(rf"\b({_alternation(PERIODS)})\b")
+_PM_HINT = re.compile(r"\b(?:afternoon|evening|apres midi|soir|tonight)\b")
+_AM_HINT = re.compile(r"\b(?:morning|matin|matinee)\b")
+
+
+@dataclass(frozen=True)
+class ParsedDateTime:
+    date: str  # YYYY-MM-DD
+    time: Optional[str] = None  # HH:MM, 24-hour clock; None when only a part of the day was given
+    period: Optional[Tuple[str, str]] = None  # (start, end) of "morning", "afternoon", ...
+
+    def __str__(self) -> str:
+        """Normalized text that parses back to the same value, e.g. "2025-02-11 afternoon" """
+        if self.time:
+            return f"{self.date} {self.time}"
+        if self.period:
+            return f"{self.date} {PERIOD_NAMES[self.period]}"
+        return self.date
+
+
+def normalize(text: str) -> str:
+    """Lowercase, accents and punctuation stripped, spoken numbers as digits"""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = _DECIMAL_TIME.sub(r"\1:\2", text)  # "10.30" is a time
+    text = re.sub(r"\b([ap])\.?\s?m\b\.?", r"\1m", text)  # "p.m.", "p m" -> "pm"
+    text = re.sub(r"[^\w:\-\s]", " ", text).replace("'", " ")
+    text = re.sub(r"(?<=[a-z])-(?=[a-z])", " ", text)  # "apres-midi", "forty-five"
+    # Before spoken numbers, which would turn "thirty first" into "30 first"
+    text = _MONTH_ORDINAL_WORD.sub(lambda m: f"{m.group(1)} {ORDINAL_WORDS[m.group(2)]}", text)
+    text = _ORDINAL_WORD_MONTH.sub(lambda m: str(ORDINAL_WORDS[m.group(1)]), text)
+    text = _NUMBER_WORD.sub(lambda m: NUMBER_WORDS[m.group(1)], text)
+    return ' '.join(text.split())
+
+
+def _next_occurrence(month: int, day: int, year: Optional[int], today: date) -> Optional[date]:
+    try:
+        if year:
+            return date(year, month, day)
+        candidate = date(today.year, month, day)
+        return candidate if candidate >= today else date(today.year + 1, month, day)
+    except ValueError:
+        return None
+
+
+def parse_date(text: str, today: date) -> Optional[date]:
+    """The date named in normalized text, relative dates resolved against today"""
+    match = _ISO_DATE.search(text)
+    if match:
+        try:
+            return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            return None
+    match = _DAY_MONTH.search(text)
+    if match:
+        return _next_occurrence(MONTHS[match.group(2)], int(match.group(1)),
+                                int(match.group(3)) if match.group(3) else None, today)
+    match = _MONTH_DAY.search(text)
+    if match:
+        return _next_occurrence(MONTHS[match.group(1)], int(match.group(2)),
+                                int(match.group(3)) if match.group(3) else None, today)
+    match = _FROM_DATE.search(text)
+    if match:
+        # "a week from Friday", "3 days from tomorrow": counted from the date that follows
+        rest = text[match.end():]
+        anchor = today if rest.startswith(('now', 'today')) else parse_date(rest, today)
+        if anchor is not None:
+            amount = 1 if match.group(1) == 'a' else int(match.group(1))
+            return anchor + timedelta(days=amount * 7 if match.group(2).startswith('week') else amount)
+    if _DAY_AFTER_TOMORROW.search(text):
+        return today + timedelta(days=2)
+    if _TOMORROW.search(text):
+        return today + timedelta(days=1)
+    if _TODAY.search(text):
+        return today
+    match = _IN_DAYS.search(text)
+    if match:
+        amount = int(match.group(1))
+        return today + timedelta(days=amount * 7 if match.group(2).startswith(('week', 'semaine')) else amount)
+    match = _WEEKDAY_PHRASE.search(text)
+    if match:
+        modifier, weekday, suffix = match.groups()
+        days_ahead = (WEEKDAYS[weekday] - today.weekday()) % 7
+        if days_ahead == 0 and modifier not in ('this', 'ce'):
+            days_ahead = 7  # "Tuesday" said on a Tuesday means next week's
+        if (suffix and 'week' in suffix or suffix and 'semaine' in suffix
+                or _NEXT_WEEK.search(text[match.end():]) or _NEXT_WEEK.search(text[:match.start()])):
+            # "Tuesday next week": the Tuesday of the following calendar week
+            monday = today - timedelta(days=today.weekday()) + timedelta(days=7)
+            return monday + timedelta(days=WEEKDAYS[weekday])
+        return today + timedelta(days=days_ahead)
+    if _NEXT_WEEK.search(text):
+        return today - timedelta(days=today.weekday()) + timedelta(days=7)
+    match = _DAY_OF_MONTH.search(text)
+    if match:
+        day = int(match.group(1))
+        month, year = today.month, today.year
+        if day < today.day:
+            month, year = (1, year + 1) if month == 12 else (month + 1, year)
+        try:
+            return date(year, month, day)
+        except ValueError:
+            return None
+    return None
+
+
+def _to_24h(hour: int, minute: int, meridiem: Optional[str], text: str) -> Optional[str]:
+    if meridiem == 'pm' and hour < 12:
+        hour += 12
+    elif meridiem == 'am' and hour == 12:
+        hour = 0
+    elif meridiem is None and hour < 12:
+        if _PM_HINT.search(text) or (1 <= hour <= LATEST_PM_GUESS and not _AM_HINT.search(text)):
+            hour += 12
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        return None
+    return f"{hour:02d}:{minute:02d}"
+
+
+def parse_time(text: str) -> Optional[str]:
+    """The time of day named in normalized text, as HH:MM on the 24-hour clock"""
+    match = _CLOCK.search(text)
+    if match:
+        return _to_24h(int(match.group(1)), int(match.group(2)), match.group(3), text)
+    match = _HOUR_MERIDIEM.search(text)
+    if match:
+        return _to_24h(int(match.group(1)), int(match.group(2) or 0), match.group(3), text)
+    match = _HALF_PAST.search(text)
+    if match:
+        return _to_24h(int(match.group(2)), 30 if match.group(1) == 'half' else 15, None, text)
+    match = _QUARTER_TO.search(text)
+    if match:
+        return _to_24h(int(match.group(1)) - 1, 45, None, text)
+    match = _HOUR_HEURES.search(text)
+    if match:
+        hour, minutes = int(match.group(1)), {'demie': 30, 'quart': 15, None: 0}.get(match.group(2))
+        if match.group(2) == 'moins le quart':
+            hour, minutes = hour - 1, 45
+        return _to_24h(hour, int(match.group(2)) if minutes is None else minutes, None, text)
+    if _NOON.search(text):
+        return "12:00"
+    match = _SPOKEN_MINUTES.search(text) or _O_CLOCK.search(text) or _AT_HOUR.search(text)
+    if match:
+        minute = int(match.group(2)) if match.re is _SPOKEN_MINUTES else 0
+        return _to_24h(int(match.group(1)), minute, None, text)
+    return None
+
+
+def parse_period(text: str) -> Optional[Tuple[str, str]]:
+    match = _PERIOD.search(text)
+    return PERIODS[match.group(1)] if match else None
+
+
+def parse_date_time(text: str, now: Optional[datetime] = None) -> Optional[ParsedDateTime]:
+    """
+    Parse a spoken booking request such as "next Tuesday afternoon" or
+    "le 3 mars à 10h30". A time without a date means today if it is still
+    ahead, otherwise tomorrow. Returns None when neither a date nor a time
+    can be found.
+    """
+    now = now or datetime.now()
+    normalized = normalize(text)
+    day = parse_date(normalized, now.date())
+    time_str = parse_time(normalized)
+    period = None if time_str else parse_period(normalized)
+    if day is None:
+        if time_str is None and period is None:
+            return None
+        start = time_str or period[0]
+        day = now.date() if start > now.strftime("%H:%M") else now.date() + timedelta(days=1)
+    return ParsedDateTime(day.isoformat(), time_str, period)
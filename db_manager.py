@@ -10,228 +10,924 @@ import logging
 from collections import deque
 import threading
 import time
+import os
+import bisect
+
+from db_migrations import ensure_schema
+from patient_identity import get_patient_cache, name_key, normalize_phone, fold_name
+from treatment_catalog import TreatmentCatalog, cached_catalog, revalidate_catalog
 
 logger = logging.getLogger("dental_assistant.db")
 
-class AsyncDatabaseManager:
-    def __init__(self, db_path: str = "dental_assistant.db", batch_size: int = 100, flush_interval: float = 5.0):
+
+@dataclass
+class PoolStats:
+    """Checkout counters for one side (writer or readers) of a connection pool"""
+    checkouts: int = 0
+    waits: int = 0  # checkouts that found no idle connection
+    total_wait_ms: float = 0.0
+    max_wait_ms: float = 0.0
+    total_hold_ms: float = 0.0
+    max_hold_ms: float = 0.0
+
+    def record(self, wait_ms: float, hold_ms: float, waited: bool):
+        self.checkouts += 1
+        if waited:
+            self.waits += 1
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.total_hold_ms += hold_ms
+        self.max_hold_ms = max(self.max_hold_ms, hold_ms)
+
+    def summary(self) -> Dict[str, Any]:
+        checkouts = self.checkouts or 1
+        return {
+            'checkouts': self.checkouts,
+            'waits': self.waits,
+            'avg_wait_ms': self.total_wait_ms / checkouts,
+            'max_wait_ms': self.max_wait_ms,
+            'avg_hold_ms': self.total_hold_ms / checkouts,
+            'max_hold_ms': self.max_hold_ms
+        }
+
+
+@dataclass
+class WriterStats:
+    """Commit counters for the batch writer"""
+    commits: int = 0
+    failed_commits: int = 0
+    rows: int = 0
+    max_rows_per_commit: int = 0
+    total_commit_ms: float = 0.0
+    max_commit_ms: float = 0.0
+    total_txn_ms: float = 0.0
+
+    def record(self, rows: int, commit_ms: float, txn_ms: float):
+        self.commits += 1
+        self.rows += rows
+        self.max_rows_per_commit = max(self.max_rows_per_commit, rows)
+        self.total_commit_ms += commit_ms
+        self.max_commit_ms = max(self.max_commit_ms, commit_ms)
+        self.total_txn_ms += txn_ms
+
+    def summary(self) -> Dict[str, Any]:
+        commits = self.commits or 1
+        return {
+            'commits': self.commits,
+            'failed_commits': self.failed_commits,
+            'rows': self.rows,
+            'avg_rows_per_commit': self.rows / commits,
+            'max_rows_per_commit': self.max_rows_per_commit,
+            'avg_commit_ms': self.total_commit_ms / commits,
+            'max_commit_ms': self.max_commit_ms,
+            'avg_txn_ms': self.total_txn_ms / commits
+        }
+
+
+class Histogram:
+    """Fixed-bucket histogram; each bound is the inclusive upper edge of its bucket"""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket is overflow
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the given percentile"""
+        if not self.count:
+            return 0.0
+        rank = pct / 100 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        labels = [f"<={b:g}" for b in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'max': self.max,
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+class ConnectionPool:
+    """
+    Bounded pool of persistent aiosqlite connections for one database file:
+    a single writer connection (SQLite only allows one writer at a time) and
+    up to `max_readers` reader connections. PRAGMAs are applied once when a
+    connection is opened instead of on every checkout.
+    """
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA cache_size=10000",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA busy_timeout=5000"
+    )
+
+    def __init__(self, db_path: str, max_readers: int = 4):
+        self.db_path = db_path
+        self.max_readers = max_readers
+        self.loop = asyncio.get_running_loop()
+
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_lock = asyncio.Lock()
+        self._idle_readers: List[aiosqlite.Connection] = []
+        self._all_readers: List[aiosqlite.Connection] = []
+        self._reader_slots = asyncio.Semaphore(max_readers)
+        self._closed = False
+
+        self.writer_stats = PoolStats()
+        self.reader_stats = PoolStats()
+
+    async def _open(self) -> aiosqlite.Connection:
+        # Schema migrations run off the event loop, once per database per process
+        await ensure_schema(self.db_path)
+        conn = await aiosqlite.connect(self.db_path)
+        conn.row_factory = aiosqlite.Row
+        for pragma in self.PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def _release(self, conn: aiosqlite.Connection):
+        """Never hand out a connection with a half-finished transaction"""
+        if conn.in_transaction:
+            await conn.rollback()
+
+    @asynccontextmanager
+    async def writer(self):
+        """Exclusive checkout of the writer connection"""
+        if self._closed:
+            raise RuntimeError(f"Connection pool for {self.db_path} is closed")
+        waited = self._writer_lock.locked()
+        wait_start = time.perf_counter()
+        async with self._writer_lock:
+            checkout = time.perf_counter()
+            if self._writer is None:
+                self._writer = await self._open()
+            try:
+                yield self._writer
+            finally:
+                await self._release(self._writer)
+                self.writer_stats.record(
+                    (checkout - wait_start) * 1000,
+                    (time.perf_counter() - checkout) * 1000,
+                    waited
+                )
+
+    @asynccontextmanager
+    async def reader(self):
+        """Checkout of one of the reader connections, opened lazily up to max_readers"""
+        if self._closed:
+            raise RuntimeError(f"Connection pool for {self.db_path} is closed")
+        waited = self._reader_slots.locked()
+        wait_start = time.perf_counter()
+        async with self._reader_slots:
+            checkout = time.perf_counter()
+            if self._idle_readers:
+                conn = self._idle_readers.pop()
+            else:
+                conn = await self._open()
+                self._all_readers.append(conn)
+            try:
+                yield conn
+            finally:
+                await self._release(conn)
+                self._idle_readers.append(conn)
+                self.reader_stats.record(
+                    (checkout - wait_start) * 1000,
+                    (time.perf_counter() - checkout) * 1000,
+                    waited
+                )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool-wait and checkout-latency statistics"""
+        return {
+            'db_path': self.db_path,
+            'readers_open': len(self._all_readers),
+            'readers_idle': len(self._idle_readers),
+            'max_readers': self.max_readers,
+            'writer': self.writer_stats.summary(),
+            'reader': self.reader_stats.summary()
+        }
+
+    def _stop_connections(self):
+        """Stop worker threads without awaiting (used when the owning loop is gone)"""
+        self._closed = True
+        for conn in [self._writer] + self._all_readers:
+            if conn is not None:
+                conn.stop()
+
+    async def close(self):
+        """Close every pooled connection"""
+        self._closed = True
+        async with self._writer_lock:
+            if self._writer is not None:
+                await self._writer.close()
+                self._writer = None
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers.clear()
+        self._idle_readers.clear()
+
+
+# One pool per database file, shared by every session in the worker process
+_connection_pools: Dict[str, ConnectionPool] = {}
+
+
+def get_connection_pool(db_path: str, max_readers: int = 4) -> ConnectionPool:
+    """Return the process-wide pool for db_path, creating it on first use"""
+    key = os.path.abspath(db_path)
+    pool = _connection_pools.get(key)
+    loop = asyncio.get_running_loop()
+    if pool is not None and pool.loop is not loop:
+        # The pool belongs to an event loop that has since finished
+        pool._stop_connections()
+        pool = None
+    if pool is None:
+        pool = ConnectionPool(db_path, max_readers)
+        _connection_pools[key] = pool
+    return pool
+
+
+async def close_connection_pools():
+    """Close all pooled connections (call on worker/CLI shutdown)"""
+    pools = list(_connection_pools.values())
+    _connection_pools.clear()
+    for pool in pools:
+        await pool.close()
+
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop_metrics_first', 'spill_to_disk')
+
+
+@dataclass
+class QueuePolicy:
+    """Capacity of one telemetry queue and what happens when it is full:
+
+    block              -- reject put(); async producers can await put_wait()
+    drop_oldest        -- discard the oldest queued item of the same queue
+    drop_metrics_first -- evict the oldest sampled metric to make room, and only
+                          drop from the same queue once no metrics are left
+    spill_to_disk      -- append to a local overflow file, reloaded in order
+                          as the queue drains
+    """
+    capacity: int = 10000
+    overflow: str = 'drop_oldest'
+
+    def __post_init__(self):
+        if self.overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {self.overflow!r}, expected one of {OVERFLOW_POLICIES}")
+
+
+DEFAULT_QUEUE_POLICIES = {
+    # Transcripts are the record of the call: shed sampled metrics before them
+    'transcripts': QueuePolicy(capacity=10000, overflow='drop_metrics_first'),
+    # Later snapshots supersede earlier ones
+    'user_data': QueuePolicy(capacity=2000, overflow='drop_oldest'),
+    # last_visit stamps; losing one only leaves an older timestamp
+    'patient_visits': QueuePolicy(capacity=2000, overflow='drop_oldest'),
+    'metrics': QueuePolicy(capacity=5000, overflow='drop_oldest')
+}
+
+
+class SpillFile:
+    """Append-only JSON-lines overflow file for one queue, read back with a cursor"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pending = 0
+        self._read_offset = 0
+        self._handle = None
+        if os.path.exists(path):
+            # Overflow left behind by a previous process is drained like new overflow
+            with open(path, 'rb') as f:
+                self.pending = sum(1 for _ in f)
+        self.leftover = self.pending
+
+    def append(self, item: Dict[str, Any]):
+        if self._handle is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._handle = open(self.path, 'a', encoding='utf-8')
+        self._handle.write(json.dumps(item, default=str) + '\n')
+        self._handle.flush()
+        self.pending += 1
+
+    def read(self, max_items: int) -> List[Dict[str, Any]]:
+        """Return up to max_items in write order; truncates the file once fully read"""
+        if not self.pending or max_items <= 0:
+            return []
+        items = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.seek(self._read_offset)
+            while len(items) < max_items:
+                line = f.readline()
+                if not line:
+                    break
+                items.append(json.loads(line))
+            self._read_offset = f.tell()
+        self.pending -= len(items)
+        if self.pending <= 0:
+            self.pending = 0
+            self._read_offset = 0
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+            os.remove(self.path)
+        return items
+
+
+class SegmentLog:
+    """
+    Crash-safe append-only log of queued records, split into numbered
+    segment files. Each append is flushed to the OS, so it survives a
+    worker crash, but not fsynced. seal() switches appends to a new segment
+    without blocking, and the writer tick fsyncs and closes sealed segments
+    off the event loop with close_sealed(), one fsync per tick. A
+    sealed, closed segment is deleted once every record in it has been
+    committed to SQLite (or intentionally dropped).
+    Replay after a crash is at-least-once: rows committed just before the
+    crash, whose segment was not yet deleted, are written again.
+    """
+
+    def __init__(self, log_dir: str, max_segment_bytes: int = 4 * 1024 * 1024):
+        self.log_dir = log_dir
+        self.max_segment_bytes = max_segment_bytes
+        os.makedirs(log_dir, exist_ok=True)
+
+        # Segments left behind by a previous process, replayed before first use
+        self.leftover = self.segment_numbers()
+        self.current = (self.leftover[-1] + 1) if self.leftover else 1
+        self.pending: Dict[int, int] = {}  # segment -> records not yet committed
+        self._handle = None
+        self._size = 0
+        # Sealed segments whose handles are not yet fsynced and closed
+        self._sealed: List[tuple] = []
+        self._unclosed = set()
+
+    def segment_numbers(self) -> List[int]:
+        numbers = []
+        for filename in os.listdir(self.log_dir):
+            if filename.startswith('segment-') and filename.endswith('.log'):
+                numbers.append(int(filename[len('segment-'):-len('.log')]))
+        return sorted(numbers)
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.log_dir, f"segment-{segment:06d}.log")
+
+    def append(self, name: str, item: Dict[str, Any]) -> int:
+        """Log a record and return the segment it landed in"""
+        if self._handle is None:
+            self._handle = open(self._path(self.current), 'a', encoding='utf-8')
+            self._size = 0
+        line = json.dumps({'queue': name, 'item': item}, default=str) + '\n'
+        self._handle.write(line)
+        # Out of Python's buffer into the OS page cache: a crashed worker loses nothing
+        self._handle.flush()
+        self._size += len(line)
+        self.pending[self.current] = self.pending.get(self.current, 0) + 1
+        segment = self.current
+        if self._size >= self.max_segment_bytes:
+            self.seal()
+        return segment
+
+    def seal(self):
+        """Send further appends to a new segment (non-blocking); an empty segment is left open"""
+        if self._handle is None or not self._size:
+            return
+        self._sealed.append((self.current, self._handle))
+        self._unclosed.add(self.current)
+        self._handle = None
+        self.current += 1
+
+    def take_sealed(self) -> List[tuple]:
+        sealed, self._sealed = self._sealed, []
+        return sealed
+
+    @staticmethod
+    def close_sealed(sealed: List[tuple]):
+        """fsync and close sealed segments (blocking; run off the event loop)"""
+        for _, handle in sealed:
+            handle.flush()
+            os.fsync(handle.fileno())
+            handle.close()
+
+    def release_sealed(self, sealed: List[tuple]):
+        """Sealed segments are durable: delete those already fully committed"""
+        for segment, _ in sealed:
+            self._unclosed.discard(segment)
+            self._delete_if_done(segment)
+
+    def ack(self, segment: int):
+        """Record that one record of a segment no longer needs the log"""
+        if segment not in self.pending:
+            return
+        self.pending[segment] -= 1
+        self._delete_if_done(segment)
+
+    def _delete_if_done(self, segment: int):
+        if segment != self.current and segment not in self._unclosed and self.pending.get(segment, 0) <= 0:
+            self.pending.pop(segment, None)
+            if os.path.exists(self._path(segment)):
+                os.remove(self._path(segment))
+
+    def read_segments(self, segments: List[int]) -> List[tuple]:
+        """(queue name, item) records from leftover segments; a torn last line is skipped"""
+        records = []
+        for segment in segments:
+            with open(self._path(segment), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping torn record in log segment {segment}")
+                        continue
+                    records.append((record['queue'], record['item']))
+        return records
+
+    def remove_segments(self, segments: List[int]):
+        for segment in segments:
+            if os.path.exists(self._path(segment)):
+                os.remove(self._path(segment))
+
+    def close(self):
+        self.seal()
+        sealed = self.take_sealed()
+        self.close_sealed(sealed)
+        self.release_sealed(sealed)
+
+
+class BatchWriter:
+    """
+    Single background writer for one database file. Every session in the
+    worker process enqueues into the same queues; one task drains them into
+    one transaction per chunk, so the number of writers stays constant no
+    matter how many calls are active.
+
+    Scheduling is adaptive: a queue reaching `high_water_mark` wakes the
+    writer immediately, each wake-up drains the queues completely in chunks
+    of `batch_size`, and the sleep between ticks doubles (up to
+    `max_idle_interval`) while there is nothing to write.
+
+    Queues are bounded by `queue_policies` (see QueuePolicy) so a stalled
+    database cannot grow worker memory without limit. With `durable_log_dir`
+    set, every accepted record is also appended to a SegmentLog so queued
+    data survives a worker crash and is replayed on the next start.
+    """
+
+    DEPTH_BUCKETS = [0, 1, 5, 10, 50, 100, 500, 1000, 5000]
+    TIME_IN_QUEUE_BUCKETS_MS = [10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+    def __init__(self, db_path: str, batch_size: int = 100, flush_interval: float = 5.0,
+                 high_water_mark: Optional[int] = None, max_idle_interval: float = 30.0,
+                 queue_policies: Optional[Dict[str, QueuePolicy]] = None,
+                 spill_dir: Optional[str] = None, durable_log_dir: Optional[str] = None):
         self.db_path = db_path
         self.batch_size = batch_size
         self.flush_interval = flush_interval
-        
-        # Batch processing queues
+        self.high_water_mark = high_water_mark or batch_size
+        self.max_idle_interval = max(max_idle_interval, flush_interval)
+        self.current_interval = flush_interval
+
+        # Batch processing queues, in commit priority order
         self.transcript_queue = deque()
-        self.metrics_queue = deque()
         self.user_data_queue = deque()
-        
+        self.patient_visit_queue = deque()
+        self.metrics_queue = deque()
+        self.queues = {
+            'transcripts': self.transcript_queue,
+            'user_data': self.user_data_queue,
+            'patient_visits': self.patient_visit_queue,
+            'metrics': self.metrics_queue
+        }
+        self.policies = {**DEFAULT_QUEUE_POLICIES, **(queue_policies or {})}
+        self.dropped = {name: 0 for name in self.queues}
+        self.rejected = {name: 0 for name in self.queues}
+        self.spilled = {name: 0 for name in self.queues}
+        spill_dir = spill_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'spill')
+        db_name = os.path.splitext(os.path.basename(db_path))[0]
+        self.spill_files = {
+            name: SpillFile(os.path.join(spill_dir, f"{db_name}.{name}.jsonl"))
+            for name, policy in self.policies.items() if policy.overflow == 'spill_to_disk'
+        }
+        self.durable_log = SegmentLog(durable_log_dir) if durable_log_dir else None
+        self._log_replayed = self.durable_log is None
+        self.replayed_rows = 0
+
         # Background processing
-        self.background_task = None
+        self.background_task: Optional[asyncio.Task] = None
         self.should_stop = False
-        
-        # Initialize database
-        self._init_db_sync()
-        
-    def _init_db_sync(self):
-        """Initialize database synchronously for setup"""
-        import sqlite3
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Enable WAL mode for better concurrency
-            cursor.execute("PRAGMA journal_mode=WAL")
-            cursor.execute("PRAGMA synchronous=NORMAL")
-            cursor.execute("PRAGMA cache_size=10000")
-            cursor.execute("PRAGMA temp_store=MEMORY")
-            
-            # Sessions table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS sessions (
-                    id TEXT PRIMARY KEY,
-                    room_id TEXT,
-                    participant_id TEXT,
-                    start_time TIMESTAMP,
-                    end_time TIMESTAMP,
-                    duration_seconds INTEGER,
-                    status TEXT DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # User data table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_data (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT NOT NULL,
-                    customer_name TEXT,
-                    customer_phone TEXT,
-                    booking_date_time TEXT,
-                    booking_reason TEXT,
-                    data_snapshot TEXT,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (session_id) REFERENCES sessions (id)
-                )
-            """)
-            
-            # Conversation transcripts table with indexes
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS transcripts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT NOT NULL,
-                    agent_name TEXT,
-                    role TEXT,
-                    content TEXT,
-                    message_id TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    metadata TEXT,
-                    FOREIGN KEY (session_id) REFERENCES sessions (id)
-                )
-            """)
-            
-            # Metrics table with indexes
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS metrics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT NOT NULL,
-                    metric_type TEXT,
-                    metric_name TEXT,
-                    value REAL,
-                    unit TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    metadata TEXT,
-                    FOREIGN KEY (session_id) REFERENCES sessions (id)
-                )
-            """)
-            
-            # Agent transfers table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS agent_transfers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT NOT NULL,
-                    from_agent TEXT,
-                    to_agent TEXT,
-                    transfer_reason TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (session_id) REFERENCES sessions (id)
-                )
-            """)
-            
-            # Patients table (minimal info for privacy)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS patients (
-                    patient_id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    phone TEXT UNIQUE NOT NULL,
-                    date_of_birth DATE,
-                    email TEXT,
-                    emergency_contact TEXT,
-                    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_visit TIMESTAMP,
-                    status TEXT DEFAULT 'active'
-                )
-            """)
-            
-            # Appointments table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS appointments (
-                    appointment_id TEXT PRIMARY KEY,
-                    patient_id TEXT NOT NULL,
-                    appointment_date DATE NOT NULL,
-                    appointment_time TIME NOT NULL,
-                    treatment_type TEXT,
-                    status TEXT DEFAULT 'scheduled',
-                    notes TEXT,
-                    estimated_cost_range TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (patient_id) REFERENCES patients (patient_id)
-                )
-            """)
-            
-            # Treatment pricing knowledge base
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS treatments (
-                    treatment_id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    price_range_min INTEGER,
-                    price_range_max INTEGER,
-                    duration_minutes INTEGER,
-                    category TEXT
-                )
-            """)
-            
-            # Create indexes for better performance
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_session ON transcripts(session_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_session ON metrics(session_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_data_session ON user_data(session_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_patients_phone ON patients(phone)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments(patient_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments(appointment_date)")
-            
-            # Insert default treatment data
-            treatments_data = [
-                ('basic_cleaning', 'Basic Cleaning', 'Regular dental cleaning and polishing', 120, 150, 45, 'preventive'),
-                ('general_checkup', 'General Checkup', 'Comprehensive oral examination', 80, 100, 30, 'preventive'),
-                ('bitewing_xray', 'Bitewing X-rays', 'X-rays to check for cavities between teeth', 25, 40, 5, 'diagnostic'),
-                ('panoramic_xray', 'Panoramic X-ray', 'Full mouth X-ray for comprehensive view', 100, 130, 10, 'diagnostic'),
-                ('composite_filling', 'Composite Filling', 'Tooth-colored filling material', 150, 250, 30, 'restorative'),
-                ('amalgam_filling', 'Amalgam Filling', 'Silver filling material', 100, 200, 30, 'restorative'),
-                ('root_canal', 'Root Canal', 'Treatment for infected tooth pulp', 800, 1200, 90, 'endodontic'),
-                ('crown', 'Crown', 'Cap to restore damaged tooth', 1000, 1500, 60, 'restorative'),
-                ('teeth_whitening', 'Teeth Whitening', 'Professional teeth whitening treatment', 300, 500, 90, 'cosmetic'),
-                ('extraction', 'Tooth Extraction', 'Removal of damaged or problematic tooth', 150, 400, 45, 'surgical'),
-                ('deep_cleaning', 'Deep Cleaning (per quadrant)', 'Scaling and root planing for gum disease', 200, 300, 60, 'periodontal')
-            ]
-            
-            cursor.executemany("""
-                INSERT OR IGNORE INTO treatments 
-                (treatment_id, name, description, price_range_min, price_range_max, duration_minutes, category)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, treatments_data)
-            
-            conn.commit()
-            logger.info("Database initialized successfully with optimizations and patient management")
-    
-    async def start_background_processing(self):
-        """Start background batch processing"""
-        if self.background_task is None:
-            self.background_task = asyncio.create_task(self._background_processor())
-    
-    async def stop_background_processing(self):
-        """Stop background processing and flush remaining data"""
-        self.should_stop = True
-        if self.background_task:
+        self.sessions = 0
+        self.stats = WriterStats()
+        self.high_water_wakeups = 0
+        self.depth_histogram = Histogram(self.DEPTH_BUCKETS)
+        self.time_in_queue_histogram = Histogram(self.TIME_IN_QUEUE_BUCKETS_MS)
+        self._wake_event: Optional[asyncio.Event] = None
+        self._space_event: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    def put(self, name: str, item: Dict[str, Any]) -> bool:
+        """Enqueue an item (non-blocking) and wake the writer at the high-water mark.
+        Returns False only when the item was rejected by a full 'block' queue."""
+        queue = self.queues[name]
+        policy = self.policies[name]
+        full = len(queue) >= policy.capacity
+        if full and policy.overflow == 'block':
+            self._wake(high_water=True)
+            self.rejected[name] += 1
+            return False
+
+        item['enqueued_at'] = time.monotonic()
+        if self.durable_log is not None:
+            item['log_segment'] = self.durable_log.append(name, item)
+
+        spill = self.spill_files.get(name)
+        if spill is not None and spill.pending:
+            # Keep FIFO order: nothing jumps ahead of items already on disk
+            spill.append(item)
+            self.spilled[name] += 1
+            return True
+
+        if full:
+            self._wake(high_water=True)
+            if policy.overflow == 'spill_to_disk':
+                spill.append(item)
+                self.spilled[name] += 1
+                return True
+            if policy.overflow == 'drop_metrics_first' and name != 'metrics' and self.metrics_queue:
+                self._ack_logged(self.metrics_queue.popleft())
+                self.dropped['metrics'] += 1
+            else:
+                self._ack_logged(queue.popleft())
+                self.dropped[name] += 1
+
+        queue.append(item)
+        if len(queue) >= self.high_water_mark:
+            self._wake(high_water=True)
+        return True
+
+    async def put_wait(self, name: str, item: Dict[str, Any]) -> bool:
+        """Enqueue, waiting for the writer to free space in a full 'block' queue"""
+        while self.policies[name].overflow == 'block' and len(self.queues[name]) >= self.policies[name].capacity:
+            if self.background_task is None:
+                # No writer task to wait for: drain inline
+                if not await self.flush():
+                    break
+                continue
+            if self._space_event is None:
+                self._space_event = asyncio.Event()
+            self._space_event.clear()
+            self._wake(high_water=True)
+            await self._space_event.wait()
+        return self.put(name, item)
+
+    def _ack_logged(self, item: Dict[str, Any]):
+        """The item is committed or dropped: its log record is no longer needed"""
+        if self.durable_log is not None and 'log_segment' in item:
+            self.durable_log.ack(item['log_segment'])
+
+    async def _replay_durable_log(self):
+        """Write records left in the log by a previous process, then discard them"""
+        self._log_replayed = True
+        segments = self.durable_log.leftover
+        self.durable_log.leftover = []
+        if not segments:
+            return
+        records = await asyncio.to_thread(self.durable_log.read_segments, segments)
+        # Items the previous process spilled were logged too and are in records, unless
+        # its log was off: those are only in the spill files and are written here as well
+        for name, spill in self.spill_files.items():
+            if spill.leftover:
+                spilled = await asyncio.to_thread(spill.read, spill.leftover)
+                spill.leftover = 0
+                records.extend((name, item) for item in spilled if 'log_segment' not in item)
+        by_queue = {name: [] for name in self.queues}
+        for name, item in records:
+            by_queue[name].append(item)
+        writers = {
+            'transcripts': self._write_transcripts,
+            'user_data': self._write_user_data,
+            'patient_visits': self._write_patient_visits,
+            'metrics': self._write_metrics
+        }
+        async with get_connection_pool(self.db_path).writer() as conn:
+            for name, items in by_queue.items():
+                for start in range(0, len(items), self.batch_size):
+                    await writers[name](conn, items[start:start + self.batch_size])
+            await conn.commit()
+        self.durable_log.remove_segments(segments)
+        self.replayed_rows += len(records)
+        logger.info(f"Replayed {len(records)} queued records from {len(segments)} log segments")
+
+    def _wake(self, high_water: bool = False):
+        if self._wake_event is not None and not self._wake_event.is_set():
+            if high_water:
+                self.high_water_wakeups += 1
+            self._wake_event.set()
+
+    def _refill_from_spill(self):
+        """Move spilled items back into their queues as capacity frees up"""
+        for name, spill in self.spill_files.items():
+            room = self.policies[name].capacity - len(self.queues[name])
+            if spill.pending and room > 0:
+                self.queues[name].extend(spill.read(room))
+
+    def attach(self):
+        """Register a session and make sure the writer task is running"""
+        self.sessions += 1
+        if self.should_stop:
+            # The last session is still detaching: detach() restarts the task once the old one has exited
+            return
+        if self.background_task is None or self.background_task.done():
+            self._flush_lock = asyncio.Lock()
+            self._start_task()
+
+    def _start_task(self):
+        self.should_stop = False
+        self._wake_event = asyncio.Event()
+        self.background_task = asyncio.create_task(self._background_processor())
+
+    async def detach(self):
+        """Flush-on-end for a session; the last session out stops the task"""
+        self.sessions = max(0, self.sessions - 1)
+        if self.sessions == 0 and self.background_task is not None and not self.should_stop:
+            self.should_stop = True
+            self._wake_event.set()
             await self.background_task
-        await self._flush_all_queues()
-    
+            self.background_task = None
+            self._wake_event = None
+            self.should_stop = False
+            if self.sessions > 0:
+                # A session attached while the task was stopping
+                self._start_task()
+        await self.flush()
+
+    async def flush(self) -> int:
+        """Commit everything queued so far before returning; returns rows written"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        # Serialize with the background tick so rows it already took are committed first
+        async with self._flush_lock:
+            if not self._log_replayed:
+                await self._replay_durable_log()
+            if self.durable_log is not None:
+                # Seal the segment so it can be deleted once drained, then one fsync
+                # per tick, off the event loop, for everything appended since the last one
+                self.durable_log.seal()
+                sealed = self.durable_log.take_sealed()
+                if sealed:
+                    await asyncio.to_thread(SegmentLog.close_sealed, sealed)
+                    self.durable_log.release_sealed(sealed)
+            written = 0
+            while self.has_pending():
+                self._refill_from_spill()
+                rows = await self._flush_all_queues()
+                if rows is None:
+                    break
+                written += rows
+                if self._space_event is not None:
+                    self._space_event.set()
+                # Let voice-path coroutines run between chunks
+                await asyncio.sleep(0)
+            return written
+
+    def has_pending(self) -> bool:
+        return any(self.queues.values()) or any(spill.pending for spill in self.spill_files.values())
+
+    def _observe_depths(self):
+        for queue in self.queues.values():
+            self.depth_histogram.observe(len(queue))
+
     async def _background_processor(self):
-        """Background task to process queued operations"""
+        """Background task: drain on wake-up or timeout, back off while idle"""
         while not self.should_stop:
             try:
-                await self._flush_all_queues()
-                await asyncio.sleep(self.flush_interval)
+                self._wake_event.clear()
+                self._observe_depths()
+                written = await self.flush()
+                if self.has_pending():
+                    # A chunk failed to commit; retry after a short pause
+                    await asyncio.sleep(1)
+                    continue
+                if written:
+                    self.current_interval = self.flush_interval
+                else:
+                    self.current_interval = min(self.current_interval * 2, self.max_idle_interval)
+                try:
+                    await asyncio.wait_for(self._wake_event.wait(), timeout=self.current_interval)
+                except asyncio.TimeoutError:
+                    pass
             except Exception as e:
                 logger.error(f"Background processing error: {e}")
                 await asyncio.sleep(1)
+
+    def _take_batch(self, queue: deque) -> List[Dict[str, Any]]:
+        """Pop up to batch_size items from the front of a queue"""
+        batch = []
+        while queue and len(batch) < self.batch_size:
+            batch.append(queue.popleft())
+        return batch
+
+    async def _flush_all_queues(self) -> Optional[int]:
+        """Write one chunk from every queue in a single transaction with one commit.
+        Returns the number of rows committed, or None if the transaction failed."""
+        # Transcripts first: if the chunk fails, sampled metrics are the ones left waiting
+        batches = [
+            (self.transcript_queue, self._take_batch(self.transcript_queue), self._write_transcripts),
+            (self.user_data_queue, self._take_batch(self.user_data_queue), self._write_user_data),
+            (self.patient_visit_queue, self._take_batch(self.patient_visit_queue), self._write_patient_visits),
+            (self.metrics_queue, self._take_batch(self.metrics_queue), self._write_metrics)
+        ]
+        rows = sum(len(batch) for _, batch, _ in batches)
+        if not rows:
+            return 0
+
+        txn_start = time.perf_counter()
+        try:
+            async with get_connection_pool(self.db_path).writer() as conn:
+                for _, batch, write in batches:
+                    if batch:
+                        await write(conn, batch)
+                commit_start = time.perf_counter()
+                await conn.commit()
+        except Exception as e:
+            # Put the rows back in their original order so the next tick retries them
+            for queue, batch, _ in batches:
+                queue.extendleft(reversed(batch))
+            self.stats.failed_commits += 1
+            logger.error(f"Batch flush of {rows} rows failed: {e}")
+            return None
+
+        now = time.perf_counter()
+        self.stats.record(rows, (now - commit_start) * 1000, (now - txn_start) * 1000)
+        committed_at = time.monotonic()
+        for _, batch, _ in batches:
+            for item in batch:
+                self._ack_logged(item)
+                # Items reloaded from a previous process's spill file carry a foreign clock
+                self.time_in_queue_histogram.observe(max(0.0, committed_at - item['enqueued_at']) * 1000)
+        return rows
+
+    async def _write_transcripts(self, conn: aiosqlite.Connection, batch: List[Dict[str, Any]]):
+        """Insert a transcript batch inside the caller's transaction"""
+        await conn.executemany("""
+            INSERT INTO transcripts 
+            (session_id, agent_name, role, content, message_id, metadata, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(
+            item['session_id'],
+            item['agent_name'],
+            item['role'],
+            item['content'],
+            item['message_id'],
+            item['metadata'],
+            item['timestamp']
+        ) for item in batch])
+
+    async def _write_user_data(self, conn: aiosqlite.Connection, batch: List[Dict[str, Any]]):
+        """Insert a user data batch inside the caller's transaction"""
+        await conn.executemany("""
+            INSERT OR REPLACE INTO user_data 
+            (session_id, customer_name, customer_phone, booking_date_time, 
+             booking_reason, data_snapshot, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(
+            item['session_id'],
+            item['customer_name'],
+            item['customer_phone'],
+            item['booking_date_time'],
+            item['booking_reason'],
+            item['data_snapshot'],
+            item['timestamp']
+        ) for item in batch])
+
+    async def _write_patient_visits(self, conn: aiosqlite.Connection, batch: List[Dict[str, Any]]):
+        """Stamp last_visit for verified patients inside the caller's transaction"""
+        await conn.executemany("""
+            UPDATE patients SET last_visit = ? WHERE patient_id = ?
+        """, [(item['timestamp'], item['patient_id']) for item in batch])
+
+    async def _write_metrics(self, conn: aiosqlite.Connection, batch: List[Dict[str, Any]]):
+        """Insert a metrics batch inside the caller's transaction"""
+        await conn.executemany("""
+            INSERT INTO metrics 
+            (session_id, metric_type, metric_name, value, unit, metadata, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(
+            item['session_id'],
+            item['metric_type'],
+            item['metric_name'],
+            item['value'],
+            item['unit'],
+            item['metadata'],
+            item['timestamp']
+        ) for item in batch])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Rows-per-commit, commit latency and queue depths"""
+        return {
+            **self.stats.summary(),
+            'sessions': self.sessions,
+            'queued_transcripts': len(self.transcript_queue),
+            'queued_metrics': len(self.metrics_queue),
+            'queued_user_data': len(self.user_data_queue),
+            'queued_patient_visits': len(self.patient_visit_queue),
+            'capacity': {name: policy.capacity for name, policy in self.policies.items()},
+            'dropped': dict(self.dropped),
+            'rejected': dict(self.rejected),
+            'spilled': dict(self.spilled),
+            'spill_pending': {name: spill.pending for name, spill in self.spill_files.items()},
+            'log_segments_pending': len(self.durable_log.pending) if self.durable_log else 0,
+            'replayed_rows': self.replayed_rows,
+            'current_interval': self.current_interval,
+            'high_water_wakeups': self.high_water_wakeups,
+            'queue_depth': self.depth_histogram.summary(),
+            'time_in_queue_ms': self.time_in_queue_histogram.summary()
+        }
+
+
+# One writer per database file, shared by every session in the worker process
+_batch_writers: Dict[str, BatchWriter] = {}
+
+
+def get_batch_writer(db_path: str, batch_size: int = 100, flush_interval: float = 5.0,
+                     **writer_options) -> BatchWriter:
+    """Return the process-wide writer for db_path; the first caller's settings win"""
+    key = os.path.abspath(db_path)
+    writer = _batch_writers.get(key)
+    if writer is None:
+        writer = BatchWriter(db_path, batch_size, flush_interval, **writer_options)
+        _batch_writers[key] = writer
+    return writer
+
+
+class PossibleDuplicatePatient(Exception):
+    """A registration matched an active patient by phone, date of birth and name
+    sound but not by spelling; the caller must say whether it is them"""
+
+    def __init__(self, patient: Dict[str, Any]):
+        super().__init__(f"{patient['name']} ({patient['patient_id']}) may be the same patient")
+        self.patient = patient
+
+
+class AsyncDatabaseManager:
+    def __init__(self, db_path: str = "dental_assistant.db", batch_size: int = 100, flush_interval: float = 5.0,
+                 **writer_options):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        
+        # Process-wide writer shared by every session on this database;
+        # the queues are the writer's, so enqueueing never opens a connection
+        self.writer = get_batch_writer(db_path, batch_size, flush_interval, **writer_options)
+        self.transcript_queue = self.writer.transcript_queue
+        self.metrics_queue = self.writer.metrics_queue
+        self.user_data_queue = self.writer.user_data_queue
+        self.patient_visit_queue = self.writer.patient_visit_queue
+        
+    async def start_background_processing(self):
+        """Attach this session to the shared batch writer (starts it if needed)"""
+        self.writer.attach()
     
-    async def _flush_all_queues(self):
-        """Flush all queues to database"""
-        await asyncio.gather(
-            self._flush_transcript_queue(),
-            self._flush_metrics_queue(),
-            self._flush_user_data_queue(),
-            return_exceptions=True
-        )
+    async def stop_background_processing(self):
+        """Flush everything queued so far and detach this session from the writer"""
+        await self.writer.detach()
     
     @asynccontextmanager
     async def get_connection(self):
-        """Async context manager for database connections"""
-        conn = await aiosqlite.connect(self.db_path)
-        conn.row_factory = aiosqlite.Row
-        try:
+        """Async context manager for the pooled writer connection"""
+        async with get_connection_pool(self.db_path).writer() as conn:
             yield conn
-        finally:
-            await conn.close()
+    
+    @asynccontextmanager
+    async def get_read_connection(self):
+        """Async context manager for a pooled read-only connection"""
+        async with get_connection_pool(self.db_path).reader() as conn:
+            yield conn
+    
+    def get_writer_stats(self) -> Dict[str, Any]:
+        """Rows-per-commit and commit latency of the shared batch writer"""
+        return self.writer.get_stats()
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Connection pool statistics for this database"""
+        pool = _connection_pools.get(os.path.abspath(self.db_path))
+        return pool.get_stats() if pool else {}
     
     async def create_session(self, room_id: str, participant_id: str) -> str:
         """Create a new session and return session ID"""
@@ -268,7 +964,7 @@ class AsyncDatabaseManager:
             'booking_reason': user_data.booking_reason
         }
         
-        self.user_data_queue.append({
+        return self.writer.put('user_data', {
             'session_id': session_id,
             'customer_name': user_data.customer_name,
             'customer_phone': user_data.customer_phone,
@@ -278,37 +974,10 @@ class AsyncDatabaseManager:
             'timestamp': datetime.now()
         })
     
-    async def _flush_user_data_queue(self):
-        """Flush user data queue to database"""
-        if not self.user_data_queue:
-            return
-        
-        batch = []
-        while self.user_data_queue and len(batch) < self.batch_size:
-            batch.append(self.user_data_queue.popleft())
-        
-        if batch:
-            async with self.get_connection() as conn:
-                await conn.executemany("""
-                    INSERT OR REPLACE INTO user_data 
-                    (session_id, customer_name, customer_phone, booking_date_time, 
-                     booking_reason, data_snapshot, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, [(
-                    item['session_id'],
-                    item['customer_name'],
-                    item['customer_phone'],
-                    item['booking_date_time'],
-                    item['booking_reason'],
-                    item['data_snapshot'],
-                    item['timestamp']
-                ) for item in batch])
-                await conn.commit()
-    
     def queue_transcript(self, session_id: str, agent_name: str, role: str, 
                         content: str, message_id: str = None, metadata: Dict = None):
         """Queue transcript for batch processing (non-blocking)"""
-        self.transcript_queue.append({
+        return self.writer.put('transcripts', {
             'session_id': session_id,
             'agent_name': agent_name,
             'role': role,
@@ -318,36 +987,17 @@ class AsyncDatabaseManager:
             'timestamp': datetime.now()
         })
     
-    async def _flush_transcript_queue(self):
-        """Flush transcript queue to database"""
-        if not self.transcript_queue:
-            return
-        
-        batch = []
-        while self.transcript_queue and len(batch) < self.batch_size:
-            batch.append(self.transcript_queue.popleft())
-        
-        if batch:
-            async with self.get_connection() as conn:
-                await conn.executemany("""
-                    INSERT INTO transcripts 
-                    (session_id, agent_name, role, content, message_id, metadata, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, [(
-                    item['session_id'],
-                    item['agent_name'],
-                    item['role'],
-                    item['content'],
-                    item['message_id'],
-                    item['metadata'],
-                    item['timestamp']
-                ) for item in batch])
-                await conn.commit()
+    def queue_patient_visit(self, patient_id: str):
+        """Queue a last_visit update for batch processing (non-blocking)"""
+        return self.writer.put('patient_visits', {
+            'patient_id': patient_id,
+            'timestamp': datetime.now()
+        })
     
     def queue_metric(self, session_id: str, metric_type: str, metric_name: str, 
                     value: float, unit: str = None, metadata: Dict = None):
         """Queue metric for batch processing (non-blocking)"""
-        self.metrics_queue.append({
+        return self.writer.put('metrics', {
             'session_id': session_id,
             'metric_type': metric_type,
             'metric_name': metric_name,
@@ -357,32 +1007,6 @@ class AsyncDatabaseManager:
             'timestamp': datetime.now()
         })
     
-    async def _flush_metrics_queue(self):
-        """Flush metrics queue to database"""
-        if not self.metrics_queue:
-            return
-        
-        batch = []
-        while self.metrics_queue and len(batch) < self.batch_size:
-            batch.append(self.metrics_queue.popleft())
-        
-        if batch:
-            async with self.get_connection() as conn:
-                await conn.executemany("""
-                    INSERT INTO metrics 
-                    (session_id, metric_type, metric_name, value, unit, metadata, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, [(
-                    item['session_id'],
-                    item['metric_type'],
-                    item['metric_name'],
-                    item['value'],
-                    item['unit'],
-                    item['metadata'],
-                    item['timestamp']
-                ) for item in batch])
-                await conn.commit()
-    
     async def save_agent_transfer(self, session_id: str, from_agent: str, 
                                  to_agent: str, reason: str = None):
         """Save agent transfer immediately (these are less frequent)"""
@@ -396,7 +1020,7 @@ class AsyncDatabaseManager:
     
     async def get_session_data(self, session_id: str) -> Dict[str, Any]:
         """Get complete session data"""
-        async with self.get_connection() as conn:
+        async with self.get_read_connection() as conn:
             # Get session info
             cursor = await conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,))
             session = await cursor.fetchone()
@@ -438,44 +1062,197 @@ class AsyncDatabaseManager:
     
     # Patient Management Methods
     async def search_patient_by_phone_and_dob(self, phone: str, date_of_birth: str) -> Optional[Dict[str, Any]]:
-        """Search for patient by phone number and date of birth"""
-        async with self.get_connection() as conn:
+        """Search for patient by phone number, in any spelling, and date of birth.
+        Served from the verified-patient cache or one indexed read; last_visit
+        is stamped later by the batch writer."""
+        phone_normalized = normalize_phone(phone)
+        cache = get_patient_cache(self.db_path)
+        patient = cache.get(phone_normalized, date_of_birth) if phone_normalized else None
+        if patient is None:
+            async with self.get_read_connection() as conn:
+                if phone_normalized:
+                    cursor = await conn.execute("""
+                        SELECT * FROM patients 
+                        WHERE phone_normalized = ? AND date_of_birth = ? AND status = 'active'
+                    """, (phone_normalized, date_of_birth))
+                else:
+                    # Not a complete number: only an exact match of the stored text can find it
+                    cursor = await conn.execute("""
+                        SELECT * FROM patients 
+                        WHERE phone = ? AND date_of_birth = ? AND status = 'active'
+                    """, (phone, date_of_birth))
+                row = await cursor.fetchone()
+            if row is None:
+                return None
+            patient = dict(row)
+            if phone_normalized:
+                cache.put(phone_normalized, date_of_birth, patient)
+        
+        self.queue_patient_visit(patient['patient_id'])
+        return patient
+    
+    async def get_caller_candidates(self, phone: str, history_limit: int = 5) -> List[Dict[str, Any]]:
+        """Active patients registered with a caller's number, each with its most recent
+        appointments under 'appointments'. Also seeds the verified-patient cache, so
+        confirming the caller's date of birth afterwards needs no query."""
+        phone_normalized = normalize_phone(phone)
+        if not phone_normalized:
+            return []
+        async with self.get_read_connection() as conn:
+            # The leading column of idx_patients_phone_dob
             cursor = await conn.execute("""
-                SELECT * FROM patients 
-                WHERE phone = ? AND date_of_birth = ? AND status = 'active'
-            """, (phone, date_of_birth))
-            patient = await cursor.fetchone()
-            
-            if patient:
-                # Update last visit timestamp
-                await conn.execute("""
-                    UPDATE patients SET last_visit = ? WHERE patient_id = ?
-                """, (datetime.now(), patient['patient_id']))
-                await conn.commit()
-                
-                return dict(patient)
+                SELECT * FROM patients
+                WHERE phone_normalized = ? AND status = 'active'
+            """, (phone_normalized,))
+            patients = [dict(row) for row in await cursor.fetchall()]
+            if not patients:
+                return []
+            by_id = {patient['patient_id']: patient for patient in patients}
+            cursor = await conn.execute(f"""
+                SELECT * FROM appointments
+                WHERE patient_id IN ({', '.join('?' * len(by_id))})
+                ORDER BY appointment_date DESC, appointment_time DESC
+            """, list(by_id))
+            for patient in patients:
+                patient['appointments'] = []
+            for row in await cursor.fetchall():
+                history = by_id[row['patient_id']]['appointments']
+                if len(history) < history_limit:
+                    history.append(dict(row))
+        
+        cache = get_patient_cache(self.db_path)
+        for patient in patients:
+            cache.put(phone_normalized, patient['date_of_birth'],
+                      {key: value for key, value in patient.items() if key != 'appointments'})
+        return patients
+    
+    async def find_duplicate_patient(self, name: str, phone: str, date_of_birth: str) -> Optional[Dict[str, Any]]:
+        """Active patient with the same normalized phone, phonetic name and date of birth;
+        one probe of idx_patients_identity"""
+        phone_normalized, key = normalize_phone(phone), name_key(name)
+        if not (phone_normalized and key):
             return None
+        async with self.get_read_connection() as conn:
+            cursor = await conn.execute("""
+                SELECT * FROM patients
+                WHERE phone_normalized = ? AND name_key = ? AND date_of_birth = ? AND status = 'active'
+                LIMIT 1
+            """, (phone_normalized, key, date_of_birth))
+            row = await cursor.fetchone()
+        return dict(row) if row else None
     
     async def create_patient_record(self, name: str, phone: str, date_of_birth: str, 
-                                  email: str = None, emergency_contact: str = None) -> str:
-        """Create a new patient record and return patient ID"""
+                                  email: str = None, emergency_contact: str = None,
+                                  new_patient_confirmed: bool = False) -> str:
+        """Create a new patient record and return patient ID. A caller already
+        registered under the same phone, date of birth and spelling of the name
+        gets their existing ID instead of a duplicate record. When only the
+        name sound matches, PossibleDuplicatePatient is raised unless the
+        caller has confirmed they are a different person."""
         patient_id = str(uuid.uuid4())
+        phone_normalized, key = normalize_phone(phone), name_key(name)
         
         async with self.get_connection() as conn:
-            await conn.execute("""
-                INSERT INTO patients 
-                (patient_id, name, phone, date_of_birth, email, emergency_contact, registration_date, last_visit)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (patient_id, name, phone, date_of_birth, email, emergency_contact, 
-                  datetime.now(), datetime.now()))
-            await conn.commit()
+            # The duplicate check and the insert share the write lock
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                if phone_normalized and key:
+                    cursor = await conn.execute("""
+                        SELECT * FROM patients
+                        WHERE phone_normalized = ? AND name_key = ? AND date_of_birth = ? AND status = 'active'
+                    """, (phone_normalized, key, date_of_birth))
+                    similar = [dict(row) for row in await cursor.fetchall()]
+                    existing = next((patient for patient in similar if fold_name(patient['name']) == fold_name(name)), None)
+                    if existing:
+                        await conn.rollback()
+                        logger.info(f"Registration of {name} matches existing patient {existing['patient_id']}")
+                        return existing['patient_id']
+                    if similar and not new_patient_confirmed:
+                        raise PossibleDuplicatePatient(similar[0])
+                await conn.execute("""
+                    INSERT INTO patients 
+                    (patient_id, name, phone, phone_normalized, name_key, date_of_birth, email, emergency_contact,
+                     registration_date, last_visit)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (patient_id, name, phone, phone_normalized, key, date_of_birth, email, emergency_contact, 
+                      datetime.now(), datetime.now()))
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
         
         logger.info(f"Created patient record: {patient_id} for {name}")
         return patient_id
     
+    async def merge_duplicate_patients(self, apply: bool = False, batch_size: int = 500) -> List[Dict[str, Any]]:
+        """
+        Find active patients sharing a blocking key (normalized phone, phonetic
+        name, date of birth) in one ordered pass over idx_patients_identity,
+        and within it the same spelling of the name: a phonetic match alone
+        may be a twin or a household member, so it is never merged unasked.
+        The earliest registration of each group is kept. With apply, the
+        others' appointments move to it, missing contact details are filled in
+        from them, and they are marked 'merged' with merged_into set, batch_size
+        groups per transaction. Returns the groups as {'keep', 'merge', 'name'}.
+        """
+        async with self.get_read_connection() as conn:
+            cursor = await conn.execute("""
+                SELECT patient_id, name, phone_normalized, name_key, date_of_birth,
+                       email, emergency_contact, last_visit
+                FROM patients
+                WHERE status = 'active' AND phone_normalized IS NOT NULL AND name_key IS NOT NULL
+                ORDER BY phone_normalized, name_key, date_of_birth, registration_date, patient_id
+            """)
+            # Streamed: only the rows of one blocking key are kept in memory at a time
+            groups, members, members_key = [], [], None
+            
+            def close_group():
+                by_spelling: Dict[str, List[Dict[str, Any]]] = {}
+                for member in members:
+                    by_spelling.setdefault(fold_name(member['name']), []).append(member)
+                groups.extend(group for group in by_spelling.values() if len(group) > 1)
+            
+            async for row in cursor:
+                key = (row['phone_normalized'], row['name_key'], row['date_of_birth'])
+                if key != members_key:
+                    close_group()
+                    members, members_key = [], key
+                members.append(dict(row))
+            close_group()
+        
+        if apply:
+            cache = get_patient_cache(self.db_path)
+            for start in range(0, len(groups), batch_size):
+                chunk = groups[start:start + batch_size]
+                survivors, merged = [], []
+                for keep, *others in chunk:
+                    merged.extend((keep['patient_id'], other['patient_id']) for other in others)
+                    survivors.append((
+                        next((p['email'] for p in (keep, *others) if p['email']), None),
+                        next((p['emergency_contact'] for p in (keep, *others) if p['emergency_contact']), None),
+                        max((str(p['last_visit']) for p in (keep, *others) if p['last_visit']), default=None),
+                        keep['patient_id']
+                    ))
+                async with self.get_connection() as conn:
+                    await conn.executemany("UPDATE appointments SET patient_id = ? WHERE patient_id = ?", merged)
+                    await conn.executemany("""
+                        UPDATE patients SET email = ?, emergency_contact = ?, last_visit = ?
+                        WHERE patient_id = ?
+                    """, survivors)
+                    await conn.executemany("""
+                        UPDATE patients SET status = 'merged', merged_into = ? WHERE patient_id = ?
+                    """, merged)
+                    await conn.commit()
+                for _, patient_id in merged:
+                    cache.invalidate(patient_id)
+            logger.info(f"Merged {sum(len(g) - 1 for g in groups)} duplicate patients into {len(groups)} records")
+        
+        return [{'keep': keep['patient_id'], 'merge': [p['patient_id'] for p in others], 'name': keep['name']}
+                for keep, *others in groups]
+    
     async def get_patient_appointment_history(self, patient_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get patient's appointment history"""
-        async with self.get_connection() as conn:
+        async with self.get_read_connection() as conn:
             cursor = await conn.execute("""
                 SELECT * FROM appointments 
                 WHERE patient_id = ? 
@@ -488,7 +1265,8 @@ class AsyncDatabaseManager:
     
     async def create_appointment(self, patient_id: str, appointment_date: str, 
                                appointment_time: str, treatment_type: str = None,
-                               notes: str = None, estimated_cost_range: str = None) -> str:
+                               notes: str = None, estimated_cost_range: str = None,
+                               duration_minutes: int = 30) -> str:
         """Create a new appointment and return appointment ID"""
         appointment_id = str(uuid.uuid4())
         
@@ -496,109 +1274,64 @@ class AsyncDatabaseManager:
             await conn.execute("""
                 INSERT INTO appointments 
                 (appointment_id, patient_id, appointment_date, appointment_time, 
-                 treatment_type, notes, estimated_cost_range)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                 treatment_type, notes, estimated_cost_range, duration_minutes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """, (appointment_id, patient_id, appointment_date, appointment_time,
-                  treatment_type, notes, estimated_cost_range))
+                  treatment_type, notes, estimated_cost_range, duration_minutes))
             await conn.commit()
         
         logger.info(f"Created appointment: {appointment_id} for patient {patient_id}")
         return appointment_id
     
     # Treatment Knowledge Base Methods
+    async def get_treatment_catalog(self) -> TreatmentCatalog:
+        """In-process treatment catalog; touches the database at most once per revalidation interval"""
+        catalog = cached_catalog(self.db_path)
+        if catalog is None:
+            async with self.get_read_connection() as conn:
+                catalog = await revalidate_catalog(self.db_path, conn)
+        return catalog
+    
     async def get_treatment_info(self, treatment_name: str = None, category: str = None) -> List[Dict[str, Any]]:
         """Get treatment information by name or category"""
-        async with self.get_connection() as conn:
-            if treatment_name:
-                cursor = await conn.execute("""
-                    SELECT * FROM treatments 
-                    WHERE name LIKE ? OR treatment_id LIKE ?
-                """, (f"%{treatment_name}%", f"%{treatment_name}%"))
-            elif category:
-                cursor = await conn.execute("""
-                    SELECT * FROM treatments WHERE category = ?
-                """, (category,))
-            else:
-                cursor = await conn.execute("SELECT * FROM treatments ORDER BY category, name")
-            
-            treatments = await cursor.fetchall()
-            return [dict(t) for t in treatments]
+        catalog = await self.get_treatment_catalog()
+        if treatment_name:
+            treatments = catalog.name_or_id_contains(treatment_name)
+        elif category:
+            treatments = catalog.in_category(category)
+        else:
+            treatments = catalog.sorted_by_category
+        return [t.to_dict() for t in treatments]
     
     async def get_treatment_pricing(self, treatment_id: str) -> Optional[Dict[str, Any]]:
         """Get specific treatment pricing information"""
-        async with self.get_connection() as conn:
-            cursor = await conn.execute("""
-                SELECT * FROM treatments WHERE treatment_id = ?
-            """, (treatment_id,))
-            treatment = await cursor.fetchone()
-            
-            return dict(treatment) if treatment else None
+        treatment = (await self.get_treatment_catalog()).get(treatment_id)
+        return treatment.to_dict() if treatment else None
     
     async def search_treatments_by_keyword(self, keyword: str) -> List[Dict[str, Any]]:
         """Search treatments by keyword in name or description"""
-        async with self.get_connection() as conn:
-            cursor = await conn.execute("""
-                SELECT * FROM treatments 
-                WHERE name LIKE ? OR description LIKE ?
-                ORDER BY name
-            """, (f"%{keyword}%", f"%{keyword}%"))
-            treatments = await cursor.fetchall()
-            
-            return [dict(t) for t in treatments]
+        catalog = await self.get_treatment_catalog()
+        return [t.to_dict() for t in catalog.search(keyword)]
     
     async def get_treatment_price_duration(self, treatment_name: str) -> Optional[Dict[str, Any]]:
         """Get specific treatment price and duration with fuzzy matching"""
-        async with self.get_connection() as conn:
-            # First try exact match
-            cursor = await conn.execute("""
-                SELECT name, price_range_min, price_range_max, duration_minutes, description
-                FROM treatments 
-                WHERE LOWER(name) = LOWER(?)
-            """, (treatment_name,))
-            treatment = await cursor.fetchone()
-            
-            if treatment:
-                return dict(treatment)
-            
-            # Try fuzzy matching with LIKE
-            cursor = await conn.execute("""
-                SELECT name, price_range_min, price_range_max, duration_minutes, description
-                FROM treatments 
-                WHERE LOWER(name) LIKE LOWER(?) OR LOWER(description) LIKE LOWER(?)
-                ORDER BY 
-                    CASE 
-                        WHEN LOWER(name) LIKE LOWER(?) THEN 1
-                        WHEN LOWER(description) LIKE LOWER(?) THEN 2
-                        ELSE 3
-                    END
-                LIMIT 1
-            """, (f"%{treatment_name}%", f"%{treatment_name}%", f"%{treatment_name}%", f"%{treatment_name}%"))
-            treatment = await cursor.fetchone()
-            
-            return dict(treatment) if treatment else None
+        treatment = (await self.get_treatment_catalog()).best_match(treatment_name)
+        return treatment.to_dict() if treatment else None
     
     async def get_multiple_treatments_price_duration(self, treatment_names: List[str]) -> List[Dict[str, Any]]:
-        """Get price and duration for multiple treatments efficiently"""
-        results = []
-        async with self.get_connection() as conn:
-            for name in treatment_names:
-                cursor = await conn.execute("""
-                    SELECT name, price_range_min, price_range_max, duration_minutes, description
-                    FROM treatments 
-                    WHERE LOWER(name) LIKE LOWER(?) OR LOWER(description) LIKE LOWER(?)
-                    ORDER BY 
-                        CASE 
-                            WHEN LOWER(name) LIKE LOWER(?) THEN 1
-                            WHEN LOWER(description) LIKE LOWER(?) THEN 2
-                            ELSE 3
-                        END
-                    LIMIT 1
-                """, (f"%{name}%", f"%{name}%", f"%{name}%", f"%{name}%"))
-                treatment = await cursor.fetchone()
-                if treatment:
-                    results.append(dict(treatment))
-        
-        return results
+        """Get price and duration for multiple treatments efficiently (names without a match are skipped)"""
+        matches = await self.match_treatments(treatment_names)
+        return [matches[name] for name in treatment_names if matches[name]]
+    
+    async def match_treatments(self, treatment_names: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Best match for each requested name in a single catalog pass (None when nothing matches)"""
+        catalog = await self.get_treatment_catalog()
+        return {name: treatment.to_dict() if treatment else None
+                for name, treatment in catalog.best_matches(treatment_names).items()}
+    
+    async def get_visit_treatments(self, request: str) -> List[Dict[str, Any]]:
+        """Treatments named in a booking request for one visit, e.g. "cleaning and x-rays" """
+        return [treatment.to_dict() for treatment in (await self.get_treatment_catalog()).match_visit(request)]
 
 
 class OptimizedMetricsCollector:
@@ -0,0 +1,362 @@
+"""
+Schema migrations for the dental assistant database.
+
+Each migration runs once per database and is recorded in the
+schema_version table. run_migrations() is meant to be called at worker
+prewarm; when the schema is already current it costs a single SELECT,
+and ensure_schema() gives async callers the same guarantee without
+blocking the event loop.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+from dataclasses import dataclass
+from typing import Callable, List
+
+from patient_identity import name_key, normalize_phone
+
+logger = logging.getLogger("dental_assistant.db")
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Cursor], None]
+
+
+def _initial_schema(cursor: sqlite3.Cursor):
+    """Tables, indexes and default treatment data (safe on pre-migration databases)"""
+    # Sessions table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            room_id TEXT,
+            participant_id TEXT,
+            start_time TIMESTAMP,
+            end_time TIMESTAMP,
+            duration_seconds INTEGER,
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # User data table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            customer_name TEXT,
+            customer_phone TEXT,
+            booking_date_time TEXT,
+            booking_reason TEXT,
+            data_snapshot TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES sessions (id)
+        )
+    """)
+
+    # Conversation transcripts table with indexes
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transcripts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            agent_name TEXT,
+            role TEXT,
+            content TEXT,
+            message_id TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            metadata TEXT,
+            FOREIGN KEY (session_id) REFERENCES sessions (id)
+        )
+    """)
+
+    # Metrics table with indexes
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            metric_type TEXT,
+            metric_name TEXT,
+            value REAL,
+            unit TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            metadata TEXT,
+            FOREIGN KEY (session_id) REFERENCES sessions (id)
+        )
+    """)
+
+    # Agent transfers table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS agent_transfers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            from_agent TEXT,
+            to_agent TEXT,
+            transfer_reason TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES sessions (id)
+        )
+    """)
+
+    # Patients table (minimal info for privacy)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS patients (
+            patient_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            phone TEXT UNIQUE NOT NULL,
+            date_of_birth DATE,
+            email TEXT,
+            emergency_contact TEXT,
+            registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_visit TIMESTAMP,
+            status TEXT DEFAULT 'active'
+        )
+    """)
+
+    # Appointments table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS appointments (
+            appointment_id TEXT PRIMARY KEY,
+            patient_id TEXT NOT NULL,
+            appointment_date DATE NOT NULL,
+            appointment_time TIME NOT NULL,
+            treatment_type TEXT,
+            status TEXT DEFAULT 'scheduled',
+            notes TEXT,
+            estimated_cost_range TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients (patient_id)
+        )
+    """)
+
+    # Treatment pricing knowledge base
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS treatments (
+            treatment_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT,
+            price_range_min INTEGER,
+            price_range_max INTEGER,
+            duration_minutes INTEGER,
+            category TEXT
+        )
+    """)
+
+    # Create indexes for better performance
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_session ON transcripts(session_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_session ON metrics(session_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_data_session ON user_data(session_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_patients_phone ON patients(phone)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments(patient_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments(appointment_date)")
+
+    # Insert default treatment data
+    treatments_data = [
+        ('basic_cleaning', 'Basic Cleaning', 'Regular dental cleaning and polishing', 120, 150, 45, 'preventive'),
+        ('general_checkup', 'General Checkup', 'Comprehensive oral examination', 80, 100, 30, 'preventive'),
+        ('bitewing_xray', 'Bitewing X-rays', 'X-rays to check for cavities between teeth', 25, 40, 5, 'diagnostic'),
+        ('panoramic_xray', 'Panoramic X-ray', 'Full mouth X-ray for comprehensive view', 100, 130, 10, 'diagnostic'),
+        ('composite_filling', 'Composite Filling', 'Tooth-colored filling material', 150, 250, 30, 'restorative'),
+        ('amalgam_filling', 'Amalgam Filling', 'Silver filling material', 100, 200, 30, 'restorative'),
+        ('root_canal', 'Root Canal', 'Treatment for infected tooth pulp', 800, 1200, 90, 'endodontic'),
+        ('crown', 'Crown', 'Cap to restore damaged tooth', 1000, 1500, 60, 'restorative'),
+        ('teeth_whitening', 'Teeth Whitening', 'Professional teeth whitening treatment', 300, 500, 90, 'cosmetic'),
+        ('extraction', 'Tooth Extraction', 'Removal of damaged or problematic tooth', 150, 400, 45, 'surgical'),
+        ('deep_cleaning', 'Deep Cleaning (per quadrant)', 'Scaling and root planing for gum disease', 200, 300, 60, 'periodontal')
+    ]
+
+    cursor.executemany("""
+        INSERT OR IGNORE INTO treatments 
+        (treatment_id, name, description, price_range_min, price_range_max, duration_minutes, category)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, treatments_data)
+
+
+def _treatment_catalog_version(cursor: sqlite3.Cursor):
+    """Version stamp bumped by any change to treatments, for in-process cache invalidation"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO catalog_version (name, version) VALUES ('treatments', 1)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_treatments_version_{event.lower()}
+            AFTER {event} ON treatments
+            BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE name = 'treatments';
+            END
+        """)
+
+
+def _appointment_calendar(cursor: sqlite3.Cursor):
+    """Appointments double as the calendar store: add durations and a day/time index"""
+    cursor.execute("ALTER TABLE appointments ADD COLUMN duration_minutes INTEGER NOT NULL DEFAULT 30")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_appointments_date_time
+        ON appointments(appointment_date, appointment_time)
+    """)
+
+
+def _slot_holds(cursor: sqlite3.Cursor):
+    """Tentative holds on offered slots, shared by all workers until they expire"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS slot_holds (
+            hold_id TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            hold_date DATE NOT NULL,
+            hold_time TIME NOT NULL,
+            duration_minutes INTEGER NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slot_holds_date ON slot_holds(hold_date, expires_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_slot_holds_holder ON slot_holds(holder)")
+
+
+def _appointment_resources(cursor: sqlite3.Cursor):
+    """Provider and chair taken by each appointment or hold; NULL means the whole clinic"""
+    for table in ('appointments', 'slot_holds'):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN provider_id TEXT")
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN chair_id TEXT")
+
+
+def _patient_phone_index(cursor: sqlite3.Cursor):
+    """E.164 phone for lookups whatever the spelling, indexed with the date of birth"""
+    cursor.execute("ALTER TABLE patients ADD COLUMN phone_normalized TEXT")
+    rows = cursor.execute("SELECT patient_id, phone FROM patients").fetchall()
+    cursor.executemany("UPDATE patients SET phone_normalized = ? WHERE patient_id = ?",
+                       [(normalize_phone(phone), patient_id) for patient_id, phone in rows])
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_patients_phone_dob
+        ON patients(phone_normalized, date_of_birth)
+    """)
+
+
+def _patient_identity_index(cursor: sqlite3.Cursor):
+    """Blocking key for duplicate patients: normalized phone, phonetic name, date of birth"""
+    cursor.execute("ALTER TABLE patients ADD COLUMN name_key TEXT")
+    # The surviving record of a merged duplicate
+    cursor.execute("ALTER TABLE patients ADD COLUMN merged_into TEXT")
+    rows = cursor.execute("SELECT patient_id, name FROM patients").fetchall()
+    cursor.executemany("UPDATE patients SET name_key = ? WHERE patient_id = ?",
+                       [(name_key(name), patient_id) for patient_id, name in rows])
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_patients_identity
+        ON patients(phone_normalized, name_key, date_of_birth)
+    """)
+
+
+def _patient_shared_phones(cursor: sqlite3.Cursor):
+    """Family members and twins may share one number: rebuild patients without UNIQUE(phone),
+    leaving identity to phone_normalized and the blocking index"""
+    cursor.execute("""
+        CREATE TABLE patients_rebuilt (
+            patient_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            date_of_birth DATE,
+            email TEXT,
+            emergency_contact TEXT,
+            registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_visit TIMESTAMP,
+            status TEXT DEFAULT 'active',
+            phone_normalized TEXT,
+            name_key TEXT,
+            merged_into TEXT
+        )
+    """)
+    columns = ("patient_id, name, phone, date_of_birth, email, emergency_contact, registration_date, "
+               "last_visit, status, phone_normalized, name_key, merged_into")
+    cursor.execute(f"INSERT INTO patients_rebuilt ({columns}) SELECT {columns} FROM patients")
+    cursor.execute("DROP TABLE patients")
+    cursor.execute("ALTER TABLE patients_rebuilt RENAME TO patients")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_patients_phone ON patients(phone)")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_patients_phone_dob
+        ON patients(phone_normalized, date_of_birth)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_patients_identity
+        ON patients(phone_normalized, name_key, date_of_birth)
+    """)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial schema and treatment catalog", _initial_schema),
+    Migration(2, "treatment catalog version stamp", _treatment_catalog_version),
+    Migration(3, "appointment durations and calendar index", _appointment_calendar),
+    Migration(4, "slot holds", _slot_holds),
+    Migration(5, "appointment providers and chairs", _appointment_resources),
+    Migration(6, "normalized patient phone index", _patient_phone_index),
+    Migration(7, "duplicate patient blocking index", _patient_identity_index),
+    Migration(8, "shared patient phone numbers", _patient_shared_phones),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+# Databases already migrated by this process
+_current_databases = set()
+
+
+def _current_version(cursor: sqlite3.Cursor) -> int:
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    return cursor.fetchone()[0] or 0
+
+
+def run_migrations(db_path: str) -> int:
+    """Bring db_path up to LATEST_VERSION (blocking). Returns the number of migrations applied."""
+    key = os.path.abspath(db_path)
+    if key in _current_databases:
+        return 0
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        applied = 0
+        if _current_version(cursor) < LATEST_VERSION:
+            # Another worker may be migrating the same file: take the write lock, then re-check
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                current = _current_version(cursor)
+                for migration in MIGRATIONS:
+                    if migration.version <= current:
+                        continue
+                    migration.apply(cursor)
+                    cursor.execute(
+                        "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                        (migration.version, migration.description)
+                    )
+                    applied += 1
+                    logger.info(f"Applied migration {migration.version}: {migration.description}")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+
+    _current_databases.add(key)
+    return applied
+
+
+async def ensure_schema(db_path: str):
+    """Async guard for first use of a database; never blocks the event loop"""
+    if os.path.abspath(db_path) not in _current_databases:
+        await asyncio.to_thread(run_migrations, db_path)
@@ -0,0 +1,144 @@
+"""
+Patient identity keys for SmileRight Dental Clinic
+
+Callers give the same phone number as "514 555 1234", "1-514-555-1234" or
+"(514) 555-1234". Patients are stored and looked up by its E.164 form
+("+15145551234") so every spelling reaches the same record, and recently
+verified patients are kept in a small per-process LRU so a returning
+caller costs at most one indexed read.
+
+Names are keyed phonetically (Soundex of the first and last name), so
+"Marie Roy" and "Mary Roi" registered with the same phone and date of
+birth are flagged as possibly the same person. Only the same spelling is
+taken as the same person without asking: twins and household members can
+share a phone, a birthday and a name sound.
+"""
+
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# The clinic is in Montreal: numbers without a country code are North American
+DEFAULT_COUNTRY_CODE = '1'
+
+_NON_DIGITS = re.compile(r"\D")
+
+_SOUNDEX_CODES = {letter: digit for letters, digit in (
+    ('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6')
+) for letter in letters}
+
+
+def normalize_phone(phone: Optional[str], country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """E.164 form of a phone number, or None when it is not a complete number"""
+    if not phone:
+        return None
+    digits = _NON_DIGITS.sub('', phone)
+    if phone.strip().startswith('+') or phone.strip().startswith('00'):
+        digits = digits[2:] if phone.strip().startswith('00') else digits
+        return f"+{digits}" if 8 <= len(digits) <= 15 else None
+    if country_code == '1':
+        if len(digits) == 11 and digits.startswith('1'):
+            digits = digits[1:]
+        # North American area codes never start with 0 or 1
+        if len(digits) == 10 and digits[0] not in '01':
+            return f"+1{digits}"
+        return None
+    return f"+{country_code}{digits}" if 6 <= len(digits) <= 14 else None
+
+
+def soundex(word: str) -> str:
+    """American Soundex code of a word ("Robert" -> "R163"), or '' if it has no letters"""
+    letters = [ch for ch in unicodedata.normalize('NFKD', word.casefold()) if 'a' <= ch <= 'z']
+    if not letters:
+        return ''
+    code, last = letters[0].upper(), _SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = _SOUNDEX_CODES.get(letter, '')
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        # Vowels separate repeated codes; h and w do not
+        if letter not in 'hw':
+            last = digit
+    return code.ljust(4, '0')
+
+
+def name_key(name: Optional[str]) -> Optional[str]:
+    """Phonetic key of a full name: Soundex of its first and last words"""
+    words = [code for code in (soundex(word) for word in re.split(r"[\s\-]+", name or '')) if code]
+    if not words:
+        return None
+    return words[0] if len(words) == 1 else words[0] + words[-1]
+
+
+def fold_name(name: Optional[str]) -> str:
+    """A name's spelling with case, accents, spacing and hyphens ignored ("Marie-Ève" -> "marie eve")"""
+    name = ''.join(ch for ch in unicodedata.normalize('NFKD', (name or '').casefold()) if not unicodedata.combining(ch))
+    return ' '.join(re.split(r"[\s\-]+", name.strip()))
+
+
+class PatientCache:
+    """
+    LRU of recently verified patients keyed by (E.164 phone, date of birth).
+    Entries expire after ttl_seconds so edits made by other workers are
+    picked up; only hits are cached, since a miss may be followed by a
+    registration.
+    """
+
+    def __init__(self, max_size: int = 256, ttl_seconds: float = 300.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], float]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, phone_normalized: str, date_of_birth: str) -> Optional[Dict[str, Any]]:
+        key = (phone_normalized, date_of_birth)
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.ttl_seconds:
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[0])
+
+    def put(self, phone_normalized: str, date_of_birth: str, patient: Dict[str, Any]):
+        key = (phone_normalized, date_of_birth)
+        self._entries[key] = (dict(patient), time.monotonic())
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, patient_id: str):
+        """Forget every entry for patient_id"""
+        for key in [key for key, (patient, _) in self._entries.items() if patient.get('patient_id') == patient_id]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+# One cache per database file, shared by every session in the worker process
+_patient_caches: Dict[str, PatientCache] = {}
+
+
+def get_patient_cache(db_path: str) -> PatientCache:
+    key = os.path.abspath(db_path)
+    cache = _patient_caches.get(key)
+    if cache is None:
+        cache = _patient_caches[key] = PatientCache()
+    return cache
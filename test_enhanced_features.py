@@ -5,15 +5,53 @@ Tests patient management, treatment database, and calendar integration
 """
 
 import asyncio
+import multiprocessing
+import subprocess
 import sys
 import os
+import tempfile
+import threading
+import time
 from datetime import datetime, date, timedelta
 
 # Add current directory to path for imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from db_manager import AsyncDatabaseManager
-from calendar_service import calendar_service, Appointment as CalendarAppointment
+from db_manager import (
+    AsyncDatabaseManager, BatchWriter, PossibleDuplicatePatient, QueuePolicy, close_connection_pools, get_connection_pool
+)
+import db_migrations
+import treatment_catalog
+from benchmark_performance import (
+    evaluate_treatment_matching, evaluate_date_time_parsing, build_year_calendar, linear_scan_available,
+    linear_scan_slots, linear_scan_suggestions, BOOKING_DATE_TIME_CORPUS
+)
+from calendar_service import (
+    calendar_service, spoken_date, spoken_time, BlockRule, CalendarService, Resource, TimerWheel,
+    Appointment as CalendarAppointment
+)
+from calendar_store import CalendarStore
+from date_time_parser import parse_date_time, ParsedDateTime
+from patient_identity import get_patient_cache, name_key, normalize_phone, soundex
+
+def run_database_test(name: str, body, db_name: str = "test.db"):
+    """
+    Run `await body(db_path)` on a fresh database in a temporary directory,
+    closing the connection pools afterwards. A failure is reported like the
+    other feature tests report theirs, then re-raised for the test runner.
+    """
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            try:
+                return await body(os.path.join(tmp_dir, db_name))
+            finally:
+                await close_connection_pools()
+    
+    try:
+        return asyncio.run(run())
+    except Exception as e:
+        print(f"❌ {name} test failed: {e!r}")
+        raise
 
 async def test_database_features():
     """Test database functionality"""
@@ -73,6 +111,574 @@ async def test_database_features():
     finally:
         await db_manager.stop_background_processing()
 
+def test_connection_pool():
+    """Test pooled connections are reused and bounded"""
+    print("\n🔌 Testing Connection Pool...")
+    
+    async def run(db_path):
+        db_manager = AsyncDatabaseManager(db_path)
+        # Many concurrent reads share at most max_readers connections
+        results = await asyncio.gather(*[db_manager.get_treatment_info() for _ in range(20)])
+        assert all(len(r) == len(results[0]) for r in results)
+        
+        async with db_manager.get_connection() as first:
+            pass
+        async with db_manager.get_connection() as second:
+            pass
+        assert first is second, "writer connection should be reused"
+        
+        stats = db_manager.get_pool_stats()
+        assert stats['readers_open'] <= stats['max_readers']
+        assert stats['reader']['checkouts'] == 20
+        assert stats['writer']['checkouts'] == 2
+        print(f"Readers opened: {stats['readers_open']}, reader waits: {stats['reader']['waits']}, "
+              f"avg wait: {stats['reader']['avg_wait_ms']:.2f} ms")
+    
+    threads = threading.active_count()
+    run_database_test("Connection pool", run, "pool_test.db")
+    # Closing the pools ends every connection's worker thread, so nothing holds the process open
+    assert threading.active_count() == threads, threading.enumerate()
+    print("✅ Connection pool tests completed successfully!")
+
+def test_batch_writer():
+    """Test queued transcripts, metrics and user data are committed together"""
+    print("\n🗄️ Testing Batch Writer...")
+    
+    async def run(db_path):
+        db_manager = AsyncDatabaseManager(db_path)
+        session_id = await db_manager.create_session("room-test", "participant-test")
+        db_manager.queue_transcript(session_id, "Greeter", "user", "Hello")
+        db_manager.queue_transcript(session_id, "Greeter", "assistant", "Hi there")
+        db_manager.queue_metric(session_id, "LLMMetrics", "ttft", 0.4, "s")
+        db_manager.queue_user_data(session_id, type("UserData", (), {
+            'customer_name': "Test Patient", 'customer_phone': None,
+            'booking_date_time': None, 'booking_reason': None
+        })())
+        await db_manager.stop_background_processing()
+        
+        stats = db_manager.get_writer_stats()
+        assert stats['commits'] == 1, "all queues should share one commit"
+        assert stats['rows'] == 4
+        
+        session_data = await db_manager.get_session_data(session_id)
+        assert len(session_data['transcripts']) == 2
+        assert len(session_data['metrics']) == 1
+        assert session_data['user_data']['customer_name'] == "Test Patient"
+        print(f"Rows per commit: {stats['avg_rows_per_commit']:.1f}, commit latency: {stats['avg_commit_ms']:.2f} ms")
+    
+    run_database_test("Batch writer", run, "writer_test.db")
+    print("✅ Batch writer tests completed successfully!")
+
+def test_shared_batch_writer():
+    """Test concurrent sessions share one writer and flush on end"""
+    print("\n👥 Testing Shared Batch Writer...")
+    
+    async def run(db_path):
+        managers = [AsyncDatabaseManager(db_path) for _ in range(10)]
+        assert len({id(m.writer) for m in managers}) == 1, "sessions should share one writer"
+        
+        session_ids = []
+        for manager in managers:
+            await manager.start_background_processing()
+            session_ids.append(await manager.create_session("room", "participant"))
+        assert managers[0].writer.sessions == 10
+        
+        for manager, session_id in zip(managers, session_ids):
+            manager.queue_transcript(session_id, "Greeter", "user", "Hello")
+        
+        # Ending one session commits its rows even while others are still active
+        await managers[0].stop_background_processing()
+        session_data = await managers[0].get_session_data(session_ids[0])
+        assert len(session_data['transcripts']) == 1
+        assert managers[0].writer.background_task is not None
+        
+        for manager in managers[1:]:
+            await manager.stop_background_processing()
+        assert managers[0].writer.background_task is None
+        print(f"Writer stats: {managers[0].get_writer_stats()['commits']} commits for 10 sessions")
+        
+        # A session joining while the last one is still leaving gets a running writer
+        first, second = managers[:2]
+        await first.start_background_processing()
+        leaving = asyncio.create_task(first.stop_background_processing())
+        await asyncio.sleep(0)
+        await second.start_background_processing()
+        await leaving
+        assert second.writer.sessions == 1 and not second.writer.background_task.done()
+        await second.stop_background_processing()
+        assert second.writer.background_task is None
+    
+    run_database_test("Shared batch writer", run, "shared_writer_test.db")
+    print("✅ Shared batch writer tests completed successfully!")
+
+def test_adaptive_flush():
+    """Test a burst past the high-water mark is drained immediately in chunks"""
+    print("\n⏱️ Testing Adaptive Flush Scheduling...")
+    
+    async def run(db_path):
+        # Long interval: only the high-water mark can trigger the flush in time
+        db_manager = AsyncDatabaseManager(db_path, batch_size=10, flush_interval=60.0)
+        try:
+            await db_manager.start_background_processing()
+            session_id = await db_manager.create_session("room", "participant")
+            await asyncio.sleep(0.05)  # let the first (empty) tick pass
+            
+            for i in range(25):
+                db_manager.queue_transcript(session_id, "Greeter", "user", f"message {i}")
+            await asyncio.sleep(0.5)
+            
+            stats = db_manager.get_writer_stats()
+            assert stats['high_water_wakeups'] >= 1
+            assert stats['rows'] == 25, "burst should be fully drained without waiting for the interval"
+            assert stats['commits'] == 3, "drain should use batch_size chunks"
+            assert stats['time_in_queue_ms']['count'] == 25
+            print(f"Commits: {stats['commits']}, time in queue p95: {stats['time_in_queue_ms']['p95']} ms, "
+                  f"queue depth p95: {stats['queue_depth']['p95']}")
+        finally:
+            await db_manager.stop_background_processing()
+    
+    run_database_test("Adaptive flush", run, "adaptive_test.db")
+    print("✅ Adaptive flush tests completed successfully!")
+
+def test_bounded_queues():
+    """Test queue capacities, drop policies and spill-to-disk"""
+    print("\n🚧 Testing Bounded Telemetry Queues...")
+    
+    snapshot = type("UserData", (), {
+        'customer_name': None, 'customer_phone': None,
+        'booking_date_time': None, 'booking_reason': None
+    })
+    
+    async def run(db_path):
+        db_manager = AsyncDatabaseManager(
+            db_path,
+            queue_policies={
+                'transcripts': QueuePolicy(capacity=5, overflow='drop_metrics_first'),
+                'metrics': QueuePolicy(capacity=5, overflow='drop_oldest'),
+                'user_data': QueuePolicy(capacity=2, overflow='spill_to_disk')
+            },
+            spill_dir=os.path.join(os.path.dirname(db_path), "spill")
+        )
+        blocking_manager = AsyncDatabaseManager(
+            os.path.join(os.path.dirname(db_path), "blocking_test.db"),
+            queue_policies={'metrics': QueuePolicy(capacity=2, overflow='block')}
+        )
+        try:
+            session_id = await db_manager.create_session("room", "participant")
+            for i in range(5):
+                db_manager.queue_metric(session_id, "LLMMetrics", f"metric_{i}", i)
+            for i in range(8):
+                db_manager.queue_transcript(session_id, "Greeter", "user", f"message {i}")
+            
+            # Transcripts over capacity evict sampled metrics instead of themselves
+            assert len(db_manager.transcript_queue) == 8
+            assert len(db_manager.metrics_queue) == 2
+            assert db_manager.writer.dropped == {'transcripts': 0, 'user_data': 0, 'patient_visits': 0, 'metrics': 3}
+            
+            for i in range(5):
+                db_manager.queue_metric(session_id, "LLMMetrics", f"late_metric_{i}", i)
+            assert len(db_manager.metrics_queue) == 5
+            assert db_manager.writer.dropped['metrics'] == 5
+            
+            for i in range(5):
+                db_manager.queue_user_data(session_id, snapshot())
+            assert len(db_manager.user_data_queue) == 2
+            assert db_manager.writer.spilled['user_data'] == 3
+            
+            await db_manager.stop_background_processing()
+            stats = db_manager.get_writer_stats()
+            assert stats['rows'] == 8 + 5 + 5, "spilled snapshots should be committed too"
+            assert stats['spill_pending']['user_data'] == 0
+            
+            blocking_session = await blocking_manager.create_session("room", "participant")
+            assert blocking_manager.queue_metric(blocking_session, "LLMMetrics", "a", 1)
+            assert blocking_manager.queue_metric(blocking_session, "LLMMetrics", "b", 2)
+            assert not blocking_manager.queue_metric(blocking_session, "LLMMetrics", "c", 3)
+            assert blocking_manager.writer.rejected['metrics'] == 1
+            assert await blocking_manager.writer.put_wait('metrics', {
+                'session_id': blocking_session, 'metric_type': "LLMMetrics", 'metric_name': "c",
+                'value': 3, 'unit': None, 'metadata': None, 'timestamp': datetime.now()
+            })
+            print(f"Dropped: {stats['dropped']}, spilled: {stats['spilled']}, "
+                  f"rejected: {blocking_manager.writer.rejected}")
+        finally:
+            await blocking_manager.stop_background_processing()
+    
+    run_database_test("Bounded queue", run, "bounded_test.db")
+    print("✅ Bounded queue tests completed successfully!")
+
+def test_durable_log_replay():
+    """Test queued records survive a crash and are replayed on restart"""
+    print("\n💾 Testing Durable Queue Log...")
+    
+    async def run(db_path):
+        log_dir = os.path.join(os.path.dirname(db_path), "queue_log")
+        db_manager = AsyncDatabaseManager(db_path, durable_log_dir=log_dir)
+        session_id = await db_manager.create_session("room", "participant")
+        for i in range(3):
+            db_manager.queue_transcript(session_id, "Greeter", "user", f"message {i}")
+        
+        # Simulate a crash: a new writer starts on the same files and the queued rows never flushed
+        recovered = BatchWriter(db_path, durable_log_dir=log_dir)
+        assert recovered.durable_log.leftover, "segments should survive the crash"
+        await recovered.flush()
+        assert recovered.replayed_rows == 3
+        assert not recovered.durable_log.segment_numbers(), "replayed segments should be removed"
+        
+        session_data = await db_manager.get_session_data(session_id)
+        assert [t['content'] for t in session_data['transcripts']] == [f"message {i}" for i in range(3)]
+        
+        # Normal operation: segments are truncated once their rows are committed
+        recovered.put('transcripts', {
+            'session_id': session_id, 'agent_name': "Greeter", 'role': "user", 'content': "after restart",
+            'message_id': "after-restart", 'metadata': None, 'timestamp': datetime.now()
+        })
+        await recovered.flush()
+        assert not recovered.durable_log.segment_numbers()
+        # Idle ticks seal nothing and leave no empty segments behind
+        segment = recovered.durable_log.current
+        await recovered.flush()
+        assert recovered.durable_log.current == segment and not recovered.durable_log.segment_numbers()
+        
+        # A full segment is sealed on put() but only fsynced and closed by the writer tick
+        recovered.durable_log.max_segment_bytes = 1
+        recovered.put('transcripts', {
+            'session_id': session_id, 'agent_name': "Greeter", 'role': "user", 'content': "big",
+            'message_id': "big", 'metadata': None, 'timestamp': datetime.now()
+        })
+        (sealed_segment, handle), = recovered.durable_log._sealed
+        assert not handle.closed
+        await recovered.flush()
+        assert handle.closed and not recovered.durable_log.segment_numbers()
+        print(f"Replayed {recovered.replayed_rows} rows after simulated crash")
+    
+    async def spilled_without_log(db_path):
+        log_dir = os.path.join(os.path.dirname(db_path), "queue_log")
+        spill = {'transcripts': QueuePolicy(capacity=1, overflow='spill_to_disk')}
+        session_id = await AsyncDatabaseManager(db_path).create_session("room", "participant")
+        
+        def transcript(content):
+            return {'session_id': session_id, 'agent_name': "Greeter", 'role': "user", 'content': content,
+                    'message_id': content, 'metadata': None, 'timestamp': datetime.now()}
+        
+        # A run without the log spills two rows, then a run with it spills a third; both crash
+        unlogged = BatchWriter(db_path, queue_policies=spill)
+        for content in ("queued", "spilled 1", "spilled 2"):
+            unlogged.put('transcripts', transcript(content))
+        logged = BatchWriter(db_path, queue_policies=spill, durable_log_dir=log_dir)
+        logged.put('transcripts', transcript("spilled 3"))
+        
+        recovered = BatchWriter(db_path, queue_policies=spill, durable_log_dir=log_dir)
+        await recovered.flush()
+        async with get_connection_pool(db_path).reader() as conn:
+            cursor = await conn.execute("SELECT content FROM transcripts ORDER BY content")
+            contents = [row[0] for row in await cursor.fetchall()]
+        # "queued" only ever lived in the crashed process's memory
+        assert contents == ["spilled 1", "spilled 2", "spilled 3"], contents
+    
+    run_database_test("Durable queue log", run, "durable_test.db")
+    run_database_test("Durable queue log", spilled_without_log, "spill_replay_test.db")
+    print("✅ Durable queue log tests completed successfully!")
+
+def test_schema_migrations():
+    """Test migrations run once per database and are skipped when current"""
+    print("\n🧱 Testing Schema Migrations...")
+    
+    import sqlite3
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "migrations_test.db")
+        
+        # A database created before the migration system existed
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("CREATE TABLE sessions (id TEXT PRIMARY KEY, room_id TEXT, participant_id TEXT, "
+                         "start_time TIMESTAMP, end_time TIMESTAMP, duration_seconds INTEGER, "
+                         "status TEXT DEFAULT 'active', created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+        
+        applied = db_migrations.run_migrations(db_path)
+        assert applied == len(db_migrations.MIGRATIONS)
+        assert db_migrations.run_migrations(db_path) == 0, "process cache should skip a current schema"
+        
+        # A new worker process finds the schema current without re-running anything
+        db_migrations._current_databases.discard(os.path.abspath(db_path))
+        assert db_migrations.run_migrations(db_path) == 0
+        
+        with sqlite3.connect(db_path) as conn:
+            version = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0]
+            treatments = conn.execute("SELECT COUNT(*) FROM treatments").fetchone()[0]
+        assert version == db_migrations.LATEST_VERSION
+        assert treatments == 11
+        print(f"Schema at version {version} after {applied} migrations")
+    
+    print("✅ Schema migration tests completed successfully!")
+
+def test_patient_lookup():
+    """Test returning patients are found by any phone spelling with one read and no commit"""
+    print("\n🪪 Testing Patient Lookup...")
+    
+    import sqlite3
+    assert {normalize_phone(p) for p in ("514 555 1234", "1-514-555-1234", "(514) 555-1234", "+1 514 555 1234")} == \
+        {"+15145551234"}
+    assert normalize_phone("555-1234") is None and normalize_phone("+44 20 7946 0958") == "+442079460958"
+    
+    async def run(db_path):
+        # Patients registered before phones were normalized
+        with sqlite3.connect(db_path, isolation_level=None) as conn:
+            conn.execute("CREATE TABLE schema_version (version INTEGER PRIMARY KEY, description TEXT, "
+                         "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+            for migration in db_migrations.MIGRATIONS[:5]:
+                migration.apply(conn.cursor())
+                conn.execute("INSERT INTO schema_version (version) VALUES (?)", (migration.version,))
+            conn.execute("INSERT INTO patients (patient_id, name, phone, date_of_birth) "
+                         "VALUES ('p1', 'Jane Roy', '1-514-555-1234', '1985-06-15')")
+        assert db_migrations.run_migrations(db_path) == len(db_migrations.MIGRATIONS) - 5
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT phone_normalized FROM patients").fetchone()[0] == "+15145551234"
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM patients WHERE phone_normalized = ? "
+                                "AND date_of_birth = ?", ("+15145551234", "1985-06-15")).fetchall()
+            assert any("idx_patients_phone_dob" in row[-1] for row in plan), plan
+            
+        db_manager = AsyncDatabaseManager(db_path)
+        patient = await db_manager.search_patient_by_phone_and_dob("514 555 1234", "1985-06-15")
+        assert patient and patient['patient_id'] == 'p1'
+        assert await db_manager.search_patient_by_phone_and_dob("514 555 1234", "1985-06-16") is None
+        # The last_visit stamp waits for the batch writer
+        stats = db_manager.get_writer_stats()
+        assert stats['commits'] == 0 and stats['queued_patient_visits'] == 1
+        
+        cache = get_patient_cache(db_path)
+        again = await db_manager.search_patient_by_phone_and_dob("(514) 555-1234", "1985-06-15")
+        assert again == patient and cache.get_stats()['hits'] == 1
+        
+        await db_manager.writer.flush()
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT last_visit FROM patients").fetchone()[0] is not None
+        
+        patient_id = await db_manager.create_patient_record("Luc Roy", "(438) 555-0101", "1990-01-01")
+        found = await db_manager.search_patient_by_phone_and_dob("14385550101", "1990-01-01")
+        assert found['patient_id'] == patient_id
+    
+    run_database_test("Patient lookup", run, "patients_test.db")
+    print("✅ Patient lookup tests completed successfully!")
+
+def test_caller_prefetch():
+    """Test caller-ID candidates arrive with their history and make DOB confirmation query-free"""
+    print("\n📞 Testing Caller Pre-fetch...")
+    
+    async def run(db_path):
+        db_manager = AsyncDatabaseManager(db_path)
+        # Two family members registered on the same line, written the same way
+        parent = await db_manager.create_patient_record("Marie Roy", "1-514-555-7788", "1970-03-02")
+        child = await db_manager.create_patient_record("Leo Roy", "1-514-555-7788", "2005-09-30")
+        for day in range(1, 8):
+            await db_manager.create_appointment(parent, f"2025-03-{day:02d}", "10:00", "Cleaning")
+        
+        candidates = await db_manager.get_caller_candidates("+15145557788", history_limit=3)
+        by_id = {patient['patient_id']: patient for patient in candidates}
+        assert set(by_id) == {parent, child}
+        assert [a['appointment_date'] for a in by_id[parent]['appointments']] == \
+            ["2025-03-07", "2025-03-06", "2025-03-05"]
+        assert by_id[child]['appointments'] == []
+        assert await db_manager.get_caller_candidates("+15145550000") == []
+        assert await db_manager.get_caller_candidates("anonymous") == []
+        
+        # The date-of-birth check that follows is answered from the seeded cache
+        hits = get_patient_cache(db_path).get_stats()['hits']
+        patient = await db_manager.search_patient_by_phone_and_dob("514 555 7788", "2005-09-30")
+        assert patient['patient_id'] == child and 'appointments' not in patient
+        assert get_patient_cache(db_path).get_stats()['hits'] == hits + 1
+    
+    run_database_test("Caller pre-fetch", run, "prefetch_test.db")
+    print("✅ Caller pre-fetch tests completed successfully!")
+
+def test_duplicate_patients():
+    """Test registration reuses a record spelled the same, asks about similar ones, and the batch job
+    merges older duplicates"""
+    print("\n👥 Testing Duplicate Patient Detection...")
+    
+    assert [soundex(w) for w in ("Robert", "Rupert", "Ashcraft", "Tymczak", "Pfister")] == \
+        ["R163", "R163", "A261", "T522", "P236"]
+    assert name_key("Marie Roy") == name_key("Mary Roi") != name_key("Leo Roy")
+    
+    import sqlite3
+    async def run(db_path):
+        db_manager = AsyncDatabaseManager(db_path)
+        marie = await db_manager.create_patient_record("Marie Roy", "514-555-1234", "1970-03-02")
+        # Same name, cased and dialled differently: no second record
+        assert await db_manager.create_patient_record("marie  ROY", "1 (514) 555 1234", "1970-03-02") == marie
+        assert (await db_manager.find_duplicate_patient("mary roy", "5145551234", "1970-03-02"))['patient_id'] == marie
+        # Only the name sound matches: may be a twin, so the caller is asked first
+        try:
+            await db_manager.create_patient_record("Mary Roi", "514-555-1234", "1970-03-02")
+            assert False, "expected PossibleDuplicatePatient"
+        except PossibleDuplicatePatient as e:
+            assert e.patient['patient_id'] == marie
+        twin = await db_manager.create_patient_record("Mary Roi", "514-555-1234", "1970-03-02",
+                                                      new_patient_confirmed=True)
+        assert twin != marie
+        # A family member on the same line is a different patient
+        leo = await db_manager.create_patient_record("Leo Roy", "514-555-1234", "2005-09-30")
+        assert leo != marie
+        
+        # Duplicates registered before the check existed
+        with sqlite3.connect(db_path) as conn:
+            conn.executemany(
+                "INSERT INTO patients (patient_id, name, phone, phone_normalized, name_key, date_of_birth, "
+                "email, registration_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(f"old{i}", "Marie Roy", phone, normalize_phone(phone), name_key("Marie Roy"),
+                  "1970-03-02", email, "2099-01-01")
+                 for i, (phone, email) in enumerate([("514.555.1234", "marie@example.com"),
+                                                     ("(514) 555-1234", None)])])
+        await db_manager.create_appointment("old0", "2025-03-03", "10:00", "Cleaning")
+        
+        groups = await db_manager.merge_duplicate_patients()
+        assert groups == [{'keep': marie, 'merge': ["old0", "old1"], 'name': "Marie Roy"}]
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM patients WHERE status = 'active'").fetchone()[0] == 5
+        
+        assert await db_manager.merge_duplicate_patients(apply=True, batch_size=1) == groups
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT patient_id FROM appointments").fetchone()[0] == marie
+            assert conn.execute("SELECT email FROM patients WHERE patient_id = ?",
+                                (marie,)).fetchone()[0] == "marie@example.com"
+            assert conn.execute("SELECT merged_into FROM patients WHERE status = 'merged'").fetchall() == \
+                [(marie,), (marie,)]
+        assert await db_manager.merge_duplicate_patients() == []
+    
+    run_database_test("Duplicate patient detection", run, "dedup_test.db")
+    print("✅ Duplicate patient detection tests completed successfully!")
+
+def test_treatment_catalog_cache():
+    """Test treatment lookups are served from memory and table edits invalidate the cache"""
+    print("\n📚 Testing Treatment Catalog Cache...")
+    
+    async def run(db_path):
+        db_manager = AsyncDatabaseManager(db_path)
+        catalog = await db_manager.get_treatment_catalog()
+        assert len(catalog) == 11
+        assert catalog.find_by_name("  root CANAL ").treatment_id == "root_canal"
+        assert [t.name for t in catalog.in_category("diagnostic")] == ["Bitewing X-rays", "Panoramic X-ray"]
+        
+        checkouts = db_manager.get_pool_stats()['reader']['checkouts']
+        for _ in range(100):
+            await db_manager.get_treatment_price_duration("Root Canal")
+            await db_manager.search_treatments_by_keyword("cleaning")
+        assert db_manager.get_pool_stats()['reader']['checkouts'] == checkouts, "lookups should not touch SQLite"
+        
+        lookups = 100000
+        start = time.perf_counter()
+        for _ in range(lookups):
+            catalog.find_by_name("root canal")
+        per_lookup_us = (time.perf_counter() - start) / lookups * 1e6
+        
+        async with db_manager.get_connection() as conn:
+            await conn.execute("UPDATE treatments SET price_range_max = 1300 WHERE treatment_id = 'root_canal'")
+            await conn.commit()
+        
+        # Stale until revalidated; the version stamp triggers a reload
+        treatment_catalog.invalidate_catalog(db_path)
+        updated = await db_manager.get_treatment_price_duration("Root Canal")
+        assert updated['price_range_max'] == 1300
+        assert (await db_manager.get_treatment_catalog()).version > catalog.version
+        print(f"Catalog version {catalog.version} -> {(await db_manager.get_treatment_catalog()).version}, "
+              f"name lookup: {per_lookup_us:.2f} µs")
+    
+    run_database_test("Treatment catalog cache", run, "catalog_test.db")
+    print("✅ Treatment catalog cache tests completed successfully!")
+
+def test_treatment_matcher():
+    """Test fuzzy matching of spoken treatment phrasings against the catalog"""
+    print("\n🗣️ Testing Treatment Matcher...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "matcher_test.db")
+        db_migrations.run_migrations(db_path)
+        catalog = treatment_catalog.load_catalog_sync(db_path)
+        treatment_catalog.invalidate_catalog(db_path)
+    
+    for phrase, expected in [("root canals", "root_canal"), ("whitening my teeth", "teeth_whitening"),
+                             ("deep clean", "deep_cleaning"), ("root canel", "root_canal"),
+                             ("I need a tooth pulled", "extraction")]:
+        candidates = catalog.rank_matches(phrase)
+        assert candidates and candidates[0].treatment.treatment_id == expected, (phrase, candidates)
+        assert all(a.score >= b.score for a, b in zip(candidates, candidates[1:]))
+    assert catalog.rank_matches("haircut") == []
+    # "deep clean" must not fall back to Basic Cleaning's substring match
+    assert catalog.rank_matches("deep clean")[0].score > catalog.rank_matches("deep clean")[1].score
+    
+    results = evaluate_treatment_matching(catalog)
+    fuzzy, legacy = results["fuzzy matcher"], results["legacy substring"]
+    print(f"Spoken corpus hit rate: {fuzzy['hit_rate']:.1%} (legacy substring {legacy['hit_rate']:.1%})")
+    assert fuzzy['hit_rate'] >= 0.9 and fuzzy['hit_rate'] > legacy['hit_rate']
+    print("✅ Treatment matcher tests completed successfully!")
+
+def test_date_time_parser():
+    """Test spoken booking dates and times resolve locally, in English and French"""
+    print("\n📅 Testing Date/Time Parser...")
+    
+    tuesday = datetime(2025, 2, 4, 10, 0)
+    assert parse_date_time("next Tuesday afternoon", tuesday) == \
+        ParsedDateTime("2025-02-11", None, ("13:00", "18:00"))
+    assert parse_date_time("demain à 14h30", tuesday) == ParsedDateTime("2025-02-05", "14:30")
+    # Bare hours are afternoon ones unless the caller says otherwise
+    assert parse_date_time("Friday at 3", tuesday).time == "15:00"
+    assert parse_date_time("Friday morning at 9", tuesday).time == "09:00"
+    # A time alone is today's if still ahead, else tomorrow's
+    assert parse_date_time("at 9", tuesday).date == "2025-02-05"
+    assert parse_date_time("whenever works", tuesday) is None
+    # Hours and minutes without "at", ordinal days next to a month, and offsets from a date
+    assert parse_date_time("twelve thirty", tuesday) == ParsedDateTime("2025-02-04", "12:30")
+    assert parse_date_time("march second", tuesday) == parse_date_time("the second of march", tuesday) == \
+        ParsedDateTime("2025-03-02")
+    assert parse_date_time("March thirty-first at ten", tuesday) == ParsedDateTime("2025-03-31", "10:00")
+    assert parse_date_time("a week from Friday", tuesday) == ParsedDateTime("2025-02-14")
+    assert parse_date_time("two weeks from tomorrow", tuesday) == ParsedDateTime("2025-02-19")
+    assert parse_date_time("the first opening you have", tuesday) is None
+    # The normalized text parses back to the same value, whatever today is
+    for phrase, _ in BOOKING_DATE_TIME_CORPUS:
+        parsed = parse_date_time(phrase, tuesday)
+        assert parsed is None or parse_date_time(str(parsed), datetime(2025, 3, 1)) == parsed, phrase
+    
+    results = evaluate_date_time_parsing()
+    spoken, legacy = results["spoken parser"], results["legacy strptime"]
+    print(f"Booking corpus accuracy: {spoken['accuracy']:.1%} (legacy strptime {legacy['accuracy']:.1%})")
+    assert spoken['accuracy'] >= 0.95 and spoken['accuracy'] > legacy['accuracy']
+    
+    phrases = [phrase for phrase, _ in BOOKING_DATE_TIME_CORPUS]
+    start = time.perf_counter()
+    for phrase in phrases:
+        parse_date_time(phrase, tuesday)
+    per_parse_ms = (time.perf_counter() - start) * 1e3 / len(phrases)
+    print(f"Mean parse time: {per_parse_ms * 1e3:.1f} µs")
+    assert per_parse_ms < 1.0
+    print("✅ Date/time parser tests completed successfully!")
+
+def test_multi_treatment_lookup():
+    """Test the batch lookup answers every requested name from one catalog pass"""
+    print("\n🧾 Testing Multi-Treatment Lookup...")
+    
+    async def run(db_path):
+        db_manager = AsyncDatabaseManager(db_path)
+        await db_manager.get_treatment_catalog()
+        checkouts = db_manager.get_pool_stats()['reader']['checkouts']
+        names = ["cleaning", "x-rays", "a checkup", "veneers", "cleaning"]
+        matches = await db_manager.match_treatments(names)
+        assert db_manager.get_pool_stats()['reader']['checkouts'] == checkouts
+        assert list(matches) == ["cleaning", "x-rays", "a checkup", "veneers"]
+        assert matches["cleaning"]['treatment_id'] == "basic_cleaning"
+        assert matches["x-rays"]['treatment_id'] == "bitewing_xray"
+        assert matches["a checkup"]['treatment_id'] == "general_checkup"
+        assert matches["veneers"] is None
+        total = sum(t['duration_minutes'] for t in matches.values() if t)
+        print(f"Cleaning, x-rays and checkup: {total} minutes")
+        assert total == 45 + 5 + 30
+        # The list form keeps its original shape: matched treatments only, in request order
+        listed = await db_manager.get_multiple_treatments_price_duration(names)
+        assert [t['treatment_id'] for t in listed] == \
+            ["basic_cleaning", "bitewing_xray", "general_checkup", "basic_cleaning"]
+    
+    run_database_test("Multi-treatment lookup", run, "multi_test.db")
+    print("✅ Multi-treatment lookup tests completed successfully!")
+
 async def test_calendar_features():
     """Test calendar functionality"""
     print("\n📅 Testing Calendar Features...")
@@ -124,6 +730,409 @@ async def test_calendar_features():
     except Exception as e:
         print(f"❌ Calendar test failed: {e}")
 
+def test_calendar_index():
+    """Test the per-date occupancy bitmaps against a full scan of the bookings"""
+    print("\n🗂️ Testing Calendar Availability Index...")
+    
+    service = build_year_calendar(date(2025, 1, 6), days=28)
+    for date_str in sorted(service._day_index):
+        for minutes in range(7 * 60, 19 * 60, 15):
+            time_str = f"{minutes // 60:02d}:{minutes % 60:02d}"
+            for duration in (15, 30, 60):
+                assert service._is_slot_available(date_str, time_str, duration) == \
+                    linear_scan_available(service, date_str, time_str, duration), (date_str, time_str, duration)
+    
+        for duration in (30, 45, 90):
+            slots = service.get_available_slots(date_str, duration)
+            assert [slot.time for slot in slots] == linear_scan_slots(service, date_str, duration)
+            assert service.count_available_slots(date_str, duration) == len(slots)
+            assert service.find_free_windows(date_str, duration, 2) == slots[:2]
+    
+    for date_str in sorted(service._day_index)[::3] + ["2025-01-11"]:
+        for duration, days_ahead in ((30, 7), (90, 3), (60, 14)):
+            suggestions = service.suggest_alternative_times(date_str, duration, days_ahead)
+            assert [(slot.date, slot.time) for slot in suggestions] == \
+                linear_scan_suggestions(service, date_str, duration, days_ahead)
+    
+    # Booking a day only invalidates that day's cached free windows
+    first, second = sorted(service._day_index)[:2]
+    service.get_available_slots(first)
+    service.get_available_slots(second)
+    cached_second = service._window_cache[(second, 30, None)]
+    slot = service.find_free_windows(first, 30, 1)[0]
+    assert asyncio.run(service.book_appointment(CalendarAppointment("cache-1", "p", first, slot.time, 30, "Checkup")))
+    assert slot not in service.get_available_slots(first)
+    assert service._window_cache[(second, 30, None)] is cached_second
+    
+    # Book, then cancel, a slot on an empty day
+    service = CalendarService()
+    service.block_time("2025-01-06", "12:00", 60, "Lunch break")
+    appointment = CalendarAppointment("idx-1", "patient", "2025-01-06", "09:00", 60, "Crown")
+    assert asyncio.run(service.book_appointment(appointment))
+    assert not service._is_slot_available("2025-01-06", "09:30", 30)
+    assert service._is_slot_available("2025-01-06", "10:00", 30)
+    assert not service._is_slot_available("2025-01-06", "11:45", 30)
+    assert service.get_appointments_for_date("2025-01-06") == [appointment]
+    assert asyncio.run(service.cancel_appointment("idx-1"))
+    assert service._is_slot_available("2025-01-06", "09:30", 30)
+    assert service.get_appointments_for_date("2025-01-06") == []
+    print("✅ Calendar availability index tests completed successfully!")
+
+def test_calendar_store():
+    """Test calendars in separate workers share bookings through the appointments table"""
+    print("\n💾 Testing SQLite Calendar Store...")
+    
+    async def run(db_path):
+        worker_a, worker_b = CalendarService(), CalendarService()
+        worker_a.attach_store(CalendarStore(db_path, revalidate_seconds=0))
+        worker_b.attach_store(CalendarStore(db_path, revalidate_seconds=0))
+        appointment = CalendarAppointment("store-1", "patient-1", "2025-02-03", "10:00", 60, "Crown",
+                                          notes="Booked in test")
+        assert worker_b.get_available_slots("2025-02-03")[4].time == "10:00"
+        assert await worker_a.book_appointment(appointment)
+        # Queries answer from memory; once the other worker refreshes the day it sees
+        # the booking, and it cannot take the same slot either way
+        assert worker_b._is_slot_available("2025-02-03", "10:30", 30)
+        await worker_b.refresh_days("2025-02-03")
+        assert not worker_b._is_slot_available("2025-02-03", "10:30", 30)
+        assert worker_b.get_appointments_for_date("2025-02-03") == [appointment]
+        assert not await worker_b.book_appointment(
+            CalendarAppointment("store-2", "patient-2", "2025-02-03", "10:30", 30, "Checkup"))
+        
+        # A restarted worker reloads it from disk
+        restarted = CalendarService()
+        restarted.attach_store(CalendarStore(db_path))
+        await restarted.refresh_days("2025-02-01", days_ahead=2)
+        assert [a.appointment_id for a in restarted.get_appointments_for_date("2025-02-03")] == ["store-1"]
+        
+        assert await worker_b.cancel_appointment("store-1")
+        await worker_a.refresh_days("2025-02-03")
+        assert worker_a._is_slot_available("2025-02-03", "10:30", 30)
+        assert not await worker_b.cancel_appointment("missing")
+        
+        async with get_connection_pool(db_path).reader() as conn:
+            cursor = await conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM appointments WHERE appointment_date = ? ORDER BY appointment_time",
+                ("2025-02-03",))
+            plan = await cursor.fetchall()
+        assert any("idx_appointments_date_time" in row[-1] for row in plan), [tuple(row) for row in plan]
+    
+    run_database_test("Calendar store", run, "calendar_test.db")
+    print("✅ Calendar store tests completed successfully!")
+
+def test_block_rules():
+    """Test recurring blocks, holidays and vacations are evaluated per day, indefinitely"""
+    print("\n🔁 Testing Recurring Block Rules...")
+    
+    assert calendar_service.blocked_times == [], "import must not materialize lunch blocks"
+    far_monday = "2031-06-02"
+    assert not calendar_service._is_slot_available(far_monday, "12:30", 15)
+    assert calendar_service._is_slot_available("2031-06-07", "12:30", 15)  # Saturday
+    
+    service = CalendarService()
+    service.add_block_rule(BlockRule.weekly("Lunch break", "12:00", 60))
+    service.add_block_rule(BlockRule.weekly("Staff meeting", "08:00", 60, weekdays=[2]))
+    christmas = service.add_block_rule(BlockRule.holiday("12-25", "Christmas"))
+    service.add_block_rule(BlockRule.holiday("2025-06-24", "Fête nationale"))
+    service.add_block_rule(BlockRule.vacation("2025-08-04", "2025-08-15", "Summer closure"))
+    
+    assert service.get_available_slots("2025-06-25")[0].time == "09:00"  # Wednesday meeting
+    assert service.get_available_slots("2025-06-26")[0].time == "08:00"
+    assert service.get_available_slots("2025-06-24") == []
+    assert service.get_available_slots("2026-06-24") != []  # one-off holiday only
+    assert service.get_available_slots("2025-12-25") == service.get_available_slots("2040-12-25") == []
+    assert all(service.get_available_slots(f"2025-08-{d:02d}") == [] for d in range(4, 16))
+    assert service.get_available_slots("2025-08-18") != []
+    
+    # Rules also apply to days that were already indexed
+    assert service.remove_block_rule(christmas)
+    assert service.get_available_slots("2025-12-25") != []
+    service.add_block_rule(BlockRule.holiday("2025-12-25"))
+    assert service.get_available_slots("2025-12-25") == []
+    print("✅ Block rule tests completed successfully!")
+
+def test_lazy_calendar():
+    """Test importing calendar_service does no setup until the calendar is first used"""
+    print("\n💤 Testing Lazy Calendar Initialization...")
+    
+    code = (
+        "import logging, sys; logging.basicConfig(level=logging.INFO, stream=sys.stdout)\n"
+        "import calendar_service as module\n"
+        "assert module._calendar_service is None and 'asyncio' not in sys.modules\n"
+        "print('imported')\n"
+        "from calendar_service import calendar_service\n"
+        "assert calendar_service is module.get_calendar_service() and calendar_service.block_rules\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    before, after = result.stdout.split("imported")
+    assert "Block rule added" not in before and "Block rule added" in after
+    print("✅ Lazy calendar tests completed successfully!")
+
+def test_slot_holds():
+    """Test offered slots are held per caller, expire on their TTL and convert into bookings"""
+    print("\n⏳ Testing Tentative Slot Holds...")
+    
+    wheel = TimerWheel(tick_seconds=1.0, slots=8)
+    wheel.advance(100.0)
+    wheel.schedule("soon", 102.5)
+    wheel.schedule("next-turn", 111.0)  # same bucket as 103, one wheel turn later
+    wheel.schedule("cancelled", 102.0)
+    wheel.cancel("cancelled")
+    assert wheel.advance(102.0) == []
+    assert wheel.advance(103.0) == ["soon"]
+    assert wheel.advance(110.0) == []
+    assert wheel.advance(200.0) == ["next-turn"] and len(wheel) == 0
+    
+    async def run(db_path):
+        # Both workers read one clock the test moves, so expiry never waits on wall time
+        now = [time.time()]
+        clock = lambda: now[0]
+        worker_a, worker_b = CalendarService(clock=clock), CalendarService(clock=clock)
+        worker_a.attach_store(CalendarStore(db_path, revalidate_seconds=0, clock=clock))
+        worker_b.attach_store(CalendarStore(db_path, revalidate_seconds=0, clock=clock))
+        # Caller 1 wants a full day and is offered the next morning, held for them
+        for hour in range(8, 18):
+            if hour != 12:
+                assert await worker_a.book_appointment(CalendarAppointment(
+                    f"fill-{hour}", "filler", "2025-02-03", f"{hour:02d}:00", 60, "Crown"))
+        offered = await worker_a.offer_alternative_times("2025-02-03", 60, holder="caller-1", limit=2)
+        assert [(s.date, s.time) for s in offered] == [("2025-02-04", "08:00"), ("2025-02-04", "08:30")]
+        
+        # Another caller on another worker is not offered, and cannot book, the held slots
+        await worker_b.refresh_days("2025-02-04")
+        assert worker_b.find_free_windows("2025-02-04", 60, 1)[0].time == "09:30"
+        assert not await worker_b.book_appointment(CalendarAppointment(
+            "other", "caller-2", "2025-02-04", "08:00", 60, "Crown"), holder="caller-2")
+        
+        # Caller 1 confirms: the hold becomes the booking and the other hold is released
+        assert await worker_a.book_appointment(CalendarAppointment(
+            "held", "caller-1", "2025-02-04", "08:30", 60, "Crown"), holder="caller-1")
+        assert worker_a.holds == {}
+        await worker_b.refresh_days("2025-02-04")
+        assert [s.time for s in worker_b.find_free_windows("2025-02-04", 30, 2)] == ["08:00", "09:30"]
+        
+        # Holds lapse on their own
+        hold = await worker_a.place_hold("2025-02-05", "10:00", 30, "caller-3", ttl=0.2)
+        await worker_b.refresh_days("2025-02-05")
+        assert hold and not worker_b._is_slot_available("2025-02-05", "10:00", 30)
+        now[0] = hold.expires_at - 0.01
+        assert not worker_a._is_slot_available("2025-02-05", "10:00", 30)
+        # The wheel lets a hold go on the first tick after its deadline
+        now[0] = hold.expires_at + worker_a._hold_wheel.tick_seconds
+        assert worker_a._is_slot_available("2025-02-05", "10:00", 30)
+        assert worker_b._is_slot_available("2025-02-05", "10:00", 30)
+        await worker_b.refresh_days("2025-02-05")  # and the store no longer returns them
+        assert worker_b._is_slot_available("2025-02-05", "10:00", 30)
+        assert worker_a.holds == {}
+    
+    run_database_test("Slot hold", run, "holds_test.db")
+    print("✅ Slot hold tests completed successfully!")
+
+def test_resource_scheduling():
+    """Test providers and chairs are booked in parallel, by eligibility and per-resource hours"""
+    print("\n🪑 Testing Multi-Chair Resource Scheduling...")
+    
+    def clinic():
+        service = CalendarService()
+        service.add_block_rule(BlockRule.weekly("Lunch break", "12:00", 60))
+        service.add_resource(Resource("dr_tremblay", "dentist"))
+        service.add_resource(Resource("hyg_roy", "hygienist", treatments={"Basic Cleaning", "deep_cleaning"},
+                                      hours={"monday": [("08:00", "10:00")]}))
+        service.add_resource(Resource("chair_1", "chair"))
+        service.add_resource(Resource("chair_2", "chair"))
+        return service
+    
+    async def run(db_path):
+        monday = "2025-02-03"
+        service = clinic()
+        # The hygienist takes the cleaning so the dentist stays free, each in their own chair
+        cleaning = CalendarAppointment("c1", "p1", monday, "08:00", 60, "basic cleaning")
+        filling = CalendarAppointment("f1", "p2", monday, "08:00", 60, "Composite Filling")
+        assert await service.book_appointment(cleaning) and await service.book_appointment(filling)
+        assert (cleaning.provider_id, cleaning.chair_id) == ("hyg_roy", "chair_1")
+        assert (filling.provider_id, filling.chair_id) == ("dr_tremblay", "chair_2")
+        assert not await service.book_appointment(CalendarAppointment("x", "p3", monday, "08:30", 30, "Crown"))
+        
+        # The hygienist only works until 10:00 and never does crowns
+        slot = service.find_earliest_slot(monday, 60, "Basic Cleaning")
+        assert (slot.time, slot.provider_id) == ("09:00", "hyg_roy")
+        assert service.find_earliest_slot(monday, 60, "Crown").time == "09:00"
+        assert service.count_available_slots(monday, 60, "Basic Cleaning") == \
+            service.count_available_slots(monday, 60, "Crown")  # the dentist is the bottleneck after 10:00
+        
+        # A dentist's vacation leaves only what the hygienist may do
+        service.add_block_rule(BlockRule.vacation("2025-02-04", "2025-02-04", resource_id="dr_tremblay"))
+        assert service.find_earliest_slot("2025-02-04", 30, "Crown").date == "2025-02-05"
+        assert service.get_available_slots("2025-02-04", 30, "Basic Cleaning") == []  # not her day
+        
+        worker_a, worker_b = clinic(), clinic()
+        worker_a.attach_store(CalendarStore(db_path, revalidate_seconds=0))
+        worker_b.attach_store(CalendarStore(db_path, revalidate_seconds=0))
+        # Two workers fill both chairs at the same time; a third booking is refused
+        assert await worker_a.book_appointment(CalendarAppointment("a", "p1", monday, "08:00", 60, "Basic Cleaning"))
+        assert await worker_b.book_appointment(CalendarAppointment("b", "p2", monday, "08:00", 60, "Crown"))
+        assert not await worker_a.book_appointment(CalendarAppointment("c", "p3", monday, "08:30", 30, "Crown"))
+        await worker_b.refresh_days(monday)
+        assert {(a.provider_id, a.chair_id) for a in worker_b.get_appointments_for_date(monday)} == \
+            {("hyg_roy", "chair_1"), ("dr_tremblay", "chair_2")}
+        
+        # Holds keep their provider and chair through confirmation
+        hold = await worker_a.place_hold(monday, "09:00", 60, "caller-1", treatment_type="Crown")
+        assert hold and hold.provider_id == "dr_tremblay"
+        await worker_b.refresh_days(monday)
+        assert not worker_b._is_slot_available(monday, "09:00", 30, treatment_type="Crown")
+        assert worker_b._is_slot_available(monday, "09:00", 30, treatment_type="Basic Cleaning")
+        confirmed = CalendarAppointment("d", "p4", monday, "09:00", 60, "Crown")
+        assert await worker_a.book_appointment(confirmed, holder="caller-1")
+        assert (confirmed.provider_id, confirmed.chair_id) == (hold.provider_id, hold.chair_id)
+    
+    run_database_test("Resource scheduling", run, "resources_test.db")
+    print("✅ Resource scheduling tests completed successfully!")
+
+def test_duration_packing():
+    """Test slots follow real treatment durations, pack tightly and cover combined visits"""
+    print("\n🧩 Testing Duration-Aware Slot Packing...")
+    
+    async def run(db_path):
+        monday = "2025-02-03"
+        service = CalendarService()
+        service.add_block_rule(BlockRule.weekly("Lunch break", "12:00", 60))
+        assert await service.book_appointment(CalendarAppointment("f", "p1", monday, "09:00", 30, "Composite Filling"))
+        
+        # A 5-minute x-ray goes right against the filling or opening time, not mid-morning
+        assert [s.time for s in service.find_free_windows(monday, 5, 4, packed=True)] == \
+            ["08:00", "08:55", "09:30", "11:55"]
+        # A 90-minute root canal takes a run it fills exactly to one side
+        root_canal = service.find_free_windows(monday, 90, 1, packed=True)[0]
+        assert root_canal.time == "09:30"
+        assert await service.book_appointment(CalendarAppointment("rc", "p2", monday, "09:30", 90, "Root Canal"))
+        # Hours that fit exactly come before the open afternoon
+        assert [s.time for s in service.find_free_windows(monday, 60, 3, packed=True)] == ["08:00", "11:00", "13:00"]
+        # A visit must end by closing time, not just start before it
+        assert service.is_clinic_open(monday, "17:30", 30) and not service.is_clinic_open(monday, "17:30", 90)
+        assert not service.is_clinic_open(monday, "11:30", 60)  # runs into the midday closure
+        assert not await service.book_appointment(CalendarAppointment("late", "p3", monday, "17:30", 90, "Root Canal"))
+        # Later today only: nothing before the current time is offered
+        assert [s.time for s in service.find_free_windows(monday, 30, 2, not_before="13:10")] == ["13:30", "14:00"]
+        assert service.suggest_alternative_times(monday, 30, not_before="17:40")[0].date == "2025-02-04"
+        # Plain search keeps its time order and 30-minute grid
+        assert [s.time for s in service.find_free_windows(monday, 5, 3)] == ["08:00", "08:30", "11:00"]
+        
+        # Combined visits are matched phrase by phrase and last as long as all their treatments
+        db_manager = AsyncDatabaseManager(db_path)
+        visit = await db_manager.get_visit_treatments("a cleaning and x-rays, plus a checkup")
+        assert [t['treatment_id'] for t in visit] == ["basic_cleaning", "bitewing_xray", "general_checkup"]
+        assert sum(t['duration_minutes'] for t in visit) == 80
+        assert [t['treatment_id'] for t in await db_manager.get_visit_treatments(
+            "scaling and root planing")] == ["deep_cleaning"]
+        assert await db_manager.get_visit_treatments("braces") == []
+        
+        hygienist = Resource("hyg", "hygienist", treatments={"Basic Cleaning", "Bitewing X-rays"})
+        assert hygienist.can_perform("Basic Cleaning + Bitewing X-rays")
+        assert not hygienist.can_perform("Basic Cleaning + Composite Filling")
+    
+    run_database_test("Duration-aware packing", run, "visit_test.db")
+    print("✅ Duration-aware packing tests completed successfully!")
+
+def test_spoken_availability():
+    """Test the voice summary of openings is cached per day and invalidated by bookings"""
+    print("\n🗣️ Testing Spoken Availability Summaries...")
+    
+    assert [spoken_time(t) for t in ("08:00", "09:30", "12:15", "17:00")] == ["8 AM", "9:30 AM", "12:15 PM", "5 PM"]
+    monday = date(2025, 2, 3)
+    assert [spoken_date(d, monday) for d in ("2025-02-03", "2025-02-04", "2025-02-05", "2025-02-21")] == \
+        ["today", "tomorrow", "Wednesday, February 5th", "Friday, February 21st"]
+    
+    async def run(db_path):
+        worker_a, worker_b = CalendarService(), CalendarService()
+        for worker in (worker_a, worker_b):
+            worker.add_block_rule(BlockRule.weekly("Lunch break", "12:00", 60))
+            worker.attach_store(CalendarStore(db_path, revalidate_seconds=0))
+        # Friday afternoon: the rest of today, then Monday after the weekend
+        friday = date(2025, 1, 31)
+        summary = worker_a.describe_openings("2025-01-31", 45, not_before="16:30", max_days=2, today=friday)
+        assert summary == "today at 4:30 PM, 5 PM and 5:15 PM; Monday, February 3rd at 8 AM, 11:15 AM and 1 PM"
+        assert worker_a.describe_openings("2025-01-31", 45, not_before="16:30", max_days=2, today=friday) is summary
+        
+        # A booking made by another worker invalidates the cached text
+        assert await worker_b.book_appointment(CalendarAppointment("a", "p1", "2025-02-03", "08:00", 60, "Crown"))
+        await worker_a.refresh_days("2025-01-31", days_ahead=7)
+        updated = worker_a.describe_openings("2025-01-31", 45, not_before="16:30", max_days=2, today=friday)
+        assert updated == "today at 4:30 PM, 5 PM and 5:15 PM; Monday, February 3rd at 9 AM, 11:15 AM and 1 PM"
+        
+        # Nothing left today: the summary moves on without mentioning it
+        assert worker_a.describe_openings("2025-01-31", 45, not_before="18:00", max_days=1,
+                                          today=friday).startswith("Monday")
+    
+    run_database_test("Spoken availability", run, "spoken_test.db")
+    print("✅ Spoken availability tests completed successfully!")
+
+def _hammer_slot(args):
+    """Worker-process side of the booking stress test: every task books the same slot"""
+    db_path, worker, attempts = args
+    
+    async def run():
+        service = CalendarService()
+        service.attach_store(CalendarStore(db_path, revalidate_seconds=60))
+        try:
+            await service.refresh_days("2025-02-04")  # cache the day as free, so only the store can refuse
+            results = await asyncio.gather(*(
+                service.book_appointment(CalendarAppointment(
+                    f"proc{worker}-{i}", f"patient-{worker}", "2025-02-04", "09:00", 30, "Checkup"))
+                for i in range(attempts)))
+        finally:
+            await close_connection_pools()
+        return sum(results)
+    
+    return asyncio.run(run())
+
+def test_booking_concurrency():
+    """Stress test: many tasks and worker processes racing for the same slots never double-book"""
+    print("\n🏁 Testing Concurrent Slot Reservation...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "race_test.db")
+        db_migrations.run_migrations(db_path)
+        
+        async def in_process():
+            workers = [CalendarService(), CalendarService()]
+            for worker in workers:
+                worker.attach_store(CalendarStore(db_path, revalidate_seconds=60))
+                await worker.refresh_days("2025-02-03")
+            attempts = [
+                workers[i % 2].book_appointment(CalendarAppointment(
+                    f"task-{i}", f"patient-{i}", "2025-02-03", f"{9 + i % 3:02d}:{15 * (i % 4):02d}", 30 + 15 * (i % 3), "Checkup"))
+                for i in range(60)
+            ]
+            try:
+                return sum(await asyncio.gather(*attempts))
+            finally:
+                await close_connection_pools()
+        
+        booked_in_process = asyncio.run(in_process())
+        with multiprocessing.get_context("spawn").Pool(4) as pool:
+            booked_across_processes = sum(pool.map(_hammer_slot, [(db_path, w, 10) for w in range(4)]))
+        
+        import sqlite3
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute("""
+            SELECT appointment_date, appointment_time, duration_minutes FROM appointments
+            WHERE status = 'scheduled' ORDER BY appointment_date, appointment_time
+        """).fetchall()
+        conn.close()
+        
+        for (day_a, time_a, dur_a), (day_b, time_b, dur_b) in zip(rows, rows[1:]):
+            if day_a == day_b:
+                end_a = int(time_a[:2]) * 60 + int(time_a[3:]) + dur_a
+                assert end_a <= int(time_b[:2]) * 60 + int(time_b[3:]), f"double-booked {day_a} {time_a}/{time_b}"
+        assert booked_across_processes == 1
+        assert booked_in_process == len(rows) - 1
+        print(f"60 racing tasks booked {booked_in_process} non-overlapping slots; "
+              f"40 tasks in 4 processes booked {booked_across_processes}")
+    print("✅ Concurrent reservation tests completed successfully!")
+
 def test_agent_workflow():
     """Test agent workflow logic"""
     print("\n🤖 Testing Agent Workflow Logic...")
@@ -165,9 +1174,35 @@ async def main():
     
     # Test database features
     await test_database_features()
+    await close_connection_pools()
+    
+    # Test connection pool
+    await asyncio.to_thread(test_connection_pool)
+    await asyncio.to_thread(test_batch_writer)
+    await asyncio.to_thread(test_shared_batch_writer)
+    await asyncio.to_thread(test_adaptive_flush)
+    await asyncio.to_thread(test_bounded_queues)
+    await asyncio.to_thread(test_durable_log_replay)
+    test_schema_migrations()
+    await asyncio.to_thread(test_patient_lookup)
+    await asyncio.to_thread(test_caller_prefetch)
+    await asyncio.to_thread(test_duplicate_patients)
+    await asyncio.to_thread(test_treatment_catalog_cache)
+    test_treatment_matcher()
+    await asyncio.to_thread(test_multi_treatment_lookup)
+    test_date_time_parser()
     
     # Test calendar features
     test_calendar_features()
+    await asyncio.to_thread(test_calendar_index)
+    await asyncio.to_thread(test_block_rules)
+    await asyncio.to_thread(test_lazy_calendar)
+    await asyncio.to_thread(test_calendar_store)
+    await asyncio.to_thread(test_booking_concurrency)
+    await asyncio.to_thread(test_slot_holds)
+    await asyncio.to_thread(test_resource_scheduling)
+    await asyncio.to_thread(test_duration_packing)
+    await asyncio.to_thread(test_spoken_availability)
     
     # Test agent workflow
     test_agent_workflow()
@@ -0,0 +1,193 @@
+"""
+In-process treatment catalog for SmileRight Dental Clinic
+
+The treatments table is tiny and read on the latency-critical voice path,
+so it is loaded once into an immutable index (by id, normalized name and
+category) instead of being queried on every LLM tool call. A version
+counter maintained by triggers on the table lets the cache notice edits.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from treatment_matcher import MatchCandidate, TreatmentMatcher, split_visit_request
+
+logger = logging.getLogger("dental_assistant.catalog")
+
+# How long a loaded catalog is trusted before its version stamp is re-read
+REVALIDATE_SECONDS = 30.0
+
+
+def normalize_name(text: str) -> str:
+    """Case- and whitespace-insensitive key for treatment names"""
+    return " ".join(text.casefold().split())
+
+
+@dataclass(frozen=True)
+class Treatment:
+    treatment_id: str
+    name: str
+    description: Optional[str]
+    price_range_min: int
+    price_range_max: int
+    duration_minutes: int
+    category: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class TreatmentCatalog:
+    """Immutable snapshot of the treatments table with lookup indexes"""
+
+    def __init__(self, treatments: List[Treatment], version: int):
+        self.version = version
+        self.treatments: Tuple[Treatment, ...] = tuple(treatments)  # table (rowid) order
+        self.by_id = {t.treatment_id: t for t in self.treatments}
+        self.by_name = {normalize_name(t.name): t for t in self.treatments}
+        by_category: Dict[str, List[Treatment]] = {}
+        for t in self.treatments:
+            by_category.setdefault(t.category, []).append(t)
+        self.by_category = {category: tuple(items) for category, items in by_category.items()}
+        self.sorted_by_category = tuple(sorted(self.treatments, key=lambda t: (t.category, t.name)))
+        self.sorted_by_name = tuple(sorted(self.treatments, key=lambda t: t.name))
+        # Pre-folded text for substring searches
+        self._folded = {
+            t.treatment_id: (t.name.casefold(), t.treatment_id.casefold(), (t.description or "").casefold())
+            for t in self.treatments
+        }
+        self.matcher = TreatmentMatcher(self.treatments)
+
+    def __len__(self) -> int:
+        return len(self.treatments)
+
+    def get(self, treatment_id: str) -> Optional[Treatment]:
+        return self.by_id.get(treatment_id)
+
+    def find_by_name(self, name: str) -> Optional[Treatment]:
+        """Exact, case-insensitive name match"""
+        return self.by_name.get(normalize_name(name))
+
+    def in_category(self, category: str) -> Tuple[Treatment, ...]:
+        return self.by_category.get(category, ())
+
+    def name_or_id_contains(self, text: str) -> List[Treatment]:
+        """Treatments whose name or id contains text, in table order"""
+        needle = text.casefold()
+        return [t for t in self.treatments
+                if needle in self._folded[t.treatment_id][0] or needle in self._folded[t.treatment_id][1]]
+
+    def search(self, keyword: str) -> List[Treatment]:
+        """Treatments whose name or description contains keyword, ordered by name"""
+        needle = keyword.casefold()
+        return [t for t in self.sorted_by_name
+                if needle in self._folded[t.treatment_id][0] or needle in self._folded[t.treatment_id][2]]
+
+    def best_substring_match(self, text: str) -> Optional[Treatment]:
+        """Exact name, then first name containing text, then first description containing it"""
+        exact = self.find_by_name(text)
+        if exact:
+            return exact
+        needle = text.casefold()
+        for t in self.treatments:
+            if needle in self._folded[t.treatment_id][0]:
+                return t
+        for t in self.treatments:
+            if needle in self._folded[t.treatment_id][2]:
+                return t
+        return None
+
+    def rank_matches(self, text: str, limit: Optional[int] = None) -> List[MatchCandidate]:
+        """Fuzzy candidates for a spoken treatment phrase, best first"""
+        return self.matcher.rank(text, limit)
+
+    def best_match(self, text: str) -> Optional[Treatment]:
+        """Best fuzzy match, falling back to plain substring matching"""
+        candidate = self.matcher.best(text)
+        return candidate.treatment if candidate else self.best_substring_match(text)
+
+    def best_matches(self, texts: List[str]) -> Dict[str, Optional[Treatment]]:
+        """Best match for each phrase in one pass; unmatched phrases map to None"""
+        return {text: self.best_match(text) for text in dict.fromkeys(texts)}
+
+    def match_visit(self, text: str) -> List[Treatment]:
+        """Treatments requested for one visit ("a cleaning and x-rays"), in the order named, each once"""
+        matches = {}
+        for treatment in self.best_matches(split_visit_request(text)).values():
+            if treatment:
+                matches.setdefault(treatment.treatment_id, treatment)
+        if not matches:
+            # "and" may belong to a single treatment's name
+            treatment = self.best_match(text)
+            return [treatment] if treatment else []
+        return list(matches.values())
+
+
+async def read_catalog_version(conn: aiosqlite.Connection) -> int:
+    cursor = await conn.execute("SELECT version FROM catalog_version WHERE name = 'treatments'")
+    row = await cursor.fetchone()
+    return row[0] if row else 0
+
+
+async def load_catalog(conn: aiosqlite.Connection) -> TreatmentCatalog:
+    """Read the version stamp before the rows, so a concurrent edit can only cause an extra reload"""
+    version = await read_catalog_version(conn)
+    cursor = await conn.execute("""
+        SELECT treatment_id, name, description, price_range_min, price_range_max, duration_minutes, category
+        FROM treatments ORDER BY rowid
+    """)
+    rows = await cursor.fetchall()
+    return TreatmentCatalog([Treatment(*row) for row in rows], version)
+
+
+def load_catalog_sync(db_path: str) -> TreatmentCatalog:
+    """Blocking load for worker prewarm; also seeds the process cache"""
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT version FROM catalog_version WHERE name = 'treatments'").fetchone()
+        rows = conn.execute("""
+            SELECT treatment_id, name, description, price_range_min, price_range_max, duration_minutes, category
+            FROM treatments ORDER BY rowid
+        """).fetchall()
+    finally:
+        conn.close()
+    catalog = TreatmentCatalog([Treatment(*r) for r in rows], row[0] if row else 0)
+    _catalog_cache[os.path.abspath(db_path)] = (catalog, time.monotonic())
+    return catalog
+
+
+# Process-wide cache: db path -> (catalog, monotonic time its version was last checked)
+_catalog_cache: Dict[str, Tuple[TreatmentCatalog, float]] = {}
+
+
+def cached_catalog(db_path: str, max_age: float = REVALIDATE_SECONDS) -> Optional[TreatmentCatalog]:
+    """The cached catalog if it was validated within max_age seconds"""
+    entry = _catalog_cache.get(os.path.abspath(db_path))
+    if entry and time.monotonic() - entry[1] < max_age:
+        return entry[0]
+    return None
+
+
+async def revalidate_catalog(db_path: str, conn: aiosqlite.Connection) -> TreatmentCatalog:
+    """Compare the cached version stamp with the table's and reload if it moved"""
+    key = os.path.abspath(db_path)
+    entry = _catalog_cache.get(key)
+    version = await read_catalog_version(conn)
+    if entry and entry[0].version == version:
+        catalog = entry[0]
+    else:
+        catalog = await load_catalog(conn)
+        logger.info(f"Loaded treatment catalog version {catalog.version} ({len(catalog)} treatments)")
+    _catalog_cache[key] = (catalog, time.monotonic())
+    return catalog
+
+
+def invalidate_catalog(db_path: str):
+    """Force the next access to re-check the database"""
+    _catalog_cache.pop(os.path.abspath(db_path), None)
@@ -0,0 +1,222 @@
+"""
+Fuzzy treatment-name matching for SmileRight Dental Clinic
+
+Speech-to-text hands the agent phrasings like "root canals", "whitening my
+teeth" or "deep clean" rather than catalog names. The matcher precomputes
+normalized, stemmed token keys for every treatment (name, id, spoken
+aliases and description) and ranks candidates by how much of a key the
+query covers and how much of the query the key explains. Near-miss tokens
+are scored by edit distance against a trigram-filtered vocabulary.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+# Candidates scoring below this are not returned
+DEFAULT_THRESHOLD = 0.7
+
+# Minimum similarity for a misheard token to count as a partial match
+TOKEN_SIMILARITY = 0.75
+
+# Description keys only explain the query, so they can never beat a name
+DESCRIPTION_WEIGHT = 0.75
+
+# Spoken phrasings per treatment id; ids missing from the catalog are ignored
+TREATMENT_ALIASES: Dict[str, Tuple[str, ...]] = {
+    'basic_cleaning': ('cleaning', 'teeth cleaning', 'regular cleaning', 'hygiene', 'polish', 'nettoyage'),
+    'general_checkup': ('checkup', 'check up', 'exam', 'examination', 'consultation', 'examen'),
+    'bitewing_xray': ('bitewing', 'bite wing', 'cavity x ray'),
+    'panoramic_xray': ('panoramic', 'pano', 'full mouth x ray', 'panoramique'),
+    'composite_filling': ('filling', 'white filling', 'tooth colored filling', 'plombage', 'obturation'),
+    'amalgam_filling': ('silver filling', 'metal filling'),
+    'root_canal': ('nerve treatment', 'endodontic', 'traitement de canal'),
+    'crown': ('cap', 'couronne'),
+    'teeth_whitening': ('whitening', 'bleaching', 'whiter teeth', 'blanchiment'),
+    'extraction': ('pull', 'pull tooth', 'tooth removal', 'remove tooth', 'wisdom tooth', 'extract'),
+    'deep_cleaning': ('deep clean', 'scaling', 'root planing', 'gum cleaning', 'detartrage'),
+}
+
+# Words that carry no treatment information in a spoken request
+STOPWORDS: FrozenSet[str] = frozenset("""
+    a an the my me i i'd im to get got for of some want need would like how much is are does do
+    cost costs price and or please about what whats with one can you your it this that have
+    having done dental procedure treatment appointment visit per
+    le la les un une des de du mes mon pour combien
+""".split())
+
+# Multi-word spellings that speech-to-text splits apart (after stemming)
+PHRASE_MERGES: Dict[Tuple[str, str], str] = {
+    ('x', 'ray'): 'xray',
+    ('check', 'up'): 'checkup',
+    ('bite', 'wing'): 'bitewing',
+}
+
+# Irregular or cross-language forms folded onto one token
+TOKEN_SYNONYMS: Dict[str, str] = {
+    'teeth': 'tooth',
+    'dent': 'tooth',
+    'dents': 'tooth',
+    'radiographie': 'xray',
+    'radio': 'xray',
+    'cleanup': 'clean',
+    'exams': 'exam',
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+# Separators between treatments requested for the same visit
+_VISIT_SEPARATORS = re.compile(r"\s*(?:[,;&+/]|\band\b|\bplus\b|\bwith\b|\bet\b|\bavec\b)\s*", re.IGNORECASE)
+
+
+def stem(token: str) -> str:
+    """Light suffix folding for plurals and gerunds ("canals", "whitening", "cavities")"""
+    token = TOKEN_SYNONYMS.get(token, token)
+    if len(token) > 4 and token.endswith('ies'):
+        token = token[:-3] + 'y'
+    elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        token = token[:-1]
+    if len(token) > 5 and token.endswith('ing'):
+        token = token[:-3]
+    elif len(token) > 4 and token.endswith('ed'):
+        token = token[:-2]
+    return TOKEN_SYNONYMS.get(token, token)
+
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    """Normalized content tokens: accents and punctuation stripped, stemmed, merged, stopwords dropped"""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"\([^)]*\)", " ", text)  # "(per quadrant)" is not part of the spoken name
+    text = text.replace('-', '')
+    tokens = [stem(t) for t in _PUNCTUATION.sub(' ', text).split() if t not in STOPWORDS]
+    merged: List[str] = []
+    for token in tokens:
+        if merged and (merged[-1], token) in PHRASE_MERGES:
+            merged[-1] = PHRASE_MERGES[(merged[-1], token)]
+        else:
+            merged.append(token)
+    return tuple(t for t in merged if t not in STOPWORDS)
+
+
+def split_visit_request(text: str) -> List[str]:
+    """Phrases of a request naming several treatments: "a cleaning and x-rays" -> ["a cleaning", "x-rays"]"""
+    return [part for part in _VISIT_SEPARATORS.split(text) if part.strip()]
+
+
+def _trigrams(token: str) -> FrozenSet[str]:
+    padded = f"  {token} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+@dataclass(frozen=True)
+class MatchCandidate:
+    treatment: object  # treatment_catalog.Treatment
+    score: float
+    matched_key: str
+
+
+class TreatmentMatcher:
+    """Precomputed fuzzy index over a fixed list of treatments"""
+
+    def __init__(self, treatments: Sequence, threshold: float = DEFAULT_THRESHOLD, cache_size: int = 1024):
+        self.threshold = threshold
+        self.treatments = tuple(treatments)
+        # (treatment, key tokens, display text, is_description)
+        self.keys: List[Tuple[object, Tuple[str, ...], str, bool]] = []
+        for t in self.treatments:
+            phrases = [t.name, t.treatment_id.replace('_', ' ')] + list(TREATMENT_ALIASES.get(t.treatment_id, ()))
+            seen = set()
+            for phrase in phrases:
+                tokens = tokenize(phrase)
+                if tokens and tokens not in seen:
+                    seen.add(tokens)
+                    self.keys.append((t, tokens, phrase, False))
+            if t.description and tokenize(t.description):
+                self.keys.append((t, tokenize(t.description), t.description, True))
+        self.vocabulary = frozenset(token for _, tokens, _, _ in self.keys for token in tokens)
+        # Tokens shared by many treatments ("tooth") say nothing on their own in a description
+        frequency: Dict[str, int] = {}
+        for t in self.treatments:
+            for token in {tok for owner, tokens, _, _ in self.keys if owner is t for tok in tokens}:
+                frequency[token] = frequency.get(token, 0) + 1
+        self.generic_tokens = frozenset(tok for tok, n in frequency.items() if n > max(2, len(self.treatments) // 4))
+        # Keys containing each token, and the tokens of each key that may explain a query
+        self._postings: Dict[str, List[int]] = {token: [] for token in self.vocabulary}
+        self._explaining_tokens: List[FrozenSet[str]] = []
+        for index, (_, tokens, _, is_description) in enumerate(self.keys):
+            for token in set(tokens):
+                self._postings[token].append(index)
+            self._explaining_tokens.append(frozenset(tokens) - self.generic_tokens if is_description
+                                           else frozenset(tokens))
+        self._trigram_index: Dict[str, List[str]] = {}
+        for token in self.vocabulary:
+            for gram in _trigrams(token):
+                self._trigram_index.setdefault(gram, []).append(token)
+        self._token_cache: Dict[str, Dict[str, float]] = {}
+        # Callers repeat the same phrases, so cache on the raw text and skip tokenizing
+        self._cached_rank = lru_cache(maxsize=cache_size)(lambda text: self._rank(tokenize(text)))
+
+    def token_matches(self, token: str) -> Dict[str, float]:
+        """Vocabulary tokens similar to token, with similarity in (0, 1]"""
+        cached = self._token_cache.get(token)
+        if cached is not None:
+            return cached
+        if token in self.vocabulary:
+            matches = {token: 1.0}
+        elif len(token) < 4:
+            matches = {}  # short tokens are too ambiguous to correct
+        else:
+            matches = {}
+            candidates = {c for gram in _trigrams(token) for c in self._trigram_index.get(gram, ())}
+            for candidate in candidates:
+                if abs(len(candidate) - len(token)) > 2:
+                    continue
+                similarity = 1.0 - _edit_distance(token, candidate) / max(len(token), len(candidate))
+                if similarity >= TOKEN_SIMILARITY:
+                    matches[candidate] = similarity
+        if len(self._token_cache) < 10000:
+            self._token_cache[token] = matches
+        return matches
+
+    def _rank(self, query: Tuple[str, ...]) -> Tuple[MatchCandidate, ...]:
+        similar = [self.token_matches(token) for token in query]
+        touched = sorted({index for matches in similar for token in matches for index in self._postings[token]})
+        best: Dict[str, MatchCandidate] = {}
+        for index in touched:
+            treatment, key, text, is_description = self.keys[index]
+            explaining = self._explaining_tokens[index]
+            # How much of the query the key explains
+            precision = sum(max((s for token, s in matches.items() if token in explaining), default=0.0)
+                            for matches in similar) / len(query)
+            if is_description:
+                score = DESCRIPTION_WEIGHT * precision
+            else:
+                # How much of the key the query covers
+                recall = sum(max(matches.get(k, 0.0) for matches in similar) for k in key) / len(key)
+                score = 0.7 * recall + 0.3 * precision
+            current = best.get(treatment.treatment_id)
+            if score >= self.threshold and (current is None or score > current.score):
+                best[treatment.treatment_id] = MatchCandidate(treatment, round(score, 4), text)
+        return tuple(sorted(best.values(), key=lambda c: -c.score))
+
+    def rank(self, text: str, limit: Optional[int] = None) -> List[MatchCandidate]:
+        """Candidates at or above the threshold, best first"""
+        candidates = self._cached_rank(text)
+        return list(candidates[:limit] if limit else candidates)
+
+    def best(self, text: str) -> Optional[MatchCandidate]:
+        candidates = self._cached_rank(text)
+        return candidates[0] if candidates else None